@@ -60,6 +60,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "inventory.context_processors.user_role",
             ],
         },
     },
@@ -125,3 +126,92 @@ from dotenv import load_dotenv
 
 load_dotenv()
 GIGACHAT_API_KEY = os.getenv('GIGACHAT_API_KEY')
+GIGACHAT_BASE_URL = os.getenv('GIGACHAT_BASE_URL')  # None — адрес по умолчанию из библиотеки gigachat
+GIGACHAT_AUTH_URL = os.getenv('GIGACHAT_AUTH_URL')
+GIGACHAT_SCOPE = os.getenv('GIGACHAT_SCOPE', 'GIGACHAT_API_PERS')
+GIGACHAT_VERIFY_SSL_CERTS = os.getenv('GIGACHAT_VERIFY_SSL_CERTS', 'false').lower() == 'true'
+GIGACHAT_TOKEN_REFRESH_MARGIN = int(os.getenv('GIGACHAT_TOKEN_REFRESH_MARGIN', 60))
+# Читать ответ потоком и прерывать генерацию, как только закрылся JSON
+GIGACHAT_STREAMING = os.getenv('GIGACHAT_STREAMING', 'true').lower() == 'true'
+# Запись (record) или воспроизведение (replay) ответов GigaChat из файла-кассеты
+GIGACHAT_CASSETTE_MODE = os.getenv('GIGACHAT_CASSETTE_MODE')
+GIGACHAT_CASSETTE = os.getenv('GIGACHAT_CASSETTE', str(BASE_DIR / 'gigachat_cassette.json'))
+
+# Таймауты и повторы вызовов GigaChat
+GIGACHAT_TIMEOUT = float(os.getenv('GIGACHAT_TIMEOUT', 10))  # на одну попытку, сек
+GIGACHAT_DEADLINE = float(os.getenv('GIGACHAT_DEADLINE', 30))  # на вызов со всеми повторами, сек
+GIGACHAT_MAX_RETRIES = int(os.getenv('GIGACHAT_MAX_RETRIES', 2))
+GIGACHAT_BACKOFF_BASE = float(os.getenv('GIGACHAT_BACKOFF_BASE', 0.5))
+GIGACHAT_BACKOFF_MAX = float(os.getenv('GIGACHAT_BACKOFF_MAX', 5))
+
+# Выключатель вызовов AI (общий для всех воркеров, хранится в БД)
+AI_BREAKER_FAILURE_RATE = float(os.getenv('AI_BREAKER_FAILURE_RATE', 0.5))
+AI_BREAKER_MIN_CALLS = int(os.getenv('AI_BREAKER_MIN_CALLS', 10))
+AI_BREAKER_WINDOW = int(os.getenv('AI_BREAKER_WINDOW', 60))
+AI_BREAKER_RECOVERY_TIMEOUT = int(os.getenv('AI_BREAKER_RECOVERY_TIMEOUT', 30))
+
+# Лимиты вызовов GigaChat (общие для всех процессов, хранятся в БД)
+AI_RATE_LIMIT_RPS = float(os.getenv('AI_RATE_LIMIT_RPS', 1))
+AI_RATE_LIMIT_BURST = int(os.getenv('AI_RATE_LIMIT_BURST', 5))
+AI_RATE_LIMIT_TOKENS_PER_DAY = int(os.getenv('AI_RATE_LIMIT_TOKENS_PER_DAY', 1_000_000))  # 0 — без лимита
+AI_RATE_LIMIT_MAX_WAIT = float(os.getenv('AI_RATE_LIMIT_MAX_WAIT', 10))  # сек
+AI_RATE_LIMIT_LOW_PRIORITY_RESERVE = float(os.getenv('AI_RATE_LIMIT_LOW_PRIORITY_RESERVE', 0.2))
+
+
+# Очередь AI-анализа заявок (воркеры: python manage.py run_ai_workers)
+AI_WORKERS = int(os.getenv('AI_WORKERS', 4))
+AI_JOB_MAX_ATTEMPTS = int(os.getenv('AI_JOB_MAX_ATTEMPTS', 3))
+AI_JOB_STALE_AFTER = int(os.getenv('AI_JOB_STALE_AFTER', 600))
+# Как часто воркеры возвращают в очередь задания упавших воркеров, сек
+AI_JOB_REQUEUE_INTERVAL = int(os.getenv('AI_JOB_REQUEUE_INTERVAL', 60))
+# Пауза перед повтором задания после ошибки; удваивается с каждой попыткой, сек
+AI_JOB_RETRY_DELAY = int(os.getenv('AI_JOB_RETRY_DELAY', 30))
+AI_WORKER_BATCH_SIZE = int(os.getenv('AI_WORKER_BATCH_SIZE', 10))
+
+# Пакетный анализ заявок одним запросом к GigaChat
+GIGACHAT_BATCH_TOKEN_BUDGET = int(os.getenv('GIGACHAT_BATCH_TOKEN_BUDGET', 3000))
+GIGACHAT_BATCH_MAX_ITEMS = int(os.getenv('GIGACHAT_BATCH_MAX_ITEMS', 20))
+
+# Кэш результатов AI-анализа
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 7 * 24 * 3600))
+AI_CACHE_MEMORY_SIZE = int(os.getenv('AI_CACHE_MEMORY_SIZE', 1024))
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', 50000))
+# Просроченные и лишние записи удаляются раз в столько записей в кэш
+AI_CACHE_EVICT_EVERY = int(os.getenv('AI_CACHE_EVICT_EVERY', 100))
+
+# Локальный предклассификатор заявок (обучение: python manage.py train_local_classifier)
+AI_LOCAL_CLASSIFIER_ENABLED = os.getenv('AI_LOCAL_CLASSIFIER_ENABLED', 'true').lower() == 'true'
+AI_LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv('AI_LOCAL_CLASSIFIER_THRESHOLD', 0.85))
+AI_LOCAL_CLASSIFIER_PATH = os.getenv('AI_LOCAL_CLASSIFIER_PATH', str(BASE_DIR / 'local_classifier.json'))
+
+# Повторное использование анализа почти одинаковых заявок (MinHash/LSH)
+AI_NEAR_DUPLICATE_ENABLED = os.getenv('AI_NEAR_DUPLICATE_ENABLED', 'true').lower() == 'true'
+AI_NEAR_DUPLICATE_THRESHOLD = float(os.getenv('AI_NEAR_DUPLICATE_THRESHOLD', 0.6))
+
+# Метрики AI-конвейера (/metrics/ai/ и --metrics-port воркеров) отдаются только с заголовком
+# Authorization: Bearer <токен>; без токена закрыты
+AI_METRICS_TOKEN = os.getenv('AI_METRICS_TOKEN')
+
+# JSON API (/api/v1/); запросы с заголовком Authorization: Bearer <токен> проходят без сессии
+API_TOKEN = os.getenv('API_TOKEN')
+
+# Отчёт по поломкам: ремонт считается повторным, если начат в течение стольких дней после предыдущего
+REPAIR_REPEAT_WITHIN_DAYS = int(os.getenv('REPAIR_REPEAT_WITHIN_DAYS', 30))
+
+# Выгрузка журнала движений: строк в одной порции курсора на стороне сервера
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+
+# Роль пользователя кэшируется в сессии не дольше этого времени, сек; изменение профиля
+# сбрасывает её раньше через метку в кэше Django, поэтому кэш должен быть общим для процессов
+USER_ROLE_CACHE_TTL = int(os.getenv('USER_ROLE_CACHE_TTL', 300))
+
+# Общий кэш Django для всех процессов (gunicorn, админка, воркеры). Без REDIS_URL используется
+# кэш в памяти процесса — только для разработки (manage.py check --deploy, проверка inventory.E001)
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
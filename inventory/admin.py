@@ -1,6 +1,7 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
 from .models import *
+from .services.request_decisions import decide_requests
 
 
 @admin.register(DeviceType)
@@ -30,8 +31,61 @@ class DeviceAdmin(admin.ModelAdmin):
 class RequestAdmin(admin.ModelAdmin):
     list_display = ('id', 'employee', 'device', 'status', 'ai_priority_score', 'ai_tags', 'created_at')
     list_filter = ('status', 'ai_priority_score', 'created_at')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'current_analysis')
     ordering = ['-ai_priority_score']
+    actions = ['approve_requests', 'reject_requests']
+
+    @admin.action(description='Одобрить выбранные заявки')
+    def approve_requests(self, request, queryset):
+        self.decide(request, queryset, Request.STATUS_APPROVED)
+
+    @admin.action(description='Отклонить выбранные заявки')
+    def reject_requests(self, request, queryset):
+        self.decide(request, queryset, Request.STATUS_REJECTED)
+
+    def decide(self, request, queryset, new_status):
+        result = decide_requests(queryset.values_list('id', flat=True), new_status)
+        if result.processed:
+            self.message_user(request, result.message(new_status), messages.SUCCESS)
+        for request_id, reason in result.conflicts.items():
+            self.message_user(request, f'Заявка #{request_id}: {reason}', messages.WARNING)
+
+
+@admin.register(AIAnalysis)
+class AIAnalysisAdmin(admin.ModelAdmin):
+    list_display = ['request', 'source', 'prompt_version', 'model_name', 'latency_ms', 'tokens_in', 'tokens_out',
+                    'created_at']
+    list_filter = ['source', 'prompt_version', 'model_name']
+    readonly_fields = ['created_at']
+
+
+@admin.register(AIAnalysisJob)
+class AIAnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ['request', 'status', 'attempts', 'worker', 'created_at', 'run_after', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+
+
+@admin.register(AIAnalysisCacheEntry)
+class AIAnalysisCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['key', 'prompt_version', 'hits', 'created_at', 'last_used_at']
+    list_filter = ['prompt_version']
+
+
+@admin.register(AICircuitBreaker)
+class AICircuitBreakerAdmin(admin.ModelAdmin):
+    list_display = ['name', 'state', 'window_calls', 'window_failures', 'opened_at', 'updated_at']
+
+
+@admin.register(AIRateLimit)
+class AIRateLimitAdmin(admin.ModelAdmin):
+    list_display = ['name', 'available_requests', 'day', 'day_tokens', 'updated_at']
+
+
+@admin.register(DeviceStatusCounter)
+class DeviceStatusCounterAdmin(admin.ModelAdmin):
+    list_display = ['device_type', 'status', 'is_written_off', 'count']
+    list_filter = ['status', 'is_written_off']
 
 
 @admin.register(UserProfile)
@@ -0,0 +1,247 @@
+import hashlib
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from .models import Device, EquipmentMovement, Extension, Repair, Request, UserProfile
+from .services.bearer import bearer_matches
+from .services.pagination import keyset_paginate
+from .services.roles import get_user_role
+from .services.table_versions import get_versions
+
+API_VERSION = 'v1'
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+API_ROLES = [UserProfile.ROLE_ADMIN, UserProfile.ROLE_TECH, UserProfile.ROLE_ANALYST]
+
+
+@dataclass(frozen=True)
+class ApiField:
+    """Поле ответа: как получить значение и какие связи для этого подгрузить"""
+    getter: object
+    select_related: tuple = ()
+    prefetch_related: tuple = ()
+
+
+def attribute(name):
+    return ApiField(lambda obj: getattr(obj, name))
+
+
+def related(path, name, *select_related):
+    """Значение связанного объекта (None, если связи нет)"""
+    def getter(obj):
+        target = getattr(obj, path)
+        return None if target is None else {'id': target.id, name: getattr(target, name)}
+    return ApiField(getter, select_related=select_related or (path,))
+
+
+@dataclass(frozen=True)
+class Resource:
+    model: type
+    fields: dict
+    default_fields: tuple
+    # Таблицы, от которых зависит ответ, — из их версий строится ETag
+    tables: tuple
+    # GET-параметр → (поле фильтра, допустимые значения или None для id)
+    filters: dict
+
+
+RESOURCES = {
+    'devices': Resource(
+        model=Device,
+        fields={
+            'id': attribute('id'),
+            'inventory_number': attribute('inventory_number'),
+            'model': attribute('model'),
+            'status': attribute('status'),
+            'device_type': related('device_type', 'name'),
+            'responsible_person': related('responsible_person', 'full_name'),
+            'is_written_off': attribute('is_written_off'),
+            'purchase_date': attribute('purchase_date'),
+            'created_at': attribute('created_at'),
+            'active_request_ids': ApiField(
+                lambda device: [request_obj.id for request_obj in device.active_requests],
+                prefetch_related=(Prefetch(
+                    'request_set',
+                    queryset=Request.objects.filter(
+                        status__in=[Request.STATUS_PENDING, Request.STATUS_APPROVED]
+                    ).only('id', 'device_id').order_by('id'),
+                    to_attr='active_requests',
+                ),),
+            ),
+        },
+        default_fields=('id', 'inventory_number', 'model', 'status', 'device_type'),
+        tables=('device', 'devicetype', 'employee', 'request'),
+        filters={
+            'status': ('status', dict(Device.STATUS_CHOICES)),
+            'type': ('device_type_id', None),
+            'responsible': ('responsible_person_id', None),
+        },
+    ),
+    'requests': Resource(
+        model=Request,
+        fields={
+            'id': attribute('id'),
+            'status': attribute('status'),
+            'purpose': attribute('purpose'),
+            'employee': related('employee', 'full_name'),
+            'device': related('device', 'inventory_number'),
+            'planned_return_date': attribute('planned_return_date'),
+            'ai_priority_score': attribute('ai_priority_score'),
+            'ai_tags': attribute('ai_tags'),
+            'ai_summary': attribute('ai_summary'),
+            'created_at': attribute('created_at'),
+            'updated_at': attribute('updated_at'),
+            'extensions': ApiField(
+                lambda request_obj: [
+                    {'id': extension.id, 'new_return_date': extension.new_return_date, 'status': extension.status}
+                    for extension in request_obj.extension_set.all()
+                ],
+                prefetch_related=(Prefetch('extension_set', queryset=Extension.objects.order_by('id')),),
+            ),
+        },
+        default_fields=('id', 'status', 'employee', 'device', 'ai_priority_score', 'created_at'),
+        tables=('request', 'extension', 'employee', 'device'),
+        filters={
+            'status': ('status', dict(Request.STATUS_CHOICES)),
+            'employee': ('employee_id', None),
+            'device': ('device_id', None),
+        },
+    ),
+    'repairs': Resource(
+        model=Repair,
+        fields={
+            'id': attribute('id'),
+            'device': related('device', 'inventory_number'),
+            'reported_by': related('reported_by', 'full_name'),
+            'assigned_tech': related('assigned_tech', 'username'),
+            'description': attribute('description'),
+            'status': attribute('status'),
+            'created_at': attribute('created_at'),
+            'completed_at': attribute('completed_at'),
+        },
+        default_fields=('id', 'device', 'status', 'created_at', 'completed_at'),
+        tables=('repair', 'device', 'employee'),
+        filters={
+            'status': ('status', dict(Repair.STATUS_CHOICES)),
+            'device': ('device_id', None),
+        },
+    ),
+    'movements': Resource(
+        model=EquipmentMovement,
+        fields={
+            'id': attribute('id'),
+            'device': related('device', 'inventory_number'),
+            'employee': related('employee', 'full_name'),
+            'movement_type': attribute('movement_type'),
+            'timestamp': attribute('timestamp'),
+            'notes': attribute('notes'),
+        },
+        default_fields=('id', 'device', 'employee', 'movement_type', 'timestamp'),
+        tables=('movement', 'device', 'employee'),
+        filters={
+            'movement_type': ('movement_type', dict(EquipmentMovement.MOVEMENT_CHOICES)),
+            'device': ('device_id', None),
+            'employee': ('employee_id', None),
+        },
+    ),
+}
+
+
+def api_error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_auth(view_func):
+    """Доступ по токену API_TOKEN (Authorization: Bearer) или по сессии администратора, техника, аналитика"""
+    def wrapper(request, *args, **kwargs):
+        if bearer_matches(request.headers.get('Authorization'), settings.API_TOKEN):
+            return view_func(request, *args, **kwargs)
+        if not request.user.is_authenticated:
+            return api_error('Требуется аутентификация', 401)
+        if get_user_role(request) not in API_ROLES:
+            return api_error('Недостаточно прав', 403)
+        return view_func(request, *args, **kwargs)
+
+    return wrapper
+
+
+def table_versions(request, resource):
+    """Версии таблиц ресурса; читаются один раз на запрос (ETag и Last-Modified)"""
+    if not hasattr(request, '_api_versions'):
+        request._api_versions = get_versions(RESOURCES[resource].tables) if resource in RESOURCES else {}
+    return request._api_versions
+
+
+def resource_etag(request, resource):
+    versions = table_versions(request, resource)
+    if not versions:
+        return None
+    # Ответ зависит от версий таблиц и от параметров (поля, курсор, фильтры)
+    key = '|'.join([API_VERSION, resource, *(f'{name}={versions[name][0]}' for name in sorted(versions)),
+                    request.GET.urlencode()])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def resource_last_modified(request, resource):
+    stamps = [updated_at for _, updated_at in table_versions(request, resource).values() if updated_at]
+    return max(stamps) if stamps else None
+
+
+@require_GET
+@api_auth
+@condition(etag_func=resource_etag, last_modified_func=resource_last_modified)
+def resource_list(request, resource):
+    """
+    Список объектов ресурса с курсорной пагинацией
+
+    ?fields=id,model — состав полей; связи подгружаются только для
+    выбранных полей. При неизменных таблицах ответ 304 отдаётся по
+    ETag/Last-Modified до выборки и сериализации.
+    """
+    if resource not in RESOURCES:
+        return api_error('Неизвестный ресурс', 404)
+    spec = RESOURCES[resource]
+
+    fields = [name for name in request.GET.get('fields', '').split(',') if name] or list(spec.default_fields)
+    unknown = [name for name in fields if name not in spec.fields]
+    if unknown:
+        return api_error(f"Неизвестные поля: {', '.join(unknown)}", 400)
+
+    filters = {}
+    for param, (field, choices) in spec.filters.items():
+        value = request.GET.get(param)
+        if value is None:
+            continue
+        if choices is None and not value.isdigit() or choices is not None and value not in choices:
+            return api_error(f'Неверное значение фильтра {param}', 400)
+        filters[field] = value
+
+    page_size = request.GET.get('page_size', '')
+    page_size = min(int(page_size), API_MAX_PAGE_SIZE) if page_size.isdigit() and int(page_size) > 0 else API_PAGE_SIZE
+
+    queryset = spec.model.objects.filter(**filters)
+    select_related = {path for name in fields for path in spec.fields[name].select_related}
+    if select_related:
+        queryset = queryset.select_related(*sorted(select_related))
+    for name in fields:
+        if spec.fields[name].prefetch_related:
+            queryset = queryset.prefetch_related(*spec.fields[name].prefetch_related)
+
+    page = keyset_paginate(queryset, ('id',), request.GET.get('cursor'), page_size)
+
+    links = {}
+    query = request.GET.copy()
+    for name, cursor in (('next', page.next_cursor), ('previous', page.previous_cursor)):
+        if cursor:
+            query['cursor'] = cursor
+            links[name] = f'{request.path}?{query.urlencode()}'
+
+    return JsonResponse({
+        'results': [{name: spec.fields[name].getter(obj) for name in fields} for obj in page.items],
+        'next': links.get('next'),
+        'previous': links.get('previous'),
+    })
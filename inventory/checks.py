@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Кэши, содержимое которых видно только одному процессу
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Кэш по умолчанию должен быть общим для процессов (manage.py check --deploy)
+
+    В нём services.roles.invalidate_role оставляет метку смены роли: с кэшем
+    процесса разжалованный администратор сохранит права в других процессах
+    до истечения USER_ROLE_CACHE_TTL.
+    """
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        'Кэш по умолчанию виден только одному процессу: смена роли пользователя не дойдёт до остальных',
+        hint='Задайте REDIS_URL или другой общий кэш в CACHES',
+        id='inventory.E001',
+    )]
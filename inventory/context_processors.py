@@ -0,0 +1,6 @@
+from .services.roles import get_user_role
+
+
+def user_role(request):
+    """Роль пользователя для шаблонов без обращения к user.userprofile"""
+    return {'user_role': get_user_role(request) if hasattr(request, 'user') else None}
@@ -1,6 +1,7 @@
 from django.http import HttpResponseForbidden
 from django.shortcuts import redirect
-from .models import UserProfile
+
+from .services.roles import get_user_role
 
 
 def role_required(allowed_roles):
@@ -9,20 +10,11 @@ def role_required(allowed_roles):
             if not request.user.is_authenticated:
                 return redirect('login')
 
-            try:
-                user_profile = UserProfile.objects.get(user=request.user)
-                if user_profile.role not in allowed_roles:
-                    return HttpResponseForbidden("Недостаточно прав")
-            except UserProfile.DoesNotExist:
-                user_profile = UserProfile.objects.create(
-                    user=request.user,
-                    role='employee'
-                )
-                if user_profile.role not in allowed_roles:
-                    return HttpResponseForbidden("Недостаточно прав")
+            if get_user_role(request) not in allowed_roles:
+                return HttpResponseForbidden("Недостаточно прав")
 
             return view_func(request, *args, **kwargs)
 
         return wrapper
 
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services.resilience import CircuitBreaker
+
+
+class Command(BaseCommand):
+    help = 'Показывает состояние выключателя вызовов GigaChat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Принудительно замкнуть выключатель')
+
+    def handle(self, *args, **options):
+        breaker = CircuitBreaker()
+        if options['reset']:
+            breaker.reset()
+            self.stdout.write(self.style.SUCCESS('Выключатель замкнут'))
+
+        snapshot = breaker.snapshot()
+        self.stdout.write(f"Выключатель: {snapshot['name']}")
+        self.stdout.write(f"Состояние: {snapshot['state']}")
+        self.stdout.write(
+            f"Окно: {snapshot['window_calls']} вызовов, {snapshot['window_failures']} ошибок "
+            f"({snapshot['error_rate']:.0%})"
+        )
+        if snapshot['opened_at']:
+            self.stdout.write(f"Разомкнут в: {snapshot['opened_at']:%d.%m.%Y %H:%M:%S}")
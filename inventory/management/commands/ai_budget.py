@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from inventory.models import AIAnalysisJob
+from inventory.services.resilience import RateLimiter
+
+
+class Command(BaseCommand):
+    help = 'Показывает остаток бюджета вызовов GigaChat'
+
+    def handle(self, *args, **options):
+        snapshot = RateLimiter().snapshot()
+        self.stdout.write(f"Ограничитель: {snapshot['name']}")
+        self.stdout.write(
+            f"Запросы: {snapshot['available_requests']:.1f} из {snapshot['burst']} "
+            f"(пополнение {snapshot['requests_per_second']:g}/с)"
+        )
+        if snapshot['tokens_per_day']:
+            self.stdout.write(
+                f"Токены за {snapshot['day']:%d.%m.%Y}: {snapshot['day_tokens']} из {snapshot['tokens_per_day']}, "
+                f"осталось {snapshot['tokens_left']}"
+            )
+        else:
+            self.stdout.write(f"Токены за {snapshot['day']:%d.%m.%Y}: {snapshot['day_tokens']} (без лимита)")
+
+        deferred = AIAnalysisJob.objects.filter(
+            status=AIAnalysisJob.STATUS_PENDING, run_after__isnull=False
+        ).count()
+        if deferred:
+            self.stdout.write(f'Отложено заданий очереди: {deferred}')
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from inventory.models import AIAnalysis, AIAnalysisJob
+from inventory.services.ai_metrics import percentile
+from inventory.services.resilience import CircuitBreaker
+
+
+class Command(BaseCommand):
+    help = 'Сводка работы AI-анализа по истории AIAnalysis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+                            help='За сколько последних дней считать статистику')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        history = AIAnalysis.objects.filter(created_at__gte=since)
+
+        by_source = {
+            row['source']: row
+            for row in history.values('source').annotate(
+                total=Count('id'), tokens_in=Sum('tokens_in'), tokens_out=Sum('tokens_out')
+            )
+        }
+        total = sum(row['total'] for row in by_source.values())
+
+        self.stdout.write(f"Анализов за {options['days']} дн.: {total}")
+        for source, label in AIAnalysis.SOURCE_CHOICES:
+            count = by_source.get(source, {}).get('total', 0)
+            self.stdout.write(f'  {label}: {count} ({share(count, total):.1%})')
+
+        without_llm = sum(
+            by_source.get(source, {}).get('total', 0)
+            for source in (AIAnalysis.SOURCE_CACHE, AIAnalysis.SOURCE_LOCAL, AIAnalysis.SOURCE_DUPLICATE)
+        )
+        fallbacks = by_source.get(AIAnalysis.SOURCE_FALLBACK, {}).get('total', 0)
+        self.stdout.write(f'Без обращения к модели: {share(without_llm, total):.1%}')
+        self.stdout.write(f'Ошибки анализа: {share(fallbacks, total):.1%}')
+
+        latencies = sorted(
+            history.filter(
+                source__in=[AIAnalysis.SOURCE_LLM, AIAnalysis.SOURCE_BATCH],
+                latency_ms__isnull=False,
+            ).values_list('latency_ms', flat=True)
+        )
+        if latencies:
+            self.stdout.write(
+                'Задержка модели, мс: '
+                f'p50={percentile(latencies, 50):.0f} '
+                f'p90={percentile(latencies, 90):.0f} '
+                f'p99={percentile(latencies, 99):.0f}'
+            )
+
+        tokens_in = sum(row['tokens_in'] or 0 for row in by_source.values())
+        tokens_out = sum(row['tokens_out'] or 0 for row in by_source.values())
+        self.stdout.write(f'Токены: {tokens_in} в промптах, {tokens_out} в ответах')
+
+        jobs = dict(AIAnalysisJob.objects.values_list('status').annotate(total=Count('id')))
+        self.stdout.write(
+            'Очередь: ' + ', '.join(
+                f'{label.lower()} {jobs.get(status, 0)}' for status, label in AIAnalysisJob.STATUS_CHOICES
+            )
+        )
+        self.stdout.write(f"Выключатель: {CircuitBreaker().snapshot()['state']}")
+
+
+def share(part, total):
+    return part / total if total else 0.0
+
@@ -0,0 +1,177 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import Device, DeviceType, Employee, Request
+from inventory.services.ai_analysis import analyze_requests
+from inventory.services.ai_cache import AnalysisCache
+from inventory.services.ai_metrics import percentile
+from inventory.services.cassette import CassetteClient
+from inventory.services.gigachat_service import GigaChatService
+from inventory.services.resilience import CircuitBreaker, RateLimiter
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет корпус заявок через AI-конвейер (промпт, клиент, разбор) '
+        'на записанных ответах GigaChat и сравнивает результат с разметкой'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help='JSONL: employee_position, device_type, purpose '
+                                           '[, priority_score, tags — разметка]')
+        parser.add_argument('--cassette', required=True, help='Файл кассеты с ответами GigaChat')
+        parser.add_argument('--record', action='store_true',
+                            help='Обращаться к GigaChat и записывать ответы в кассету')
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Задержка до ответа при воспроизведении, сек')
+        parser.add_argument('--chunk-latency', type=float, default=0.0,
+                            help='Задержка между частями потокового ответа, сек')
+        parser.add_argument('--batch-size', type=int, default=1,
+                            help='Заявок в одном вызове конвейера (1 — как воркер с --batch-size 1). '
+                                 'Пакетный промпт содержит id заявок — номера строк корпуса, поэтому '
+                                 'пакетные ответы воспроизводятся только с тем же --batch-size')
+        parser.add_argument('--with-shortcuts', action='store_true',
+                            help='Не отключать кэш, локальный классификатор и поиск похожих заявок')
+        parser.add_argument('--export', action='store_true',
+                            help='Записать в corpus заявки из БД с текущим анализом (заготовка разметки)')
+
+    def handle(self, *args, **options):
+        if options['export']:
+            return self.export_corpus(options['corpus'])
+
+        corpus = self.load_corpus(options['corpus'])
+        mode = CassetteClient.MODE_RECORD if options['record'] else CassetteClient.MODE_REPLAY
+        client = CassetteClient(
+            options['cassette'],
+            mode=mode,
+            latency=options['latency'],
+            chunk_latency=options['chunk_latency'],
+        )
+        self.stdout.write(f'Корпус: {len(corpus)} заявок, в кассете записей: {client.size}')
+
+        service = GigaChatService(client=client)
+        if mode == CassetteClient.MODE_REPLAY:
+            # Воспроизведение не обращается к API: ограничивать и размыкать нечего
+            service.breaker = None
+            service.rate_limiter = RateLimiter(name='benchmark', requests_per_second=10 ** 6,
+                                               burst=10 ** 6, tokens_per_day=0)
+        else:
+            # Запись идёт в настоящий GigaChat с частотой приложения, но бюджет и выключатель
+            # у неё свои: прогон не блокирует строки 'gigachat' и не влияет на рабочие вызовы
+            service.breaker = CircuitBreaker(name='benchmark')
+            service.rate_limiter = RateLimiter(name='benchmark')
+        if not options['with_shortcuts']:
+            service.local_classifier = None
+            # Кэш только в памяти: общий кэш в БД не читается и не очищается
+            service.cache = AnalysisCache(persistent=False)
+
+        latencies = []
+        requests = self.build_requests(corpus)
+        started = time.perf_counter()
+        batch_size = max(1, options['batch_size'])
+        for start in range(0, len(requests), batch_size):
+            batch = requests[start:start + batch_size]
+            batch_started = time.perf_counter()
+            analyze_requests(batch, service=service, save=False, near_duplicates=options['with_shortcuts'])
+            latencies += [time.perf_counter() - batch_started] * len(batch)
+        elapsed = time.perf_counter() - started
+
+        self.report(corpus, requests, latencies, elapsed)
+
+    def report(self, corpus, requests, latencies, elapsed):
+        latencies = sorted(latencies)
+        self.stdout.write(f'Время: {elapsed:.2f} с, пропускная способность: {len(requests) / elapsed:.1f} заявок/с')
+        self.stdout.write(
+            f'Задержка, мс: p50={percentile(latencies, 50) * 1000:.1f} '
+            f'p99={percentile(latencies, 99) * 1000:.1f} max={latencies[-1] * 1000:.1f}'
+        )
+
+        labelled = [(item, request_obj) for item, request_obj in zip(corpus, requests) if 'priority_score' in item]
+        if not labelled:
+            self.stdout.write('Разметки нет: согласие с ней не считается')
+            return
+
+        exact = sum(request_obj.ai_priority_score == item['priority_score'] for item, request_obj in labelled)
+        close = sum(abs(request_obj.ai_priority_score - item['priority_score']) <= 1 for item, request_obj in labelled)
+        mae = sum(abs(request_obj.ai_priority_score - item['priority_score']) for item, request_obj in labelled)
+        self.stdout.write(
+            f'Приоритет ({len(labelled)} размеченных): совпадение {exact / len(labelled):.1%}, '
+            f'±1 {close / len(labelled):.1%}, средняя ошибка {mae / len(labelled):.2f}'
+        )
+
+        true_positive = predicted = expected = 0
+        for item, request_obj in labelled:
+            if 'tags' not in item:
+                continue
+            predicted_tags, expected_tags = set(request_obj.ai_tags or []), set(item['tags'])
+            true_positive += len(predicted_tags & expected_tags)
+            predicted += len(predicted_tags)
+            expected += len(expected_tags)
+        precision = true_positive / predicted if predicted else 0.0
+        recall = true_positive / expected if expected else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        self.stdout.write(f'Теги: точность {precision:.1%}, полнота {recall:.1%}, F1 {f1:.1%}')
+
+    @staticmethod
+    def build_requests(corpus):
+        """
+        Заявки корпуса без сохранения в БД
+
+        Прогон ничего не пишет в рабочие таблицы: не ставит задания в
+        очередь, не сдвигает счётчики оборудования и версии таблиц API.
+        id заявки — номер строки корпуса.
+        """
+        device_types = {}
+        requests = []
+        for index, item in enumerate(corpus, start=1):
+            device_type = device_types.setdefault(item['device_type'], DeviceType(name=item['device_type']))
+            requests.append(Request(
+                pk=index,
+                employee=Employee(full_name=f'Benchmark {index}', position=item['employee_position']),
+                device=Device(inventory_number=f'BENCH-{index:06d}', model='Benchmark', device_type=device_type),
+                purpose=item['purpose'],
+            ))
+        return requests
+
+    @staticmethod
+    def load_corpus(path):
+        corpus = []
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    raise CommandError(f'{path}:{line_number}: неверный JSON')
+                missing = {'employee_position', 'device_type', 'purpose'} - set(item)
+                if missing:
+                    raise CommandError(f"{path}:{line_number}: нет полей {', '.join(sorted(missing))}")
+                corpus.append(item)
+        if not corpus:
+            raise CommandError(f'Корпус {path} пуст')
+        return corpus
+
+    def export_corpus(self, path):
+        requests = (
+            Request.objects.exclude(purpose='')
+            .select_related('employee', 'device__device_type')
+            .order_by('id')
+        )
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for request_obj in requests.iterator(chunk_size=500):
+                item = {
+                    'employee_position': request_obj.employee.position,
+                    'device_type': request_obj.device.device_type.name,
+                    'purpose': request_obj.purpose,
+                }
+                if request_obj.ai_priority_score is not None:
+                    item['priority_score'] = request_obj.ai_priority_score
+                    item['tags'] = request_obj.ai_tags or []
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'Записано заявок: {count}'))
+
@@ -0,0 +1,79 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Coalesce
+
+from inventory.models import Device, EquipmentMovement, Repair, Request
+
+# Полный проход по таблице в плане PostgreSQL («Seq Scan on t») и SQLite («SCAN t» без индекса)
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING)'),
+}
+
+
+def hot_queries():
+    """Частые выборки приложения с типичными значениями параметров"""
+    device_id = Device.objects.values_list('id', flat=True).first() or 0
+    employee_id = Request.objects.values_list('employee_id', flat=True).first() or 0
+    return {
+        'device_list: активная заявка на устройство': Device.objects.filter(status=Device.STATUS_AVAILABLE).annotate(
+            has_pending_request=Exists(
+                Request.objects.filter(device=OuterRef('pk'), status=Request.STATUS_PENDING)
+            )
+        ).order_by('status', 'device_type_id', 'id')[:51],
+        'device_list: оборудование сотрудника': Request.objects.filter(
+            employee_id=employee_id, status=Request.STATUS_APPROVED
+        ).values_list('device_id', flat=True),
+        'Request.clean: дубль заявки': Request.objects.filter(
+            device_id=device_id, status=Request.STATUS_PENDING
+        ),
+        'manage_requests: очередь': Request.objects.filter(status=Request.STATUS_PENDING).order_by(
+            Coalesce('ai_priority_score', 0).desc(), 'created_at', 'id'
+        ),
+        'Request.save: активный ремонт устройства': Repair.objects.filter(
+            device_id=device_id, status=Repair.STATUS_REPAIRING
+        ),
+        'repair_list: активные ремонты': Repair.objects.filter(status=Repair.STATUS_REPAIRING),
+        'equipment_report: последние движения': EquipmentMovement.objects.order_by('-timestamp')[:10],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Выполняет EXPLAIN для частых запросов и отмечает полные проходы по таблицам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Печатать планы целиком')
+        parser.add_argument('--no-seqscan', action='store_true',
+                            help='PostgreSQL: запретить планировщику Seq Scan (enable_seqscan = off), '
+                                 'чтобы проверить применимость индексов на маленькой базе')
+        parser.add_argument('--fail', action='store_true',
+                            help='Завершиться с ошибкой, если найден полный проход')
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'EXPLAIN не поддерживается для {connection.vendor}')
+
+        flagged = []
+        with transaction.atomic():
+            if options['no_seqscan'] and connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset in hot_queries().items():
+                plan = queryset.explain()
+                tables = sorted(set(pattern.findall(plan)))
+                if tables:
+                    flagged.append(name)
+                    self.stdout.write(self.style.WARNING(f"{name}: полный проход по {', '.join(tables)}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'{name}: индекс'))
+                if options['verbose_plans'] or tables:
+                    for line in plan.splitlines():
+                        self.stdout.write(f'    {line}')
+
+        if flagged and options['fail']:
+            raise CommandError(f'Полных проходов: {len(flagged)}')
@@ -0,0 +1,46 @@
+import sys
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory.models import EquipmentMovement
+from inventory.services.movement_export import EXPORT_FORMATS, export_chunks, iter_movements
+
+
+class Command(BaseCommand):
+    help = 'Выгружает журнал движений оборудования в CSV, JSON Lines или XLSX потоком, без загрузки в память'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv', help='Формат выгрузки')
+        parser.add_argument('--output', default='-', help='Файл выгрузки (по умолчанию stdout)')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help='С даты (ГГГГ-ММ-ДД)')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help='По дату включительно')
+        parser.add_argument('--movement-type', choices=[value for value, _ in EquipmentMovement.MOVEMENT_CHOICES],
+                            help='Только операции этого типа')
+        parser.add_argument('--device-type', type=int, help='id типа оборудования')
+        parser.add_argument('--employee', type=int, help='id сотрудника')
+        parser.add_argument('--chunk-size', type=int, default=settings.EXPORT_CHUNK_SIZE,
+                            help='Строк в одной порции курсора')
+
+    def handle(self, *args, **options):
+        filters = {
+            name: options[name]
+            for name in ('date_from', 'date_to', 'movement_type', 'device_type', 'employee')
+            if options[name]
+        }
+        rows = iter_movements(filters, chunk_size=options['chunk_size'])
+        chunks = export_chunks(options['format'], rows)
+
+        if options['output'] == '-':
+            self.write_chunks(chunks, sys.stdout.buffer)
+            return
+        with open(options['output'], 'wb') as f:
+            self.write_chunks(chunks, f)
+        self.stderr.write(self.style.SUCCESS(f"Журнал выгружен в {options['output']}"))
+
+    @staticmethod
+    def write_chunks(chunks, stream):
+        for chunk in chunks:
+            stream.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        stream.flush()
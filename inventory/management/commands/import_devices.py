@@ -0,0 +1,41 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.services.device_import import IMPORT_CHUNK_SIZE, DeviceImportError, import_devices
+
+
+class Command(BaseCommand):
+    help = 'Загружает оборудование из CSV (COPY в PostgreSQL, bulk_create в SQLite) и сообщает об отклонённых строках'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV со столбцами inventory_number, model, device_type '
+                                         '[, purchase_date, responsible_email]')
+        parser.add_argument('--rejected', help='Записать отклонённые строки в этот CSV')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Кодировка файла')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+                            help='Строк в одном bulk_create (SQLite)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options['path'], encoding=options['encoding'], newline='') as f:
+                result = import_devices(f, chunk_size=options['chunk_size'])
+        except (OSError, UnicodeDecodeError, DeviceImportError) as error:
+            raise CommandError(str(error))
+
+        if options['rejected']:
+            with open(options['rejected'], 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['line', 'inventory_number', 'reason'])
+                writer.writerows((row.line, row.inventory_number, row.reason) for row in result.rejected)
+        else:
+            for row in result.rejected:
+                self.stderr.write(f'Строка {row.line} ({row.inventory_number}): {row.reason}')
+
+        style = self.style.SUCCESS if not result.rejected else self.style.WARNING
+        self.stdout.write(style(
+            f'Загружено устройств: {result.created}, отклонено строк: {len(result.rejected)} '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,165 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from inventory.models import Request
+from inventory.services.ai_analysis import analyze_requests, save_analysis_results, stale_requests
+from inventory.services.gigachat_service import AnalysisOutcome, GigaChatService
+from inventory.services.resilience import CircuitOpenError, RateLimiter, RateLimitExceeded
+
+
+class Command(BaseCommand):
+    help = 'Повторно выполняет AI-анализ заявок (например, после изменения промпта)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='append', choices=[s for s, _ in Request.STATUS_CHOICES],
+                            help='Статус заявки (можно указать несколько раз)')
+        parser.add_argument('--since', help='Заявки, созданные с даты (ГГГГ-ММ-ДД)')
+        parser.add_argument('--until', help='Заявки, созданные по дату включительно (ГГГГ-ММ-ДД)')
+        parser.add_argument('--missing-score', action='store_true',
+                            help='Только заявки без оценки приоритета')
+        parser.add_argument('--stale', action='store_true',
+                            help='Только заявки, проанализированные другой версией промпта или с ошибкой')
+        parser.add_argument('--workers', type=int, default=settings.AI_WORKERS,
+                            help='Количество параллельных запросов к GigaChat')
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Заявок в одном чанке (сохраняется одним bulk_update)')
+        parser.add_argument('--checkpoint', default=str(settings.BASE_DIR / 'reanalyze_checkpoint.json'),
+                            help='Файл контрольной точки')
+        parser.add_argument('--restart', action='store_true',
+                            help='Игнорировать контрольную точку и начать сначала')
+
+    def handle(self, *args, **options):
+        filters = {
+            'status': sorted(options['status'] or []),
+            'since': options['since'],
+            'until': options['until'],
+            'missing_score': options['missing_score'],
+            'stale': options['stale'],
+        }
+        queryset = self.build_queryset(filters)
+
+        checkpoint = self.load_checkpoint(options['checkpoint'], filters, options['restart'])
+        last_id = checkpoint['last_id']
+        processed = checkpoint['processed']
+        # Заявки, анализ которых не удался; у kept из них сохранён прежний анализ (заглушка — только в истории)
+        fallbacks = checkpoint.get('fallbacks', 0)
+        kept = checkpoint.get('kept', 0)
+        if last_id:
+            self.stdout.write(f'Продолжаем с заявки #{last_id} (уже обработано: {processed})')
+
+        remaining = queryset.filter(id__gt=last_id).count()
+        total = processed + remaining
+        self.stdout.write(f'Заявок к анализу: {remaining}')
+
+        # Фоновый переанализ не расходует резерв бюджета, оставленный новым заявкам
+        service = GigaChatService(priority=RateLimiter.PRIORITY_LOW)
+        sub_batch = settings.GIGACHAT_BATCH_MAX_ITEMS
+        started = time.monotonic()
+        done_in_run = 0
+
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            while True:
+                # Выборка по ключу (id > last_id): стоимость не растёт к концу таблицы
+                chunk = list(
+                    queryset.filter(id__gt=last_id)
+                    .select_related('employee', 'device__device_type')
+                    .order_by('id')[:options['chunk_size']]
+                )
+                if not chunk:
+                    break
+
+                batches = [chunk[i:i + sub_batch] for i in range(0, len(chunk), sub_batch)]
+                outcomes = {}
+                try:
+                    for batch_outcomes in executor.map(lambda batch: self.analyze_batch(batch, service), batches):
+                        outcomes.update(batch_outcomes)
+                except (RateLimitExceeded, CircuitOpenError) as e:
+                    raise CommandError(
+                        f'{e}: обработано {processed}/{total}. Запустите команду с теми же '
+                        f'параметрами через {max(1, round(e.retry_after / 60))} мин — '
+                        'она продолжит с контрольной точки'
+                    )
+
+                updated = {request_obj.pk for request_obj in save_analysis_results(chunk, outcomes)}
+                failed = [pk for pk, outcome in outcomes.items() if outcome.source == AnalysisOutcome.SOURCE_FALLBACK]
+                fallbacks += len(failed)
+                kept += sum(pk not in updated for pk in failed)
+
+                last_id = chunk[-1].id
+                processed += len(chunk)
+                done_in_run += len(chunk)
+                self.save_checkpoint(options['checkpoint'], filters, last_id, processed, fallbacks, kept)
+
+                rate = done_in_run / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f'Обработано {processed}/{total} ({rate:.1f} заявок/с)')
+
+        if os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+        self.stdout.write(self.style.SUCCESS(f'Повторный анализ завершён: {processed} заявок'))
+        if fallbacks:
+            self.stdout.write(self.style.WARNING(
+                f'Не удалось проанализировать: {fallbacks}, из них прежний анализ сохранён у {kept}. '
+                'Остальные можно повторить с --stale'
+            ))
+
+    @staticmethod
+    def analyze_batch(batch, service):
+        """Анализ пачки в потоке пула; результаты сохраняет основной поток"""
+        try:
+            return analyze_requests(batch, service=service, save=False)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def build_queryset(filters):
+        queryset = Request.objects.exclude(purpose='')
+        if filters['status']:
+            queryset = queryset.filter(status__in=filters['status'])
+        if filters['since']:
+            queryset = queryset.filter(created_at__date__gte=parse_date(filters['since']))
+        if filters['until']:
+            queryset = queryset.filter(created_at__date__lte=parse_date(filters['until']))
+        if filters['missing_score']:
+            queryset = queryset.filter(ai_priority_score__isnull=True)
+        if filters['stale']:
+            queryset = stale_requests(queryset)
+        return queryset
+
+    @staticmethod
+    def load_checkpoint(path, filters, restart):
+        empty = {'last_id': 0, 'processed': 0}
+        if restart or not os.path.exists(path):
+            return empty
+
+        with open(path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('filters') != filters:
+            raise CommandError(
+                'Контрольная точка создана с другими фильтрами. '
+                'Повторите с теми же параметрами или запустите с --restart'
+            )
+        return checkpoint
+
+    @staticmethod
+    def save_checkpoint(path, filters, last_id, processed, fallbacks, kept):
+        # Пишем во временный файл и переименовываем, чтобы не оставить битый JSON
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'filters': filters, 'last_id': last_id, 'processed': processed, 'fallbacks': fallbacks, 'kept': kept,
+            }, f)
+        os.replace(tmp_path, path)
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Неверная дата: {value}, ожидается ГГГГ-ММ-ДД')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services.device_counters import device_stats, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики оборудования по статусам (DeviceStatusCounter) с нуля'
+
+    def handle(self, *args, **options):
+        mismatches = rebuild_counters()
+        stats = device_stats()
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f'Исправлено расхождений: {mismatches}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Счётчики перестроены: всего {stats['total']}, доступно {stats['available']}, "
+            f"в использовании {stats['in_use']}"
+        ))
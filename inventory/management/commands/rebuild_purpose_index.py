@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from inventory.models import AIAnalysis, PurposeLSHBucket, Request
+from inventory.services.near_duplicates import index_requests
+from inventory.services.prompts import PROMPT_VERSION
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает LSH-индекс целей заявок для поиска почти одинаковых заявок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Заявок в одном чанке')
+
+    def handle(self, *args, **options):
+        PurposeLSHBucket.objects.all().delete()
+
+        queryset = Request.objects.filter(
+            current_analysis__prompt_version=PROMPT_VERSION,
+            current_analysis__source__in=[AIAnalysis.SOURCE_LLM, AIAnalysis.SOURCE_BATCH],
+        ).exclude(purpose='').select_related('employee', 'device__device_type').order_by('id')
+
+        last_id = 0
+        indexed = 0
+        while True:
+            chunk = list(queryset.filter(id__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+            index_requests(chunk)
+            last_id = chunk[-1].id
+            indexed += len(chunk)
+            self.stdout.write(f'Проиндексировано заявок: {indexed}')
+
+        self.stdout.write(self.style.SUCCESS(f'Индекс перестроен: {indexed} заявок'))
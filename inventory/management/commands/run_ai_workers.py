@@ -0,0 +1,125 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from inventory.services.ai_metrics import METRICS_PATH, start_metrics_server
+from inventory.services.ai_queue import StaleJobSweeper, claim_jobs, process_jobs
+from inventory.services.gigachat_service import GigaChatService
+
+logger = logging.getLogger(__name__)
+
+# Предельная пауза перед повтором после ошибки цикла воркера, сек
+MAX_ERROR_BACKOFF = 60
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркеры очереди AI-анализа заявок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.AI_WORKERS,
+                            help='Количество параллельных воркеров')
+        parser.add_argument('--batch-size', type=int, default=settings.AI_WORKER_BATCH_SIZE,
+                            help='Сколько заданий воркер захватывает и анализирует одним запросом')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Пауза между опросами пустой очереди, сек')
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать очередь и завершиться')
+        parser.add_argument('--metrics-port', type=int,
+                            help='Порт HTTP-сервера метрик Prometheus (путь /metrics). Счётчики у каждого '
+                                 'процесса свои: каждый процесс воркеров — отдельная цель сбора')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        stop_event = threading.Event()
+        counters = {'processed': 0}
+        counters_lock = threading.Lock()
+
+        # Зависшие задания возвращаются при старте и затем периодически из цикла воркеров
+        sweeper = StaleJobSweeper()
+        requeued = sweeper.maybe_run()
+        if requeued:
+            self.stdout.write(f'Возвращено в очередь зависших заданий: {requeued}')
+
+        if options['metrics_port']:
+            start_metrics_server(options['metrics_port'])
+            self.stdout.write(f"Метрики этого процесса: http://0.0.0.0:{options['metrics_port']}{METRICS_PATH}")
+
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        threads = []
+        for index in range(workers):
+            thread = threading.Thread(
+                target=self.worker_loop,
+                args=(f'{prefix}:{index}', stop_event, counters, counters_lock, sweeper, options),
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+
+        self.stdout.write(f'Запущено воркеров: {workers}')
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stdout.write('Остановка воркеров...')
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS(f"Обработано заданий: {counters['processed']}"))
+
+    def worker_loop(self, worker_name, stop_event, counters, counters_lock, sweeper, options):
+        """
+        Цикл одного воркера: захват заданий, анализ, запись результата
+
+        Ошибка итерации (БД недоступна, оборвалось соединение) не завершает
+        поток: она записывается в лог, и после паузы, удваивающейся с каждой
+        ошибкой подряд, цикл продолжается с новым соединением.
+        """
+        service = GigaChatService()
+        failures = 0
+
+        try:
+            while not stop_event.is_set():
+                # Оборванное или устаревшее соединение заменяется новым
+                close_old_connections()
+                try:
+                    requeued = sweeper.maybe_run()
+                    if requeued:
+                        self.stdout.write(f'{worker_name}: возвращено в очередь зависших заданий: {requeued}')
+
+                    jobs = claim_jobs(worker_name, limit=options['batch_size'])
+                    if not jobs:
+                        if options['once']:
+                            return
+                        failures = 0
+                        stop_event.wait(options['poll_interval'])
+                        continue
+
+                    started = time.monotonic()
+                    processed = process_jobs(jobs, service=service)
+                except Exception:
+                    failures += 1
+                    delay = min(options['poll_interval'] * 2 ** failures, MAX_ERROR_BACKOFF)
+                    logger.exception('%s: ошибка цикла воркера, повтор через %.1f с', worker_name, delay)
+                    stop_event.wait(delay)
+                    continue
+
+                failures = 0
+                with counters_lock:
+                    counters['processed'] += processed
+
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f'{worker_name}: {processed}/{len(jobs)} за {time.monotonic() - started:.2f} с'
+                    )
+        finally:
+            # У каждого потока своё соединение с БД
+            connection.close()
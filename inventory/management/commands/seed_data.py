@@ -1,5 +1,8 @@
 from django.core.management.base import BaseCommand
-from inventory.models import DeviceType, Employee, Device, Request, UserProfile, Repair
+from inventory.models import DeviceType, DeviceStatusCounter, Employee, Device, Request, UserProfile, Repair
+from inventory.services.ai_queue import run_pending_jobs
+from inventory.services.gigachat_service import GigaChatService
+from inventory.services.resilience import RateLimiter
 from django.contrib.auth.models import User
 
 
@@ -25,6 +28,7 @@ class Command(BaseCommand):
         Repair.objects.all().delete()
         Request.objects.all().delete()
         Device.objects.all().delete()
+        DeviceStatusCounter.objects.all().delete()
         Employee.objects.all().delete()
         DeviceType.objects.all().delete()
         UserProfile.objects.all().delete()
@@ -117,21 +121,21 @@ class Command(BaseCommand):
             employee = Employee.objects.get(email=req_data['employee_email'])
             device = Device.objects.get(inventory_number=req_data['device_number'])
 
-            request = Request.objects.create(
+            Request.objects.create(
                 employee=employee,
                 device=device,
                 status=req_data['status'],
                 purpose=req_data['purpose']
             )
 
-            try:
-                request.analyze_with_ai()
-                self.stdout.write(f'AI-анализ выполнен для заявки #{request.id}')
-            except Exception as e:
-                self.stdout.write(f'Ошибка AI-анализа для заявки #{request.id}: {e}')
-
         self.stdout.write('Созданы заявки')
 
+        # Заявки попадают в очередь AI-анализа, обрабатываем её сразу; при нехватке
+        # бюджета вызовов задания остаются отложенными в очереди для воркеров
+        service = GigaChatService(priority=RateLimiter.PRIORITY_LOW)
+        processed = run_pending_jobs(worker_name='seed_data', service=service)
+        self.stdout.write(f'AI-анализ выполнен для заявок: {processed}')
+
     def create_repairs(self):
         """Создаём ремонты"""
         repairs_data = [
@@ -179,10 +183,9 @@ class Command(BaseCommand):
                 password=user_data['password']
             )
 
-            UserProfile.objects.create(
-                user=user,
-                role=user_data['role']
-            )
+            # Профиль создаётся сигналом вместе с пользователем
+            user.userprofile.role = user_data['role']
+            user.userprofile.save()
 
             if user_data['employee_email']:
                 employee = Employee.objects.get(email=user_data['employee_email'])
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory.services.local_classifier import save_model, train_model
+
+
+class Command(BaseCommand):
+    help = 'Обучает локальный предклассификатор заявок на прошлых ответах GigaChat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-samples', type=int, default=20,
+                            help='Минимальное количество заявок, проанализированных GigaChat')
+        parser.add_argument('--output', default=settings.AI_LOCAL_CLASSIFIER_PATH,
+                            help='Путь к файлу модели')
+
+    def handle(self, *args, **options):
+        model = train_model(min_samples=options['min_samples'])
+        if model is None:
+            self.stdout.write(self.style.WARNING(
+                'Недостаточно заявок, проанализированных GigaChat, работают только правила'
+            ))
+            return
+
+        save_model(model, options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Модель сохранена в {options['output']}: {len(model.idf)} признаков, "
+            f"{len(model.tag_weights)} тегов"
+        ))
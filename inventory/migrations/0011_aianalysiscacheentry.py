@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_aianalysisjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIAnalysisCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Ключ')),
+                ('prompt_version', models.CharField(max_length=32, verbose_name='Версия промпта')),
+                ('result', models.JSONField(verbose_name='Результат анализа')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Попаданий')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, verbose_name='Последнее использование')),
+            ],
+            options={
+                'verbose_name': 'Кэш AI-анализа',
+                'verbose_name_plural': 'Кэш AI-анализа',
+                'indexes': [models.Index(fields=['last_used_at'], name='aicache_last_used_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_aianalysiscacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AICircuitBreaker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Название')),
+                ('state', models.CharField(choices=[('closed', 'Замкнут'), ('open', 'Разомкнут'), ('half_open', 'Пробный вызов')], default='closed', max_length=20, verbose_name='Состояние')),
+                ('window_started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало окна')),
+                ('window_calls', models.PositiveIntegerField(default=0, verbose_name='Вызовов в окне')),
+                ('window_failures', models.PositiveIntegerField(default=0, verbose_name='Ошибок в окне')),
+                ('opened_at', models.DateTimeField(blank=True, null=True, verbose_name='Разомкнут в')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Выключатель AI',
+                'verbose_name_plural': 'Выключатели AI',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_aicircuitbreaker'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('llm', 'GigaChat'), ('batch', 'GigaChat (пакетный запрос)'), ('cache', 'Кэш'), ('local', 'Локальный классификатор'), ('fallback', 'Ошибка анализа')], max_length=20, verbose_name='Источник')),
+                ('prompt_version', models.CharField(max_length=32, verbose_name='Версия промпта')),
+                ('model_name', models.CharField(blank=True, max_length=100, verbose_name='Модель')),
+                ('latency_ms', models.FloatField(blank=True, null=True, verbose_name='Задержка, мс')),
+                ('tokens_in', models.PositiveIntegerField(blank=True, null=True, verbose_name='Токенов на входе')),
+                ('tokens_out', models.PositiveIntegerField(blank=True, null=True, verbose_name='Токенов на выходе')),
+                ('raw_response', models.TextField(blank=True, verbose_name='Ответ модели')),
+                ('result', models.JSONField(verbose_name='Результат анализа')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_analyses', to='inventory.request', verbose_name='Заявка')),
+            ],
+            options={
+                'verbose_name': 'AI-анализ',
+                'verbose_name_plural': 'История AI-анализов',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='current_analysis',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.aianalysis', verbose_name='Текущий AI-анализ'),
+        ),
+        migrations.AddIndex(
+            model_name='aianalysis',
+            index=models.Index(fields=['prompt_version', 'source'], name='aianalysis_version_source_idx'),
+        ),
+    ]
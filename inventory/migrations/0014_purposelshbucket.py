@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_aianalysis_request_current_analysis'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aianalysis',
+            name='source',
+            field=models.CharField(choices=[('llm', 'GigaChat'), ('batch', 'GigaChat (пакетный запрос)'), ('cache', 'Кэш'), ('local', 'Локальный классификатор'), ('duplicate', 'Похожая заявка'), ('fallback', 'Ошибка анализа')], max_length=20, verbose_name='Источник'),
+        ),
+        migrations.CreateModel(
+            name='PurposeLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(db_index=True, max_length=40, verbose_name='Корзина')),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purpose_buckets', to='inventory.request', verbose_name='Заявка')),
+            ],
+            options={
+                'verbose_name': 'LSH-корзина цели заявки',
+                'verbose_name_plural': 'LSH-индекс целей заявок',
+            },
+        ),
+    ]
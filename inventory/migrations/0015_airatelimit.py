@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_purposelshbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIRateLimit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Название')),
+                ('available_requests', models.FloatField(default=0, verbose_name='Доступно запросов')),
+                ('refilled_at', models.DateTimeField(blank=True, null=True, verbose_name='Пополнено в')),
+                ('day', models.DateField(blank=True, null=True, verbose_name='День')),
+                ('day_tokens', models.PositiveIntegerField(default=0, verbose_name='Токенов за день')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Лимит вызовов AI',
+                'verbose_name_plural': 'Лимиты вызовов AI',
+            },
+        ),
+        migrations.AddField(
+            model_name='aianalysisjob',
+            name='run_after',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Отложено до'),
+        ),
+    ]
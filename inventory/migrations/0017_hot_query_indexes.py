@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:04
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_device_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipmentmovement',
+            index=models.Index(fields=['-timestamp'], name='movement_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(condition=models.Q(('status', 'repairing')), fields=['device'], name='repair_active_device_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['device', 'status'], name='request_device_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['employee', 'status'], name='request_employee_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(models.OrderBy(django.db.models.functions.comparison.Coalesce('ai_priority_score', 0), descending=True), models.F('created_at'), models.F('id'), condition=models.Q(('status', 'pending')), name='request_pending_priority_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    Device = apps.get_model('inventory', 'Device')
+    DeviceStatusCounter = apps.get_model('inventory', 'DeviceStatusCounter')
+    DeviceStatusCounter.objects.bulk_create([
+        DeviceStatusCounter(
+            device_type_id=row['device_type_id'],
+            status=row['status'],
+            is_written_off=row['is_written_off'],
+            count=row['total'],
+        )
+        for row in Device.objects.values('device_type_id', 'status', 'is_written_off').annotate(total=Count('id'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceStatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('available', 'Доступно'), ('in_use', 'В использовании'), ('broken', 'На ремонте')], max_length=20, verbose_name='Статус')),
+                ('is_written_off', models.BooleanField(default=False, verbose_name='Списано')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+                ('device_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.devicetype', verbose_name='Тип оборудования')),
+            ],
+            options={
+                'verbose_name': 'Счётчик оборудования',
+                'verbose_name_plural': 'Счётчики оборудования',
+                'constraints': [models.UniqueConstraint(fields=('device_type', 'status', 'is_written_off'), name='device_status_counter_unique')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_devicestatuscounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(fields=['created_at'], name='repair_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(fields=['device', 'created_at'], name='repair_device_created_idx'),
+        ),
+    ]
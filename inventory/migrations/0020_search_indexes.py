@@ -0,0 +1,79 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+# Выражения индексов повторяют services/search.py
+POSTGRES_INDEXES = [
+    ('device', GinIndex(SearchVector('inventory_number', 'model', config='russian'), name='device_search_idx')),
+    ('device', GinIndex(OpClass(Upper('inventory_number'), name='gin_trgm_ops'), name='device_number_trgm_idx')),
+    ('device', GinIndex(OpClass(Upper('model'), name='gin_trgm_ops'), name='device_model_trgm_idx')),
+    ('device', models.Index(OpClass(Upper('inventory_number'), name='text_pattern_ops'), name='device_number_prefix_idx')),
+    ('employee', GinIndex(SearchVector('full_name', 'email', config='russian'), name='employee_search_idx')),
+    ('employee', GinIndex(OpClass(Upper('full_name'), name='gin_trgm_ops'), name='employee_name_trgm_idx')),
+    ('employee', GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='employee_email_trgm_idx')),
+    ('request', GinIndex(SearchVector('purpose', 'ai_summary', config='russian'), name='request_search_idx')),
+]
+
+# SQLite: одна таблица FTS5; rowid = id * 3 + код типа (0 — оборудование, 1 — сотрудник, 2 — заявка)
+SQLITE_SOURCES = [
+    ('inventory_device', 0, "new.inventory_number || ' ' || new.model"),
+    ('inventory_employee', 1, "new.full_name || ' ' || new.email"),
+    ('inventory_request', 2, "new.purpose || ' ' || coalesce(new.ai_summary, '')"),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for model_name, index in POSTGRES_INDEXES:
+            schema_editor.add_index(apps.get_model('inventory', model_name), index)
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE inventory_search USING fts5("
+            "content, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        for table, code, content in SQLITE_SOURCES:
+            rowid = f'new.id * 3 + {code}'
+            old_rowid = f'old.id * 3 + {code}'
+            schema_editor.execute(
+                f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN '
+                f'INSERT INTO inventory_search (rowid, content) VALUES ({rowid}, {content}); END'
+            )
+            schema_editor.execute(
+                f'CREATE TRIGGER {table}_search_update AFTER UPDATE ON {table} BEGIN '
+                f'DELETE FROM inventory_search WHERE rowid = {old_rowid}; '
+                f'INSERT INTO inventory_search (rowid, content) VALUES ({rowid}, {content}); END'
+            )
+            schema_editor.execute(
+                f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN '
+                f'DELETE FROM inventory_search WHERE rowid = {old_rowid}; END'
+            )
+            schema_editor.execute(
+                f'INSERT INTO inventory_search (rowid, content) '
+                f"SELECT {rowid.replace('new.', '')}, {content.replace('new.', '')} FROM {table}"
+            )
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for model_name, index in POSTGRES_INDEXES:
+            schema_editor.remove_index(apps.get_model('inventory', model_name), index)
+    elif vendor == 'sqlite':
+        for table, _, _ in SQLITE_SOURCES:
+            for event in ('insert', 'update', 'delete'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_{event}')
+        schema_editor.execute('DROP TABLE IF EXISTS inventory_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_repair_report_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+TABLES = ['device', 'devicetype', 'employee', 'request', 'extension', 'repair', 'movement']
+
+
+def create_versions(apps, schema_editor):
+    TableVersion = apps.get_model('inventory', 'TableVersion')
+    TableVersion.objects.bulk_create([TableVersion(name=name) for name in TABLES])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Таблица')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменена')),
+            ],
+            options={
+                'verbose_name': 'Версия таблицы',
+                'verbose_name_plural': 'Версии таблиц',
+            },
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
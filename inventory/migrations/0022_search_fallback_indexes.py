@@ -0,0 +1,92 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models.functions import Upper
+
+# Выражения индексов повторяют services/search.py
+POSTGRES_INDEXES = [
+    ('employee', GinIndex(SearchVector('full_name', config='russian'), name='employee_name_search_idx')),
+    ('request', GinIndex(OpClass(Upper('purpose'), name='gin_trgm_ops'), name='request_purpose_trgm_idx')),
+    ('request', GinIndex(OpClass(Upper('ai_summary'), name='gin_trgm_ops'), name='request_summary_trgm_idx')),
+]
+
+# SQLite: email сотрудника переносится в отдельный столбец private, чтобы поиск
+# без права видеть email (services.search, include_private=False) не находил по нему
+SQLITE_SOURCES = [
+    ('inventory_device', 0, "new.inventory_number || ' ' || new.model", "''"),
+    ('inventory_employee', 1, 'new.full_name', 'new.email'),
+    ('inventory_request', 2, "new.purpose || ' ' || coalesce(new.ai_summary, '')", "''"),
+]
+OLD_SQLITE_SOURCES = [
+    ('inventory_device', 0, "new.inventory_number || ' ' || new.model"),
+    ('inventory_employee', 1, "new.full_name || ' ' || new.email"),
+    ('inventory_request', 2, "new.purpose || ' ' || coalesce(new.ai_summary, '')"),
+]
+
+
+def drop_sqlite_search(schema_editor, sources):
+    for source in sources:
+        for event in ('insert', 'update', 'delete'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {source[0]}_search_{event}')
+    schema_editor.execute('DROP TABLE IF EXISTS inventory_search')
+
+
+def create_sqlite_search(schema_editor, columns, sources):
+    """Таблица FTS5 с триггерами; sources — (таблица, код типа, выражения столбцов)"""
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE inventory_search USING fts5("
+        f"{', '.join(columns)}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    column_list = ', '.join(columns)
+    for table, code, *values in sources:
+        rowid = f'new.id * 3 + {code}'
+        old_rowid = f'old.id * 3 + {code}'
+        new_values = ', '.join(values)
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN '
+            f'INSERT INTO inventory_search (rowid, {column_list}) VALUES ({rowid}, {new_values}); END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_search_update AFTER UPDATE ON {table} BEGIN '
+            f'DELETE FROM inventory_search WHERE rowid = {old_rowid}; '
+            f'INSERT INTO inventory_search (rowid, {column_list}) VALUES ({rowid}, {new_values}); END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN '
+            f'DELETE FROM inventory_search WHERE rowid = {old_rowid}; END'
+        )
+        schema_editor.execute(
+            f'INSERT INTO inventory_search (rowid, {column_list}) '
+            f"SELECT {rowid.replace('new.', '')}, {new_values.replace('new.', '')} FROM {table}"
+        )
+
+
+def forwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for model_name, index in POSTGRES_INDEXES:
+            schema_editor.add_index(apps.get_model('inventory', model_name), index)
+    elif vendor == 'sqlite':
+        drop_sqlite_search(schema_editor, OLD_SQLITE_SOURCES)
+        create_sqlite_search(schema_editor, ['content', 'private'], SQLITE_SOURCES)
+
+
+def backwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for model_name, index in POSTGRES_INDEXES:
+            schema_editor.remove_index(apps.get_model('inventory', model_name), index)
+    elif vendor == 'sqlite':
+        drop_sqlite_search(schema_editor, SQLITE_SOURCES)
+        create_sqlite_search(schema_editor, ['content'], OLD_SQLITE_SOURCES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_tableversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
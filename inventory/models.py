@@ -1,5 +1,11 @@
+import logging
+
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
 
 
 class DeviceType(models.Model):
@@ -103,9 +109,32 @@ class Device(models.Model):
     def __str__(self):
         return f"{self.model} ({self.inventory_number})"
 
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет устройство и сдвигает счётчики DeviceStatusCounter
+
+        Прежнее состояние читается с блокировкой строки, поэтому
+        параллельные изменения одного устройства не сбивают счётчики.
+        """
+        from .services.device_counters import counter_key, shift_counters
+
+        with transaction.atomic():
+            old_key = None
+            if self.pk is not None:
+                old_key = Device.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'device_type_id', 'status', 'is_written_off'
+                ).first()
+            super().save(*args, **kwargs)
+            shift_counters(old_key, counter_key(self))
+
     class Meta:
         verbose_name = 'Оборудование'
         verbose_name_plural = 'Оборудование'
+        # Индексы под сортировки постраничного вывода инвентаря (views.DEVICE_SORT_ORDERS)
+        indexes = [
+            models.Index(fields=['status', 'device_type', 'id'], name='device_status_type_id_idx'),
+            models.Index(fields=['device_type', 'status', 'id'], name='device_type_status_id_idx'),
+        ]
 
     responsible_person = models.ForeignKey(Employee, on_delete=models.SET_NULL, null=True, blank=True,
                                            verbose_name='МОЛ')
@@ -114,6 +143,40 @@ class Device(models.Model):
     write_off_date = models.DateField(null=True, blank=True, verbose_name='Дата списания')
 
 
+class DeviceStatusCounter(models.Model):
+    """Количество устройств по типу, статусу и признаку списания (поддерживается в Device.save)"""
+    device_type = models.ForeignKey(
+        DeviceType,
+        on_delete=models.CASCADE,
+        verbose_name='Тип оборудования'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Device.STATUS_CHOICES,
+        verbose_name='Статус'
+    )
+    is_written_off = models.BooleanField(
+        default=False,
+        verbose_name='Списано'
+    )
+    count = models.IntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+
+    def __str__(self):
+        return f"{self.device_type} / {self.status}: {self.count}"
+
+    class Meta:
+        verbose_name = 'Счётчик оборудования'
+        verbose_name_plural = 'Счётчики оборудования'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['device_type', 'status', 'is_written_off'], name='device_status_counter_unique'
+            ),
+        ]
+
+
 class Request(models.Model):
     """Модель заявок на оборудование"""
 
@@ -184,6 +247,14 @@ class Request(models.Model):
         verbose_name='AI: Требует уточнений',
         help_text='Заявка требует дополнительных уточнений по мнению AI'
     )
+    current_analysis = models.ForeignKey(
+        'AIAnalysis',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Текущий AI-анализ'
+    )
 
     def save(self, *args, **kwargs):
         """
@@ -220,13 +291,12 @@ class Request(models.Model):
                 self.device.status = Device.STATUS_AVAILABLE
             self.device.save()
 
-        # AI-анализ для новых заявок
+        # AI-анализ для новых заявок выполняется воркерами очереди (run_ai_workers);
+        # задание ставится после фиксации, чтобы воркер не взял заявку из откатившейся транзакции
         if is_new and self.purpose:
-            try:
-                self.analyze_with_ai()
-            except Exception:
-                # Не ломаем сохранение заявки из-за ошибки AI
-                pass
+            from .services.ai_queue import enqueue_analysis
+
+            transaction.on_commit(lambda: enqueue_analysis(self))
 
     def delete(self, *args, **kwargs):
         if self.status == self.STATUS_APPROVED:
@@ -249,32 +319,13 @@ class Request(models.Model):
         данных сотрудника, оборудования и цели использования
         """
         try:
-            from .services.gigachat_service import GigaChatService
+            from .services.ai_analysis import analyze_requests
 
-            service = GigaChatService()
-
-            employee_position = getattr(self.employee, 'position', 'Не указана')
-            device_type = self.device.device_type.name
-
-            result = service.analyze_request(
-                employee_position=employee_position,
-                device_type=device_type,
-                purpose=self.purpose
-            )
-
-            self.ai_priority_score = result.get('priority_score', 5)
-            self.ai_tags = result.get('tags', [])
-            self.ai_summary = result.get('summary', '')
-            self.ai_needs_clarification = result.get('needs_clarification', False)
-
-            self.save(update_fields=[
-                'ai_priority_score', 'ai_tags', 'ai_summary',
-                'ai_needs_clarification'
-            ])
+            analyze_requests([self])
 
         except Exception:
             # Не прерываем работу системы из-за ошибок AI
-            pass
+            logger.exception('Ошибка AI-анализа заявки #%s', self.pk)
 
     def get_priority_badge(self):
         """
@@ -310,6 +361,318 @@ class Request(models.Model):
     class Meta:
         verbose_name = 'Заявка'
         verbose_name_plural = 'Заявки'
+        # Индексы под частые выборки; план проверяет python manage.py explain_queries
+        indexes = [
+            models.Index(fields=['device', 'status'], name='request_device_status_idx'),
+            models.Index(fields=['employee', 'status'], name='request_employee_status_idx'),
+            # Очередь администратора (views.manage_requests): только рассматриваемые заявки
+            # в порядке приоритета; COALESCE вместо NULLS LAST, который SQLite не индексирует
+            models.Index(
+                Coalesce('ai_priority_score', 0).desc(), 'created_at', 'id',
+                name='request_pending_priority_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+
+class AIAnalysis(models.Model):
+    """История AI-анализов заявки: чем и как получен каждый результат"""
+
+    SOURCE_LLM = 'llm'
+    SOURCE_BATCH = 'batch'
+    SOURCE_CACHE = 'cache'
+    SOURCE_LOCAL = 'local'
+    SOURCE_DUPLICATE = 'duplicate'
+    SOURCE_FALLBACK = 'fallback'
+    SOURCE_CHOICES = [
+        (SOURCE_LLM, 'GigaChat'),
+        (SOURCE_BATCH, 'GigaChat (пакетный запрос)'),
+        (SOURCE_CACHE, 'Кэш'),
+        (SOURCE_LOCAL, 'Локальный классификатор'),
+        (SOURCE_DUPLICATE, 'Похожая заявка'),
+        (SOURCE_FALLBACK, 'Ошибка анализа'),
+    ]
+
+    request = models.ForeignKey(
+        Request,
+        on_delete=models.CASCADE,
+        related_name='ai_analyses',
+        verbose_name='Заявка'
+    )
+    source = models.CharField(
+        max_length=20,
+        choices=SOURCE_CHOICES,
+        verbose_name='Источник'
+    )
+    prompt_version = models.CharField(
+        max_length=32,
+        verbose_name='Версия промпта'
+    )
+    model_name = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Модель'
+    )
+    latency_ms = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='Задержка, мс'
+    )
+    tokens_in = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Токенов на входе'
+    )
+    tokens_out = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Токенов на выходе'
+    )
+    raw_response = models.TextField(
+        blank=True,
+        verbose_name='Ответ модели'
+    )
+    result = models.JSONField(
+        verbose_name='Результат анализа'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+
+    def __str__(self):
+        return f"AI-анализ заявки #{self.request_id} ({self.source}, {self.prompt_version})"
+
+    class Meta:
+        verbose_name = 'AI-анализ'
+        verbose_name_plural = 'История AI-анализов'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['prompt_version', 'source'], name='aianalysis_version_source_idx'),
+        ]
+
+
+class PurposeLSHBucket(models.Model):
+    """LSH-корзина MinHash-подписи цели заявки для поиска почти одинаковых заявок"""
+    request = models.ForeignKey(
+        Request,
+        on_delete=models.CASCADE,
+        related_name='purpose_buckets',
+        verbose_name='Заявка'
+    )
+    bucket = models.CharField(
+        max_length=40,
+        db_index=True,
+        verbose_name='Корзина'
+    )
+
+    def __str__(self):
+        return f"{self.bucket[:12]} → заявка #{self.request_id}"
+
+    class Meta:
+        verbose_name = 'LSH-корзина цели заявки'
+        verbose_name_plural = 'LSH-индекс целей заявок'
+
+
+class AIAnalysisJob(models.Model):
+    """Задание очереди AI-анализа заявки"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Выполнено'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    request = models.ForeignKey(
+        Request,
+        on_delete=models.CASCADE,
+        related_name='ai_jobs',
+        verbose_name='Заявка'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name='Статус'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Воркер'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Начало обработки'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Окончание обработки'
+    )
+    run_after = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Отложено до'
+    )
+
+    def __str__(self):
+        return f"AI-анализ заявки #{self.request_id} ({self.status})"
+
+    class Meta:
+        verbose_name = 'Задание AI-анализа'
+        verbose_name_plural = 'Задания AI-анализа'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='aijob_status_created_idx'),
+        ]
+
+
+class AIAnalysisCacheEntry(models.Model):
+    """Закэшированный результат AI-анализа (ключ — хэш входных данных и версии промпта)"""
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name='Ключ'
+    )
+    prompt_version = models.CharField(
+        max_length=32,
+        verbose_name='Версия промпта'
+    )
+    result = models.JSONField(
+        verbose_name='Результат анализа'
+    )
+    hits = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Попаданий'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+    last_used_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Последнее использование'
+    )
+
+    def __str__(self):
+        return f"{self.key[:12]} ({self.prompt_version})"
+
+    class Meta:
+        verbose_name = 'Кэш AI-анализа'
+        verbose_name_plural = 'Кэш AI-анализа'
+        indexes = [
+            models.Index(fields=['last_used_at'], name='aicache_last_used_idx'),
+        ]
+
+
+class AICircuitBreaker(models.Model):
+    """Состояние автоматического выключателя вызовов AI, общее для всех воркеров"""
+
+    STATE_CLOSED = 'closed'
+    STATE_OPEN = 'open'
+    STATE_HALF_OPEN = 'half_open'
+    STATE_CHOICES = [
+        (STATE_CLOSED, 'Замкнут'),
+        (STATE_OPEN, 'Разомкнут'),
+        (STATE_HALF_OPEN, 'Пробный вызов'),
+    ]
+
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Название'
+    )
+    state = models.CharField(
+        max_length=20,
+        choices=STATE_CHOICES,
+        default=STATE_CLOSED,
+        verbose_name='Состояние'
+    )
+    window_started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Начало окна'
+    )
+    window_calls = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Вызовов в окне'
+    )
+    window_failures = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Ошибок в окне'
+    )
+    opened_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Разомкнут в'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    def __str__(self):
+        return f"{self.name} ({self.state})"
+
+    class Meta:
+        verbose_name = 'Выключатель AI'
+        verbose_name_plural = 'Выключатели AI'
+
+
+class AIRateLimit(models.Model):
+    """Бюджет вызовов AI, общий для всех процессов: корзина запросов и дневной лимит токенов"""
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Название'
+    )
+    available_requests = models.FloatField(
+        default=0,
+        verbose_name='Доступно запросов'
+    )
+    refilled_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Пополнено в'
+    )
+    day = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='День'
+    )
+    day_tokens = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Токенов за день'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    def __str__(self):
+        return f"{self.name} ({self.day_tokens} токенов за {self.day})"
+
+    class Meta:
+        verbose_name = 'Лимит вызовов AI'
+        verbose_name_plural = 'Лимиты вызовов AI'
 
 
 class UserProfile(models.Model):
@@ -347,6 +710,15 @@ class Repair(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Активных ремонтов мало, завершённые в индекс не попадают
+            models.Index(fields=['device'], name='repair_active_device_idx', condition=models.Q(status='repairing')),
+            # Отчёт по поломкам: период и окно по истории ремонтов устройства
+            models.Index(fields=['created_at'], name='repair_created_idx'),
+            models.Index(fields=['device', 'created_at'], name='repair_device_created_idx'),
+        ]
+
 
 class Extension(models.Model):
     original_request = models.ForeignKey(Request, on_delete=models.CASCADE)
@@ -394,3 +766,30 @@ class EquipmentMovement(models.Model):
         verbose_name = 'Движение оборудования'
         verbose_name_plural = 'Движения оборудования'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['-timestamp'], name='movement_timestamp_idx'),
+        ]
+
+
+class TableVersion(models.Model):
+    """Счётчик изменений таблицы для ETag/Last-Modified JSON API (services/table_versions.py)"""
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Таблица'
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Версия'
+    )
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Изменена'
+    )
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    class Meta:
+        verbose_name = 'Версия таблицы'
+        verbose_name_plural = 'Версии таблиц'
@@ -0,0 +1,229 @@
+import copy
+
+from django.conf import settings
+from django.db.models import Q
+
+from .ai_metrics import registry as metrics
+from .gigachat_service import AnalysisFailed, AnalysisOutcome, GigaChatService
+from .near_duplicates import find_duplicate, index_requests
+from .prompts import PROMPT_VERSION
+from .resilience import CircuitOpenError, RateLimitExceeded
+from .table_versions import bump_version
+
+# Поля заявки, которые заполняет AI-анализ
+AI_FIELDS = ['ai_priority_score', 'ai_tags', 'ai_summary', 'ai_needs_clarification']
+
+# Источники анализа, которые неудачный повторный анализ (fallback) не заменяет
+RELIABLE_SOURCES = [AnalysisOutcome.SOURCE_LLM, AnalysisOutcome.SOURCE_BATCH, AnalysisOutcome.SOURCE_CACHE]
+
+
+def build_analysis_input(request_obj):
+    """
+    Собирает входные данные для AI-анализа заявки
+
+    Args:
+        request_obj: Заявка (Request)
+
+    Returns:
+        dict: Аргументы для GigaChatService.analyze_request
+    """
+    return {
+        'employee_position': getattr(request_obj.employee, 'position', 'Не указана'),
+        'device_type': request_obj.device.device_type.name,
+        'purpose': request_obj.purpose,
+    }
+
+
+def set_analysis_fields(request_obj, result):
+    """Переносит результат AI-анализа в поля заявки (без сохранения)"""
+    request_obj.ai_priority_score = result.get('priority_score', 5)
+    request_obj.ai_tags = result.get('tags', [])
+    request_obj.ai_summary = result.get('summary', '')
+    request_obj.ai_needs_clarification = result.get('needs_clarification', False)
+
+
+def save_analysis_results(requests, outcomes, batch_size=500):
+    """
+    Сохраняет историю анализов и AI-поля заявок
+
+    Для каждой заявки создаётся запись AIAnalysis, которая становится
+    текущей (Request.current_analysis). Исключение — fallback-результат
+    для заявки, уже имеющей анализ из RELIABLE_SOURCES: он остаётся только
+    в истории, а текущий анализ и AI-поля не меняются (в объекте заявки
+    они восстанавливаются из текущего анализа). Запись идёт через
+    bulk_create и bulk_update, Request.save() и бизнес-логика статусов
+    оборудования не вызываются.
+
+    Args:
+        requests: Заявки с заполненными AI-полями
+        outcomes: dict pk заявки -> AnalysisOutcome
+
+    Returns:
+        list: Заявки, у которых сменился текущий анализ
+    """
+    from ..models import AIAnalysis, Request
+
+    analyses = []
+    for request_obj in requests:
+        outcome = outcomes[request_obj.pk]
+        analyses.append(AIAnalysis(
+            request=request_obj,
+            source=outcome.source,
+            prompt_version=outcome.prompt_version,
+            model_name=outcome.model_name,
+            latency_ms=outcome.latency_ms,
+            tokens_in=outcome.tokens_in,
+            tokens_out=outcome.tokens_out,
+            raw_response=outcome.raw_response,
+            result=outcome.result,
+        ))
+    analyses = AIAnalysis.objects.bulk_create(analyses, batch_size=batch_size)
+
+    fallback_over = [
+        request_obj.current_analysis_id for request_obj in requests
+        if request_obj.current_analysis_id and outcomes[request_obj.pk].source == AnalysisOutcome.SOURCE_FALLBACK
+    ]
+    kept_results = dict(
+        AIAnalysis.objects.filter(id__in=fallback_over, source__in=RELIABLE_SOURCES).values_list('id', 'result')
+    ) if fallback_over else {}
+
+    updated = []
+    for request_obj, analysis in zip(requests, analyses):
+        if analysis.source == AnalysisOutcome.SOURCE_FALLBACK and request_obj.current_analysis_id in kept_results:
+            set_analysis_fields(request_obj, kept_results[request_obj.current_analysis_id])
+            continue
+        request_obj.current_analysis = analysis
+        updated.append(request_obj)
+
+    if updated:
+        Request.objects.bulk_update(updated, AI_FIELDS + ['current_analysis'], batch_size=batch_size)
+        # bulk_update не отправляет post_save — версию для ETag API меняем сами
+        bump_version('request')
+
+    # В индекс похожих заявок попадают только ответы модели
+    index_requests([
+        request_obj for request_obj in updated
+        if outcomes[request_obj.pk].source in (AnalysisOutcome.SOURCE_LLM, AnalysisOutcome.SOURCE_BATCH)
+    ])
+    return updated
+
+
+def save_fallback_results(requests, errors):
+    """
+    Сохраняет результат-заглушку для заявок, анализ которых не удался
+
+    Args:
+        requests: Заявки
+        errors: dict pk заявки -> ошибка последней попытки
+    """
+    outcomes = {request_obj.pk: GigaChatService.fallback_outcome(errors[request_obj.pk]) for request_obj in requests}
+    for request_obj in requests:
+        metrics.inc('assetflow_ai_analyses_total', source=AnalysisOutcome.SOURCE_FALLBACK)
+        set_analysis_fields(request_obj, outcomes[request_obj.pk].result)
+    save_analysis_results(requests, outcomes)
+    return outcomes
+
+
+def find_duplicate_outcome(request_obj):
+    """
+    Результат анализа почти такой же заявки (тот же тип оборудования и должность)
+
+    Returns:
+        AnalysisOutcome или None
+    """
+    analysis_input = build_analysis_input(request_obj)
+    duplicate, similarity = find_duplicate(exclude_id=request_obj.pk, **analysis_input)
+    if duplicate is None:
+        return None
+    return AnalysisOutcome(
+        result=copy.deepcopy(duplicate.current_analysis.result),
+        source=AnalysisOutcome.SOURCE_DUPLICATE,
+        raw_response=f'Повтор анализа заявки #{duplicate.pk} (сходство {similarity:.2f})',
+    )
+
+
+def stale_requests(queryset=None):
+    """
+    Заявки, чей текущий анализ получен другой версией промпта или завершился ошибкой
+
+    Args:
+        queryset: Исходная выборка заявок (по умолчанию все)
+    """
+    from ..models import AIAnalysis, Request
+
+    queryset = Request.objects.all() if queryset is None else queryset
+    return queryset.filter(
+        Q(current_analysis__isnull=True)
+        | ~Q(current_analysis__prompt_version=PROMPT_VERSION)
+        | Q(current_analysis__source=AIAnalysis.SOURCE_FALLBACK)
+    )
+
+
+def analyze_requests(requests, service=None, save=True, fallback=True, near_duplicates=None):
+    """
+    Выполняет AI-анализ списка заявок и сохраняет результаты
+
+    Для почти одинаковых заявок повторно используется уже полученный
+    анализ, остальные анализируются пакетно (GigaChatService.analyze_many_detailed).
+
+    Args:
+        requests: Заявки (Request) с загруженными employee и device__device_type
+        service: Экземпляр GigaChatService (создаётся при необходимости)
+        save: Сохранить результаты в БД; иначе только заполнить поля объектов
+        fallback: Подставить fallback_result() для заявок с ошибкой анализа;
+            иначе успешные результаты сохраняются, а ошибки передаются в AnalysisFailed
+        near_duplicates: Искать почти одинаковые заявки; None — по AI_NEAR_DUPLICATE_ENABLED
+
+    Returns:
+        dict: pk заявки -> AnalysisOutcome
+
+    Raises:
+        AnalysisFailed: Только при fallback=False
+        RateLimitExceeded, CircuitOpenError: Анализ остановлен; полученные до
+            этого результаты сохранены и переданы в outcomes исключения
+    """
+    service = service or GigaChatService()
+
+    if near_duplicates is None:
+        near_duplicates = settings.AI_NEAR_DUPLICATE_ENABLED
+
+    outcomes = {}
+    if near_duplicates:
+        for request_obj in requests:
+            outcome = find_duplicate_outcome(request_obj)
+            if outcome is not None:
+                outcomes[request_obj.pk] = outcome
+
+    items = [
+        dict(build_analysis_input(request_obj), id=request_obj.pk)
+        for request_obj in requests
+        if request_obj.pk not in outcomes
+    ]
+    errors = {}
+    interrupted = None
+    try:
+        outcomes.update(service.analyze_many_detailed(items, fallback=fallback))
+    except AnalysisFailed as e:
+        outcomes.update(e.outcomes)
+        errors = e.errors
+    except (RateLimitExceeded, CircuitOpenError) as e:
+        # Результаты, полученные до остановки, сохраняются: повторно за них платить не нужно
+        outcomes.update(e.outcomes)
+        interrupted = e
+
+    for outcome in outcomes.values():
+        metrics.inc('assetflow_ai_analyses_total', source=outcome.source)
+
+    analyzed = [request_obj for request_obj in requests if request_obj.pk in outcomes]
+    for request_obj in analyzed:
+        set_analysis_fields(request_obj, outcomes[request_obj.pk].result)
+
+    if save and analyzed:
+        save_analysis_results(analyzed, outcomes)
+
+    if interrupted is not None:
+        interrupted.outcomes = outcomes
+        raise interrupted
+    if errors:
+        raise AnalysisFailed(outcomes, errors)
+    return outcomes
@@ -0,0 +1,174 @@
+import copy
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .prompts import PROMPT_VERSION
+
+
+def normalize_text(text):
+    """
+    Нормализует текст для ключа кэша
+
+    Регистр, «ё», пунктуация и лишние пробелы не влияют на ключ,
+    поэтому «Мышь сломалась!» и «мышь  сломалась» дают одну запись.
+    """
+    text = (text or '').lower().replace('ё', 'е')
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def make_cache_key(employee_position, device_type, purpose, prompt_version=PROMPT_VERSION):
+    """Возвращает SHA-256 от нормализованных входных данных анализа и версии промпта"""
+    parts = [normalize_text(employee_position), normalize_text(device_type), normalize_text(purpose), prompt_version]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Двухуровневый кэш результатов AI-анализа
+
+    Первый уровень — LRU в памяти процесса, второй — таблица
+    AIAnalysisCacheEntry в БД, общая для всех воркеров. Записи БД живут
+    AI_CACHE_TTL секунд, их количество ограничено AI_CACHE_MAX_ENTRIES
+    (вытесняются давно не использованные). Вытеснение запускается раз
+    в AI_CACHE_EVICT_EVERY записей, а не при каждой: до него лимит может
+    быть превышен на эту величину, просроченные записи get() не отдаёт.
+    С persistent=False работает только первый уровень (например, в
+    бенчмарке, который не должен читать и менять общий кэш).
+    """
+
+    def __init__(self, memory_size=None, ttl=None, max_entries=None, evict_every=None, persistent=True):
+        self.memory_size = memory_size or settings.AI_CACHE_MEMORY_SIZE
+        self.ttl = ttl or settings.AI_CACHE_TTL
+        self.max_entries = max_entries or settings.AI_CACHE_MAX_ENTRIES
+        self.evict_every = evict_every or settings.AI_CACHE_EVICT_EVERY
+        self.persistent = persistent
+        self._memory = OrderedDict()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+
+    def get(self, key):
+        """Возвращает копию результата или None при промахе"""
+        from ..models import AIAnalysisCacheEntry
+
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                expires_at, result = item
+                if expires_at > time.monotonic():
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return copy.deepcopy(result)
+                del self._memory[key]
+
+        if not self.persistent:
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+
+        entry = AIAnalysisCacheEntry.objects.filter(
+            key=key,
+            created_at__gte=timezone.now() - timedelta(seconds=self.ttl),
+        ).only('result', 'created_at').first()
+
+        if entry is None:
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+
+        AIAnalysisCacheEntry.objects.filter(pk=entry.pk).update(
+            hits=F('hits') + 1,
+            last_used_at=timezone.now(),
+        )
+
+        remaining = self.ttl - (timezone.now() - entry.created_at).total_seconds()
+        with self._lock:
+            self._stats['db_hits'] += 1
+            self._remember(key, entry.result, remaining)
+        return copy.deepcopy(entry.result)
+
+    def set(self, key, result, prompt_version=PROMPT_VERSION):
+        """Сохраняет результат в оба уровня кэша"""
+        from ..models import AIAnalysisCacheEntry
+
+        with self._lock:
+            self._remember(key, copy.deepcopy(result), self.ttl)
+            self._writes += 1
+            evict_due = self._writes % self.evict_every == 0
+        if not self.persistent:
+            return
+
+        now = timezone.now()
+        AIAnalysisCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                'prompt_version': prompt_version,
+                'result': result,
+                'created_at': now,
+                'last_used_at': now,
+            },
+        )
+        if evict_due:
+            self.evict()
+
+    def evict(self):
+        """Удаляет просроченные записи БД и самые старые сверх лимита"""
+        from ..models import AIAnalysisCacheEntry
+
+        AIAnalysisCacheEntry.objects.filter(
+            created_at__lt=timezone.now() - timedelta(seconds=self.ttl)
+        ).delete()
+
+        excess = AIAnalysisCacheEntry.objects.count() - self.max_entries
+        if excess > 0:
+            stale_ids = list(
+                AIAnalysisCacheEntry.objects.order_by('last_used_at').values_list('id', flat=True)[:excess]
+            )
+            AIAnalysisCacheEntry.objects.filter(id__in=stale_ids).delete()
+
+    def clear(self):
+        """Очищает оба уровня кэша"""
+        from ..models import AIAnalysisCacheEntry
+
+        with self._lock:
+            self._memory.clear()
+        if self.persistent:
+            AIAnalysisCacheEntry.objects.all().delete()
+
+    def stats(self):
+        """Счётчики попаданий и промахов текущего процесса"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_size'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['memory_hits'] + stats['db_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key, result, ttl):
+        """Кладёт результат в LRU (вызывается под блокировкой)"""
+        self._memory[key] = (time.monotonic() + ttl, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache():
+    """Возвращает общий для процесса экземпляр AnalysisCache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnalysisCache()
+        return _cache
@@ -0,0 +1,225 @@
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from .bearer import bearer_matches
+
+# Путь метрик на сервере start_metrics_server
+METRICS_PATH = '/metrics'
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Описание метрик: имя -> (тип, описание)
+METRICS = {
+    'assetflow_ai_calls_total': ('counter', 'Вызовы GigaChat по типу и исходу'),
+    'assetflow_ai_call_latency_seconds': ('histogram', 'Длительность вызова GigaChat с повторами'),
+    'assetflow_ai_tokens_total': ('counter', 'Токены GigaChat: in — промпт, out — ответ'),
+    'assetflow_ai_parse_errors_total': ('counter', 'Ответы GigaChat, которые не удалось разобрать'),
+    'assetflow_ai_parse_repairs_total': ('counter', 'Ответы GigaChat, разобранные после исправления JSON'),
+    'assetflow_ai_streams_cancelled_total': ('counter', 'Потоки, прерванные сразу после закрытия JSON'),
+    'assetflow_ai_analyses_total': ('counter', 'Результаты анализа заявок по источнику'),
+}
+
+
+class MetricsRegistry:
+    """Потокобезопасные счётчики и гистограммы текущего процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.setdefault(key, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: dict(value, buckets=list(value['buckets'])) for key, value in self._histograms.items()}
+
+        lines = []
+        for name, (metric_type, description) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for (metric_name, labels), value in sorted(counters.items()):
+                if metric_name == name:
+                    lines.append(f'{name}{format_labels(labels)} {value:g}')
+            for (metric_name, labels), histogram in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", f"{bound:g}"),))} {count}')
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+                lines.append(f'{name}_sum{format_labels(labels)} {histogram["sum"]:g}')
+                lines.append(f'{name}_count{format_labels(labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+def percentile(values, pct):
+    """Перцентиль отсортированного списка (ближайший ранг)"""
+    index = max(0, min(len(values) - 1, round(pct / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+registry = MetricsRegistry()
+
+
+def metrics_authorized(authorization):
+    """
+    Проверяет заголовок Authorization запроса метрик
+
+    Без AI_METRICS_TOKEN метрики закрыты: они раскрывают состояние
+    очереди, выключателя и бюджета вызовов.
+    """
+    return bearer_matches(authorization, settings.AI_METRICS_TOKEN)
+
+
+def render_metrics():
+    """
+    Все метрики AI для Prometheus
+
+    К счётчикам текущего процесса добавляются общие показатели: кэш
+    этого процесса, глубина очереди, состояние выключателя, остаток
+    бюджета вызовов и накопленная в БД история анализов.
+    """
+    from django.db.models import Count, Sum
+
+    from ..models import AIAnalysis, AIAnalysisJob, AICircuitBreaker
+    from .ai_cache import get_analysis_cache
+    from .resilience import CircuitBreaker, RateLimiter
+
+    lines = [registry.render().rstrip('\n')]
+
+    cache_stats = get_analysis_cache().stats()
+    lines += [
+        '# HELP assetflow_ai_cache_lookups_total Обращения к кэшу анализа в этом процессе',
+        '# TYPE assetflow_ai_cache_lookups_total counter',
+        f'assetflow_ai_cache_lookups_total{{result="memory_hit"}} {cache_stats["memory_hits"]}',
+        f'assetflow_ai_cache_lookups_total{{result="db_hit"}} {cache_stats["db_hits"]}',
+        f'assetflow_ai_cache_lookups_total{{result="miss"}} {cache_stats["misses"]}',
+        '# HELP assetflow_ai_cache_hit_ratio Доля попаданий в кэш в этом процессе',
+        '# TYPE assetflow_ai_cache_hit_ratio gauge',
+        f'assetflow_ai_cache_hit_ratio {cache_stats["hit_ratio"]:g}',
+    ]
+
+    jobs = dict(AIAnalysisJob.objects.values_list('status').annotate(total=Count('id')))
+    lines += [
+        '# HELP assetflow_ai_jobs Задания очереди AI-анализа по статусу',
+        '# TYPE assetflow_ai_jobs gauge',
+    ] + [
+        f'assetflow_ai_jobs{{status="{status}"}} {jobs.get(status, 0)}'
+        for status, _ in AIAnalysisJob.STATUS_CHOICES
+    ]
+
+    breaker_state = CircuitBreaker().snapshot()['state']
+    lines += [
+        '# HELP assetflow_ai_breaker_state Состояние выключателя вызовов GigaChat',
+        '# TYPE assetflow_ai_breaker_state gauge',
+    ] + [
+        f'assetflow_ai_breaker_state{{state="{state}"}} {int(state == breaker_state)}'
+        for state, _ in AICircuitBreaker.STATE_CHOICES
+    ]
+
+    budget = RateLimiter().snapshot()
+    lines += [
+        '# HELP assetflow_ai_budget_requests_available Свободные запросы в корзине ограничителя',
+        '# TYPE assetflow_ai_budget_requests_available gauge',
+        f'assetflow_ai_budget_requests_available {budget["available_requests"]:g}',
+        '# HELP assetflow_ai_budget_day_tokens Токены, израсходованные за текущие сутки',
+        '# TYPE assetflow_ai_budget_day_tokens gauge',
+        f'assetflow_ai_budget_day_tokens {budget["day_tokens"]}',
+    ]
+    if budget['tokens_left'] is not None:
+        lines += [
+            '# HELP assetflow_ai_budget_tokens_left Остаток дневного бюджета токенов',
+            '# TYPE assetflow_ai_budget_tokens_left gauge',
+            f'assetflow_ai_budget_tokens_left {budget["tokens_left"]}',
+        ]
+
+    history = list(AIAnalysis.objects.values('source').annotate(
+        total=Count('id'), tokens_in=Sum('tokens_in'), tokens_out=Sum('tokens_out')
+    ))
+    lines += [
+        '# HELP assetflow_ai_recorded_analyses Записи истории AI-анализов по источнику',
+        '# TYPE assetflow_ai_recorded_analyses gauge',
+    ] + [f'assetflow_ai_recorded_analyses{{source="{row["source"]}"}} {row["total"]}' for row in history]
+    lines += [
+        '# HELP assetflow_ai_recorded_tokens Токены по истории AI-анализов',
+        '# TYPE assetflow_ai_recorded_tokens gauge',
+        f'assetflow_ai_recorded_tokens{{direction="in"}} {sum(row["tokens_in"] or 0 for row in history)}',
+        f'assetflow_ai_recorded_tokens{{direction="out"}} {sum(row["tokens_out"] or 0 for row in history)}',
+    ]
+
+    return '\n'.join(lines) + '\n'
+
+
+def start_metrics_server(port, host='0.0.0.0'):
+    """
+    Запускает HTTP-сервер метрик (путь /metrics) в фоновом потоке
+
+    Нужен процессам без веб-интерфейса (воркерам очереди), чтобы
+    Prometheus мог собирать их счётчики. Счётчики у каждого процесса свои,
+    поэтому каждый процесс воркеров — отдельная цель сбора.
+    """
+    from django.db import connection
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if urlsplit(self.path).path != METRICS_PATH:
+                self.send_empty(404)
+                return
+            if not metrics_authorized(self.headers.get('Authorization')):
+                self.send_empty(401)
+                return
+            try:
+                body = render_metrics().encode('utf-8')
+            finally:
+                connection.close()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_empty(self, status):
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
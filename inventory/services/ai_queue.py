@@ -0,0 +1,211 @@
+from datetime import timedelta
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import AIAnalysisJob
+from .ai_analysis import analyze_requests, save_fallback_results
+from .gigachat_service import AnalysisFailed
+from .resilience import CircuitOpenError, RateLimitExceeded
+
+
+def enqueue_analysis(request_obj):
+    """
+    Ставит заявку в очередь AI-анализа
+
+    Request.save() вызывает её через transaction.on_commit для новых заявок.
+    """
+    return AIAnalysisJob.objects.create(request=request_obj)
+
+
+def claim_jobs(worker_name, limit=1):
+    """
+    Захватывает задания из очереди для воркера
+
+    Строки блокируются через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    параллельные воркеры не получают одни и те же задания и не ждут друг друга.
+
+    Args:
+        worker_name: Имя воркера, записывается в задание
+        limit: Максимальное количество заданий
+
+    Returns:
+        list: Захваченные задания со связанными заявками
+    """
+    with transaction.atomic():
+        job_ids = list(
+            AIAnalysisJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=AIAnalysisJob.STATUS_PENDING)
+            .filter(Q(run_after__isnull=True) | Q(run_after__lte=timezone.now()))
+            .order_by('created_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not job_ids:
+            return []
+
+        AIAnalysisJob.objects.filter(id__in=job_ids).update(
+            status=AIAnalysisJob.STATUS_RUNNING,
+            worker=worker_name,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+
+    return list(
+        AIAnalysisJob.objects
+        .filter(id__in=job_ids)
+        .select_related('request__employee', 'request__device__device_type')
+    )
+
+
+def process_jobs(jobs, service=None):
+    """
+    Выполняет AI-анализ захваченных заданий и фиксирует их статус
+
+    Ошибка анализа заявки не заменяется заглушкой сразу: задание
+    возвращается в очередь с паузой AI_JOB_RETRY_DELAY, удваивающейся с
+    каждой попыткой. Только после AI_JOB_MAX_ATTEMPTS попыток для заявки
+    сохраняется fallback-результат, а задание помечается неудавшимся.
+    Если исчерпан бюджет вызовов или разомкнут выключатель, результаты,
+    полученные до этого, сохраняются, а остальные задания откладываются
+    без расхода попытки.
+
+    Returns:
+        int: Количество успешно обработанных заданий
+    """
+    if not jobs:
+        return 0
+
+    errors = {}
+    try:
+        analyze_requests([job.request for job in jobs], service=service, fallback=False)
+    except (RateLimitExceeded, CircuitOpenError) as e:
+        # Полученные результаты уже сохранены; остальные ждут восстановления
+        # бюджета или пробного вызова выключателя
+        done = [job for job in jobs if job.request_id in e.outcomes]
+        finish_jobs(done)
+        defer_jobs([job for job in jobs if job.request_id not in e.outcomes], max(e.retry_after, 1), e)
+        return len(done)
+    except AnalysisFailed as e:
+        errors = e.errors
+    except Exception as e:
+        errors = {job.request_id: e for job in jobs}
+
+    done = [job for job in jobs if job.request_id not in errors]
+    finish_jobs(done)
+
+    failed_jobs = [job for job in jobs if job.request_id in errors]
+    if failed_jobs:
+        retry_or_fail_jobs(failed_jobs, errors)
+    return len(done)
+
+
+def finish_jobs(jobs):
+    """Помечает задания выполненными"""
+    if jobs:
+        AIAnalysisJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status=AIAnalysisJob.STATUS_DONE,
+            last_error='',
+            finished_at=timezone.now(),
+        )
+
+
+def defer_jobs(jobs, delay, error):
+    """Откладывает задания на delay секунд, не расходуя попытку"""
+    AIAnalysisJob.objects.filter(id__in=[job.id for job in jobs]).update(
+        status=AIAnalysisJob.STATUS_PENDING,
+        attempts=F('attempts') - 1,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        last_error=str(error),
+    )
+
+
+def retry_or_fail_jobs(jobs, errors):
+    """
+    Возвращает задания с ошибкой в очередь или, если попытки исчерпаны,
+    сохраняет для их заявок fallback-результат
+
+    Args:
+        jobs: Задания (attempts уже учитывает текущую попытку)
+        errors: dict id заявки -> ошибка
+    """
+    exhausted = [job for job in jobs if job.attempts >= settings.AI_JOB_MAX_ATTEMPTS]
+    if exhausted:
+        save_fallback_results([job.request for job in exhausted], errors)
+        for job in exhausted:
+            AIAnalysisJob.objects.filter(id=job.id).update(
+                status=AIAnalysisJob.STATUS_FAILED,
+                last_error=str(errors[job.request_id]),
+                finished_at=timezone.now(),
+            )
+
+    for job in jobs:
+        if job.attempts < settings.AI_JOB_MAX_ATTEMPTS:
+            delay = settings.AI_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            AIAnalysisJob.objects.filter(id=job.id).update(
+                status=AIAnalysisJob.STATUS_PENDING,
+                run_after=timezone.now() + timedelta(seconds=delay),
+                last_error=str(errors[job.request_id]),
+            )
+
+
+def requeue_stale_jobs(stale_after=None):
+    """
+    Возвращает в очередь задания, зависшие в статусе «выполняется»
+
+    Такие задания остаются после аварийной остановки воркера.
+    """
+    stale_after = stale_after or settings.AI_JOB_STALE_AFTER
+    threshold = timezone.now() - timedelta(seconds=stale_after)
+
+    return AIAnalysisJob.objects.filter(
+        status=AIAnalysisJob.STATUS_RUNNING,
+        started_at__lt=threshold,
+    ).update(status=AIAnalysisJob.STATUS_PENDING)
+
+
+class StaleJobSweeper:
+    """
+    Периодический возврат зависших заданий из цикла воркеров
+
+    Один экземпляр на процесс: maybe_run() можно вызывать на каждой
+    итерации каждого воркера, запрос к БД выполняется не чаще раза
+    в AI_JOB_REQUEUE_INTERVAL секунд.
+    """
+
+    def __init__(self, interval=None, stale_after=None):
+        self.interval = settings.AI_JOB_REQUEUE_INTERVAL if interval is None else interval
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+        self.next_run = 0.0
+
+    def maybe_run(self):
+        """
+        Returns:
+            int: Количество возвращённых заданий (0, если время ещё не пришло)
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.next_run:
+                return 0
+            self.next_run = now + self.interval
+        return requeue_stale_jobs(self.stale_after)
+
+
+def run_pending_jobs(worker_name, batch_size=1, service=None):
+    """
+    Обрабатывает очередь в текущем потоке до её опустошения
+
+    Returns:
+        int: Количество успешно обработанных заданий
+    """
+    processed = 0
+    while True:
+        jobs = claim_jobs(worker_name, limit=batch_size)
+        if not jobs:
+            return processed
+        processed += process_jobs(jobs, service=service)
@@ -0,0 +1,12 @@
+import hmac
+
+
+def bearer_matches(authorization, token):
+    """
+    Сравнивает заголовок Authorization с «Bearer <token>» за постоянное время
+
+    Пустой token не совпадает ни с чем: доступ по токену выключен.
+    """
+    if not token or not authorization:
+        return False
+    return hmac.compare_digest(authorization.encode('utf-8'), f'Bearer {token}'.encode('utf-8'))
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from gigachat.models import ChatCompletion, ChatCompletionChunk
+
+
+class CassetteMissError(KeyError):
+    """В кассете нет записи для промпта (режим воспроизведения)"""
+
+
+class CassetteClient:
+    """
+    Запись и воспроизведение ответов GigaChat («кассета»)
+
+    Подменяет GigaChatClientManager: в режиме record запросы уходят в
+    настоящий клиент, а ответы сохраняются в JSON-файл по SHA-256 промпта;
+    в режиме replay ответы берутся из файла без обращения к API.
+    Задержка воспроизведения настраивается: latency — до первого ответа,
+    chunk_latency — между частями потока.
+
+    При записи потока сохраняется только прочитанная часть ответа: если
+    чтение прервано после закрытия JSON, воспроизведение вернёт то же самое.
+    """
+
+    MODE_RECORD = 'record'
+    MODE_REPLAY = 'replay'
+
+    def __init__(self, path, mode=MODE_REPLAY, client=None, latency=0.0, chunk_latency=0.0, chunk_size=20):
+        self.path = path
+        self.mode = mode
+        self.client = client
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._records = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._records = json.load(f)
+
+        if mode == self.MODE_RECORD and client is None:
+            from .gigachat_client import GigaChatClientManager
+            self.client = GigaChatClientManager()
+
+    @property
+    def size(self):
+        """Количество записанных ответов"""
+        return len(self._records)
+
+    def chat(self, prompt, timeout=None):
+        if self.mode == self.MODE_RECORD:
+            response = self.client.chat(prompt, timeout=timeout)
+            usage = response.usage
+            self._record(prompt, response.choices[0].message.content, response.model,
+                         usage.prompt_tokens, usage.completion_tokens)
+            return response
+
+        record = self._lookup(prompt)
+        time.sleep(self.latency)
+        content = record['content']
+        return ChatCompletion.parse_obj({
+            'choices': [{'message': {'role': 'assistant', 'content': content}, 'index': 0, 'finish_reason': 'stop'}],
+            'created': int(time.time()),
+            'model': record['model'],
+            'usage': {
+                'prompt_tokens': record['tokens_in'] or 0,
+                'completion_tokens': record['tokens_out'] or 0,
+                'total_tokens': (record['tokens_in'] or 0) + (record['tokens_out'] or 0),
+            },
+            'object': 'chat.completion',
+        })
+
+    def stream(self, prompt, timeout=None):
+        if self.mode == self.MODE_RECORD:
+            yield from self._record_stream(prompt, timeout)
+            return
+
+        record = self._lookup(prompt)
+        time.sleep(self.latency)
+        content = record['content']
+        for start in range(0, len(content), self.chunk_size):
+            if start and self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            yield ChatCompletionChunk.parse_obj({
+                'choices': [{'delta': {'content': content[start:start + self.chunk_size]}, 'index': 0}],
+                'created': int(time.time()),
+                'model': record['model'],
+                'object': 'chat.completion',
+            })
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+
+    def _record_stream(self, prompt, timeout):
+        parts = []
+        model_name = ''
+        chunks = self.client.stream(prompt, timeout=timeout)
+        try:
+            for chunk in chunks:
+                model_name = chunk.model or model_name
+                if chunk.choices:
+                    parts.append(chunk.choices[0].delta.content or '')
+                yield chunk
+        except GeneratorExit:
+            # Потребитель прервал чтение — записываем прочитанное
+            self._record(prompt, ''.join(parts), model_name, None, None)
+            raise
+        else:
+            self._record(prompt, ''.join(parts), model_name, None, None)
+        finally:
+            chunks.close()
+
+    def _lookup(self, prompt):
+        try:
+            return self._records[prompt_key(prompt)]
+        except KeyError:
+            raise CassetteMissError(f'Нет записи в кассете {self.path} для промпта {prompt_key(prompt)[:12]}')
+
+    def _record(self, prompt, content, model_name, tokens_in, tokens_out):
+        with self._lock:
+            self._records[prompt_key(prompt)] = {
+                'prompt': prompt,
+                'content': content,
+                'model': model_name,
+                'tokens_in': tokens_in,
+                'tokens_out': tokens_out,
+            }
+            # Пишем во временный файл и переименовываем, чтобы не оставить битый JSON
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._records, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
@@ -0,0 +1,100 @@
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+
+from ..models import Device, DeviceStatusCounter
+
+
+def counter_key(device):
+    """Ключ счётчика устройства: (device_type_id, status, is_written_off)"""
+    return device.device_type_id, device.status, device.is_written_off
+
+
+def shift_counters(old_key, new_key):
+    """
+    Переносит устройство из счётчика old_key в new_key
+
+    None означает отсутствие устройства: old_key=None — создание,
+    new_key=None — удаление. Вызывается внутри транзакции изменения
+    устройства, поэтому счётчики меняются вместе с ним.
+    """
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        counter_queryset(old_key).update(count=F('count') - 1)
+    if new_key is not None:
+        device_type_id, status, is_written_off = new_key
+        DeviceStatusCounter.objects.get_or_create(
+            device_type_id=device_type_id, status=status, is_written_off=is_written_off
+        )
+        counter_queryset(new_key).update(count=F('count') + 1)
+
+
+def apply_counter_deltas(deltas):
+    """
+    Изменяет несколько счётчиков двумя запросами (для массовых UPDATE устройств)
+
+    Args:
+        deltas: dict ключ счётчика → на сколько изменить
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    DeviceStatusCounter.objects.bulk_create([
+        DeviceStatusCounter(device_type_id=device_type_id, status=status, is_written_off=is_written_off)
+        for device_type_id, status, is_written_off in deltas
+    ], ignore_conflicts=True)
+    conditions = {key: counter_condition(key) for key in deltas}
+    DeviceStatusCounter.objects.filter(reduce(or_, conditions.values())).update(count=F('count') + Case(
+        *[When(conditions[key], then=Value(delta)) for key, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    ))
+
+
+def counter_condition(key):
+    device_type_id, status, is_written_off = key
+    return Q(device_type_id=device_type_id, status=status, is_written_off=is_written_off)
+
+
+def counter_queryset(key):
+    return DeviceStatusCounter.objects.filter(counter_condition(key))
+
+
+def device_stats():
+    """Сводка по оборудованию из счётчиков: строк не больше, чем типов × статусов × 2"""
+    stats = DeviceStatusCounter.objects.aggregate(
+        total=Sum('count'),
+        available=Sum('count', filter=Q(status=Device.STATUS_AVAILABLE)),
+        in_use=Sum('count', filter=Q(status=Device.STATUS_IN_USE)),
+    )
+    return {name: value or 0 for name, value in stats.items()}
+
+
+def rebuild_counters():
+    """
+    Пересчитывает счётчики по таблице оборудования
+
+    Returns:
+        int: Количество расхождений, исправленных пересчётом
+    """
+    with transaction.atomic():
+        # Блокируем счётчики, чтобы параллельные изменения устройств дождались пересчёта
+        current = {
+            (counter.device_type_id, counter.status, counter.is_written_off): counter.count
+            for counter in DeviceStatusCounter.objects.select_for_update()
+        }
+        actual = {
+            (row['device_type_id'], row['status'], row['is_written_off']): row['total']
+            for row in Device.objects.values('device_type_id', 'status', 'is_written_off').annotate(total=Count('id'))
+        }
+        mismatches = sum(current.get(key, 0) != actual.get(key, 0) for key in current.keys() | actual.keys())
+
+        DeviceStatusCounter.objects.all().delete()
+        DeviceStatusCounter.objects.bulk_create([
+            DeviceStatusCounter(device_type_id=device_type_id, status=status, is_written_off=is_written_off, count=total)
+            for (device_type_id, status, is_written_off), total in actual.items()
+        ])
+    return mismatches
@@ -0,0 +1,269 @@
+import csv
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import Device, DeviceType, Employee
+from .device_counters import apply_counter_deltas
+from .movement_export import Echo
+from .table_versions import bump_version
+
+# Столбцы файла; порядок в файле любой, лишние столбцы игнорируются
+REQUIRED_COLUMNS = ['inventory_number', 'model', 'device_type']
+OPTIONAL_COLUMNS = ['purchase_date', 'responsible_email']
+IMPORT_CHUNK_SIZE = 5000
+STAGING_TABLE = 'inventory_device_import'
+
+INVENTORY_NUMBER_LENGTH = Device._meta.get_field('inventory_number').max_length
+MODEL_LENGTH = Device._meta.get_field('model').max_length
+
+
+class DeviceImportError(Exception):
+    """Файл нельзя загрузить целиком (нет нужных столбцов)"""
+
+
+@dataclass
+class RejectedRow:
+    line: int
+    inventory_number: str
+    reason: str
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    rejected: list = field(default_factory=list)
+
+
+def import_devices(stream, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Загружает оборудование из CSV одним проходом по файлу
+
+    Строки проверяются по мере чтения: обязательные поля и длины,
+    повтор инвентарного номера в файле, тип оборудования по названию,
+    МОЛ по email, дата покупки (ГГГГ-ММ-ДД или ДД.ММ.ГГГГ). В PostgreSQL
+    прошедшие проверку строки передаются через COPY во временную таблицу
+    и вливаются в оборудование одним INSERT ... ON CONFLICT DO NOTHING;
+    в SQLite — bulk_create порциями по chunk_size. Номера, которые уже
+    есть в базе, попадают в отклонённые. Загрузка идёт в одной
+    транзакции, счётчики статусов и версия таблицы для API обновляются
+    вместе с ней.
+
+    Args:
+        stream: Текстовый поток CSV (разделитель «,» или «;», первая строка — заголовок)
+
+    Returns:
+        ImportResult
+
+    Raises:
+        DeviceImportError: В заголовке нет обязательных столбцов
+    """
+    result = ImportResult()
+    rows = read_rows(stream)
+
+    with transaction.atomic():
+        valid_rows = RowValidator(result).valid_rows(rows)
+        if connection.vendor == 'postgresql':
+            created = copy_devices(valid_rows, result)
+        else:
+            created = bulk_create_devices(valid_rows, result, chunk_size)
+
+        result.created = sum(created.values())
+        apply_counter_deltas({
+            (device_type_id, Device.STATUS_AVAILABLE, False): total for device_type_id, total in created.items()
+        })
+        if result.created:
+            bump_version('device')
+
+    result.rejected.sort(key=lambda rejected: rejected.line)
+    return result
+
+
+def read_rows(stream):
+    """Строки файла как (номер строки, словарь); разделитель определяется по заголовку"""
+    header = stream.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    columns = [column.strip().lower() for column in next(csv.reader([header], delimiter=delimiter), [])]
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise DeviceImportError(f"В файле нет столбцов: {', '.join(missing)}")
+
+    reader = csv.DictReader(stream, fieldnames=columns, delimiter=delimiter)
+    for row in reader:
+        if any(value and value.strip() for value in row.values() if isinstance(value, str)):
+            # Первая строка файла — заголовок
+            yield reader.line_num + 1, row
+
+
+class RowValidator:
+    """
+    Проверка строк импорта
+
+    Справочники типов и сотрудников читаются заранее: во время COPY
+    соединение занято, и запросов по ходу чтения файла быть не может.
+    """
+
+    def __init__(self, result):
+        self.result = result
+        self.device_types = {name.casefold(): type_id for type_id, name in DeviceType.objects.values_list('id', 'name')}
+        self.employees = {
+            email.lower(): employee_id
+            for employee_id, email in Employee.objects.values_list('id', 'email').iterator(chunk_size=IMPORT_CHUNK_SIZE)
+        }
+        self.seen = set()
+
+    def valid_rows(self, rows):
+        """
+        Прошедшие проверку строки
+
+        Yields:
+            tuple: (строка файла, инвентарный номер, модель, id типа, дата покупки, id МОЛ)
+        """
+        for line, row in rows:
+            inventory_number = (row.get('inventory_number') or '').strip()
+            try:
+                yield (line, inventory_number, *self.clean(inventory_number, row))
+            except ValueError as error:
+                self.result.rejected.append(RejectedRow(line, inventory_number, str(error)))
+            else:
+                self.seen.add(inventory_number)
+
+    def clean(self, inventory_number, row):
+        model = (row.get('model') or '').strip()
+        if not inventory_number or not model:
+            raise ValueError('Не указан инвентарный номер или модель')
+        if len(inventory_number) > INVENTORY_NUMBER_LENGTH or len(model) > MODEL_LENGTH:
+            raise ValueError('Слишком длинный инвентарный номер или модель')
+        if inventory_number in self.seen:
+            raise ValueError('Инвентарный номер повторяется в файле')
+
+        type_name = (row.get('device_type') or '').strip()
+        device_type_id = self.device_types.get(type_name.casefold())
+        if device_type_id is None:
+            raise ValueError(f'Неизвестный тип оборудования: {type_name}')
+
+        email = (row.get('responsible_email') or '').strip().lower()
+        responsible_id = self.employees.get(email) if email else None
+        if email and responsible_id is None:
+            raise ValueError(f'Сотрудник с email {email} не найден')
+
+        return model, device_type_id, parse_date((row.get('purchase_date') or '').strip()), responsible_id
+
+
+def parse_date(value):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(value, '%d.%m.%Y').date()
+    except ValueError:
+        raise ValueError(f'Неверная дата покупки: {value}') from None
+
+
+def bulk_create_devices(valid_rows, result, chunk_size):
+    """Загрузка через bulk_create; номера, уже занятые в базе, проверяются одним запросом на порцию"""
+    created = Counter()
+    chunk = []
+    for row in valid_rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            created.update(create_chunk(chunk, result))
+            chunk = []
+    if chunk:
+        created.update(create_chunk(chunk, result))
+    return created
+
+
+def create_chunk(chunk, result):
+    existing = set(
+        Device.objects.filter(inventory_number__in=[row[1] for row in chunk]).values_list('inventory_number', flat=True)
+    )
+    devices = []
+    for line, inventory_number, model, device_type_id, purchase_date, responsible_id in chunk:
+        if inventory_number in existing:
+            result.rejected.append(RejectedRow(line, inventory_number, 'Инвентарный номер уже есть в базе'))
+            continue
+        devices.append(Device(
+            inventory_number=inventory_number, model=model, device_type_id=device_type_id,
+            purchase_date=purchase_date, responsible_person_id=responsible_id,
+        ))
+    Device.objects.bulk_create(devices)
+    return Counter(device.device_type_id for device in devices)
+
+
+class CopyStream:
+    """Файлоподобный источник для COPY FROM STDIN: строки CSV формируются по мере чтения"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.buffer = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line.encode('utf-8')
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def csv_lines(valid_rows):
+    writer = csv.writer(Echo(), lineterminator='\n')
+    for row in valid_rows:
+        # Пустая строка без кавычек в формате CSV команды COPY означает NULL
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def copy_devices(valid_rows, result):
+    """
+    Загрузка через COPY во временную таблицу и слияние INSERT ... ON CONFLICT
+
+    Строки, не вставленные из-за существующего номера (в том числе
+    добавленного параллельно), отмечаются по RETURNING и попадают в
+    отклонённые.
+    """
+    device_table = connection.ops.quote_name(Device._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE {STAGING_TABLE} ('
+            f'line integer, inventory_number varchar({INVENTORY_NUMBER_LENGTH}), model varchar({MODEL_LENGTH}), '
+            'device_type_id bigint, '
+            'purchase_date date, responsible_person_id bigint, inserted boolean NOT NULL DEFAULT false'
+            ') ON COMMIT DROP'
+        )
+        cursor.cursor.copy_expert(
+            f'COPY {STAGING_TABLE} (line, inventory_number, model, device_type_id, purchase_date, '
+            'responsible_person_id) FROM STDIN WITH (FORMAT csv)',
+            CopyStream(csv_lines(valid_rows)),
+        )
+        cursor.execute(
+            f'WITH inserted AS ('
+            f'INSERT INTO {device_table} (inventory_number, model, device_type_id, status, purchase_date, '
+            'created_at, responsible_person_id, is_written_off, write_off_reason) '
+            f'SELECT inventory_number, model, device_type_id, %s, purchase_date, %s, responsible_person_id, '
+            f"false, '' FROM {STAGING_TABLE} ORDER BY line "
+            'ON CONFLICT (inventory_number) DO NOTHING RETURNING inventory_number'
+            f') UPDATE {STAGING_TABLE} SET inserted = true FROM inserted '
+            f'WHERE {STAGING_TABLE}.inventory_number = inserted.inventory_number',
+            [Device.STATUS_AVAILABLE, timezone.now()],
+        )
+        cursor.execute(f'SELECT device_type_id, COUNT(*) FROM {STAGING_TABLE} WHERE inserted GROUP BY device_type_id')
+        created = Counter(dict(cursor.fetchall()))
+        cursor.execute(f'SELECT line, inventory_number FROM {STAGING_TABLE} WHERE NOT inserted')
+        result.rejected.extend(
+            RejectedRow(line, inventory_number, 'Инвентарный номер уже есть в базе')
+            for line, inventory_number in cursor.fetchall()
+        )
+    return created
@@ -0,0 +1,152 @@
+import atexit
+import threading
+import time
+from contextvars import ContextVar
+from importlib.metadata import version
+
+import httpx
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from gigachat import GigaChat
+
+# Версии SDK, с закрытыми атрибутами которых работает GigaChatClientManager._prepare_client
+# (в requirements.txt версия закреплена)
+SUPPORTED_SDK_VERSIONS = ('0.1.',)
+
+
+def check_sdk_version():
+    """Проверяет, что установлена поддерживаемая версия библиотеки gigachat"""
+    installed = version('gigachat')
+    if not installed.startswith(SUPPORTED_SDK_VERSIONS):
+        raise ImproperlyConfigured(
+            f"Библиотека gigachat {installed} не поддерживается (нужна {', '.join(SUPPORTED_SDK_VERSIONS)}x): "
+            'проверьте GigaChatClientManager._prepare_client'
+        )
+    return installed
+
+
+# Таймаут текущей попытки; SDK не принимает таймаут на вызов, он задаётся запросу httpx в хуке
+_attempt_timeout = ContextVar('gigachat_attempt_timeout', default=None)
+
+
+def apply_attempt_timeout(request):
+    """Хук httpx: подставляет таймаут попытки в исходящий запрос"""
+    timeout = _attempt_timeout.get()
+    if timeout is not None:
+        request.extensions['timeout'] = httpx.Timeout(timeout).as_dict()
+
+
+class GigaChatClientManager:
+    """
+    Долгоживущий клиент GigaChat, общий для всех потоков процесса
+
+    Держит одно HTTP-соединение (keep-alive) и OAuth-токен между вызовами,
+    обновляя токен заранее, за GIGACHAT_TOKEN_REFRESH_MARGIN секунд до
+    истечения. Обновление токена и пересоздание клиента выполняются под
+    блокировкой, сами запросы идут параллельно.
+    """
+
+    def __init__(self, credentials=None, base_url=None, auth_url=None, scope=None,
+                 verify_ssl_certs=None, refresh_margin=None, timeout=None):
+        self.credentials = credentials or settings.GIGACHAT_API_KEY
+        self.base_url = base_url or settings.GIGACHAT_BASE_URL
+        self.auth_url = auth_url or settings.GIGACHAT_AUTH_URL
+        self.scope = scope or settings.GIGACHAT_SCOPE
+        self.verify_ssl_certs = settings.GIGACHAT_VERIFY_SSL_CERTS if verify_ssl_certs is None else verify_ssl_certs
+        self.refresh_margin = settings.GIGACHAT_TOKEN_REFRESH_MARGIN if refresh_margin is None else refresh_margin
+        self.timeout = timeout or settings.GIGACHAT_TIMEOUT
+        self._client = None
+        self._lock = threading.Lock()
+
+    def chat(self, prompt, timeout=None):
+        """
+        Отправляет промпт и возвращает ответ модели (ChatCompletion)
+
+        Args:
+            timeout: Таймаут этого вызова, сек (по умолчанию — таймаут клиента)
+        """
+        token = _attempt_timeout.set(timeout)
+        try:
+            return self.get_client().chat(prompt)
+        finally:
+            _attempt_timeout.reset(token)
+
+    def stream(self, prompt, timeout=None):
+        """
+        Отправляет промпт и отдаёт ответ модели по частям (ChatCompletionChunk)
+
+        Закрытие генератора закрывает HTTP-поток, и сервер прекращает генерацию.
+        """
+        token = _attempt_timeout.set(timeout)
+        try:
+            yield from self.get_client().stream(prompt)
+        finally:
+            _attempt_timeout.reset(token)
+
+    def get_client(self):
+        """Возвращает клиент с действующим токеном, создавая его при первом вызове"""
+        with self._lock:
+            if self._client is None:
+                check_sdk_version()
+                self._client = GigaChat(
+                    credentials=self.credentials,
+                    base_url=self.base_url,
+                    auth_url=self.auth_url,
+                    scope=self.scope,
+                    verify_ssl_certs=self.verify_ssl_certs,
+                    timeout=self.timeout,
+                )
+            self._prepare_client()
+            return self._client
+
+    def close(self):
+        """Закрывает HTTP-соединения клиента"""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def _prepare_client(self):
+        """
+        Подключает хук таймаута попытки и получает новый OAuth-токен, если
+        текущего нет или он скоро истечёт
+
+        SDK не даёт публичного способа задать таймаут на вызов, узнать срок
+        токена и обновить его заранее, поэтому здесь — и только здесь —
+        используются закрытые _client, _use_auth, _access_token и
+        _update_token (см. SUPPORTED_SDK_VERSIONS).
+        """
+        client = self._client
+        request_hooks = client._client.event_hooks['request']
+        if apply_attempt_timeout not in request_hooks:
+            request_hooks.append(apply_attempt_timeout)
+
+        if not client._use_auth:
+            return
+        token = client._access_token
+        # expires_at — unix-время в миллисекундах
+        if token is None or token.expires_at / 1000 - self.refresh_margin <= time.time():
+            client._update_token()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_client_manager():
+    """
+    Возвращает общий для процесса GigaChatClientManager
+
+    Если задан GIGACHAT_CASSETTE_MODE (record или replay), клиент
+    оборачивается кассетой GIGACHAT_CASSETTE.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            if settings.GIGACHAT_CASSETTE_MODE:
+                from .cassette import CassetteClient
+                _manager = CassetteClient(settings.GIGACHAT_CASSETTE, mode=settings.GIGACHAT_CASSETTE_MODE)
+            else:
+                _manager = GigaChatClientManager()
+            atexit.register(_manager.close)
+        return _manager
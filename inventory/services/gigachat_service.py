@@ -1,22 +1,95 @@
-from gigachat import GigaChat
+from dataclasses import dataclass
+from functools import partial
+import logging
+import time
 from django.conf import settings
-from .prompts import REQUEST_ANALYSIS_PROMPT
+from .ai_cache import get_analysis_cache, make_cache_key
+from .ai_metrics import registry as metrics
+from .gigachat_client import get_client_manager
+from .local_classifier import get_local_classifier
+from .resilience import CircuitBreaker, CircuitOpenError, RateLimiter, RateLimitExceeded, call_with_retry
+from .prompts import BATCH_ANALYSIS_PROMPT, PROMPT_VERSION, REQUEST_ANALYSIS_PROMPT
+from .response_parser import EXPECT_OBJECT, EXPECT_OBJECTS, JsonExtractor, normalize_analysis, parse_json
 import json
-import re
+
+logger = logging.getLogger(__name__)
+
+# Какое JSON-значение ожидается в ответе на вызов каждого типа
+EXPECTED_JSON = {'single': EXPECT_OBJECT, 'batch': EXPECT_OBJECTS}
+
+
+@dataclass
+class AnalysisOutcome:
+    """Результат анализа одной заявки вместе со сведениями о его получении"""
+    SOURCE_LLM = 'llm'
+    SOURCE_BATCH = 'batch'
+    SOURCE_CACHE = 'cache'
+    SOURCE_LOCAL = 'local'
+    SOURCE_DUPLICATE = 'duplicate'
+    SOURCE_FALLBACK = 'fallback'
+
+    result: dict
+    source: str
+    prompt_version: str = PROMPT_VERSION
+    model_name: str = ''
+    latency_ms: float = None
+    tokens_in: int = None
+    tokens_out: int = None
+    raw_response: str = ''
+
+
+class AnalysisFailed(Exception):
+    """
+    Анализ части заявок не выполнен (при fallback=False)
+
+    outcomes — результаты, полученные для остальных заявок, errors — id заявки → ошибка.
+    """
+
+    def __init__(self, outcomes, errors):
+        super().__init__('; '.join(f'#{item_id}: {error}' for item_id, error in errors.items()))
+        self.outcomes = outcomes
+        self.errors = errors
+
+
+@dataclass
+class ChatResponse:
+    """Ответ GigaChat: текст и данные для учёта"""
+    content: str
+    model_name: str = ''
+    latency_ms: float = 0.0
+    tokens_in: int = None
+    tokens_out: int = None
 
 
 class GigaChatService:
     """Сервис для анализа заявок через GigaChat API"""
 
-    def __init__(self):
-        """Инициализация сервиса с настройками аутентификации"""
-        self.credentials = settings.GIGACHAT_API_KEY
+    def __init__(self, client=None, priority=RateLimiter.PRIORITY_HIGH):
+        """
+        Инициализация сервиса
+
+        Args:
+            client: Менеджер клиента GigaChat (по умолчанию общий для процесса)
+            priority: Приоритет вызовов для ограничителя частоты; фоновый
+                переанализ использует RateLimiter.PRIORITY_LOW
+        """
+        self.client = client or get_client_manager()
+        self.breaker = CircuitBreaker()
+        self.rate_limiter = RateLimiter()
+        self.priority = priority
         self.system_prompt = REQUEST_ANALYSIS_PROMPT
+        self.batch_prompt = BATCH_ANALYSIS_PROMPT
+        self.cache = get_analysis_cache()
+        self.local_classifier = get_local_classifier() if settings.AI_LOCAL_CLASSIFIER_ENABLED else None
 
     def analyze_request(self, employee_position, device_type, purpose):
         """
         Анализирует заявку на оборудование через GigaChat
 
+        Очевидные заявки классифицируются локально, повторные заявки
+        с теми же (с точностью до нормализации) данными берутся из кэша —
+        в обоих случаях без обращения к API.
+
         Args:
             employee_position: Должность сотрудника
             device_type: Тип оборудования
@@ -25,30 +98,355 @@ class GigaChatService:
         Returns:
             dict: Результат анализа с полями priority_score, tags, summary, needs_clarification
         """
+        return self.analyze_request_detailed(employee_position, device_type, purpose).result
+
+    def analyze_request_detailed(self, employee_position, device_type, purpose, fallback=True):
+        """
+        То же, что analyze_request, но со сведениями об источнике, модели,
+        задержке и расходе токенов
+
+        Args:
+            fallback: При ошибке вернуть fallback_result(); иначе ошибка
+                пробрасывается (очередь повторяет задание и переходит к
+                fallback только после последней попытки)
+
+        Returns:
+            AnalysisOutcome
+        """
+        local_result = self._classify_locally(employee_position, device_type, purpose)
+        if local_result is not None:
+            return AnalysisOutcome(result=local_result, source=AnalysisOutcome.SOURCE_LOCAL)
+
+        cache_key = make_cache_key(employee_position, device_type, purpose)
+        cached_result = self.cache.get(cache_key)
+        if cached_result is not None:
+            return AnalysisOutcome(result=cached_result, source=AnalysisOutcome.SOURCE_CACHE)
+
         try:
-            with GigaChat(credentials=self.credentials, verify_ssl_certs=False) as giga:
+            user_message = self._build_user_message(employee_position, device_type, purpose)
+            full_prompt = f"{self.system_prompt}\n\n{user_message}"
+
+            response = self._chat(full_prompt, kind='single')
+            analysis_result = normalize_analysis(self._parse_json(response.content, kind='single'))
+
+        except (RateLimitExceeded, CircuitOpenError):
+            # Анализ не выполнялся: вызывающий код откладывает его, а не сохраняет ошибку
+            raise
+        except Exception as e:
+            logger.warning('AI-анализ заявки не выполнен: %s', e)
+            if not fallback:
+                raise
+            return self.fallback_outcome(e)
+
+        # Ошибочные ответы не кэшируем, чтобы следующая попытка ушла в API
+        self.cache.set(cache_key, analysis_result)
+        return AnalysisOutcome(
+            result=analysis_result,
+            source=AnalysisOutcome.SOURCE_LLM,
+            model_name=response.model_name,
+            latency_ms=response.latency_ms,
+            tokens_in=response.tokens_in,
+            tokens_out=response.tokens_out,
+            raw_response=response.content,
+        )
+
+    def analyze_many(self, items):
+        """
+        Анализирует несколько заявок минимальным числом запросов к GigaChat
+
+        Заявки упаковываются в общий промпт пачками, размер которых
+        ограничен GIGACHAT_BATCH_TOKEN_BUDGET и GIGACHAT_BATCH_MAX_ITEMS.
+        Модель возвращает JSON-массив с id заявок. Заявки, для которых
+        ответ не удалось разобрать, анализируются по одной через analyze_request.
+
+        Args:
+            items: Список dict с полями id, employee_position, device_type, purpose
+
+        Returns:
+            dict: id заявки -> результат анализа
+        """
+        return {item_id: outcome.result for item_id, outcome in self.analyze_many_detailed(items).items()}
+
+    def analyze_many_detailed(self, items, fallback=True):
+        """
+        То же, что analyze_many, но со сведениями о получении результатов
+
+        Задержка и токены пакетного запроса делятся поровну между его заявками.
+
+        Args:
+            fallback: При ошибке анализа заявки подставить fallback_result();
+                иначе после обработки остальных заявок выбрасывается AnalysisFailed
+
+        Returns:
+            dict: id заявки -> AnalysisOutcome
 
-                user_message = f"""
+        Raises:
+            AnalysisFailed: Только при fallback=False
+            RateLimitExceeded, CircuitOpenError: Анализ остановлен; в outcomes
+                исключения — уже полученные результаты
+        """
+        outcomes = {}
+        pending = []
+
+        for item in items:
+            local_result = self._classify_locally(item['employee_position'], item['device_type'], item['purpose'])
+            if local_result is not None:
+                outcomes[item['id']] = AnalysisOutcome(result=local_result, source=AnalysisOutcome.SOURCE_LOCAL)
+                continue
+
+            cache_key = make_cache_key(item['employee_position'], item['device_type'], item['purpose'])
+            cached_result = self.cache.get(cache_key)
+            if cached_result is not None:
+                outcomes[item['id']] = AnalysisOutcome(result=cached_result, source=AnalysisOutcome.SOURCE_CACHE)
+            else:
+                pending.append((item, cache_key))
+
+        for batch in self._split_batches(pending):
+            if len(batch) == 1:
+                continue
+
+            try:
+                response, batch_results = self._analyze_batch([item for item, _ in batch])
+            except (RateLimitExceeded, CircuitOpenError) as e:
+                e.outcomes = outcomes
+                raise
+            except Exception as e:
+                logger.warning('Пакетный AI-анализ %s заявок не выполнен: %s', len(batch), e)
+                continue
+
+            share = len(batch)
+            for item, cache_key in batch:
+                analysis_result = batch_results.get(str(item['id']))
+                if analysis_result is not None:
+                    self.cache.set(cache_key, analysis_result)
+                    outcomes[item['id']] = AnalysisOutcome(
+                        result=analysis_result,
+                        source=AnalysisOutcome.SOURCE_BATCH,
+                        model_name=response.model_name,
+                        latency_ms=response.latency_ms / share,
+                        tokens_in=response.tokens_in // share if response.tokens_in is not None else None,
+                        tokens_out=response.tokens_out // share if response.tokens_out is not None else None,
+                        raw_response=json.dumps(analysis_result, ensure_ascii=False),
+                    )
+
+        # Всё, что не разобралось из пакетного ответа, — по одной заявке
+        errors = {}
+        for item, _ in pending:
+            if item['id'] in outcomes:
+                continue
+            try:
+                outcomes[item['id']] = self.analyze_request_detailed(
+                    employee_position=item['employee_position'],
+                    device_type=item['device_type'],
+                    purpose=item['purpose'],
+                    fallback=fallback,
+                )
+            except (RateLimitExceeded, CircuitOpenError) as e:
+                e.outcomes = outcomes
+                raise
+            except Exception as e:
+                errors[item['id']] = e
+
+        if errors:
+            raise AnalysisFailed(outcomes, errors)
+        return outcomes
+
+    def _analyze_batch(self, items):
+        """
+        Отправляет пачку заявок одним запросом
+
+        Returns:
+            tuple: (ChatResponse, dict str(id) -> результат)
+        """
+        user_message = '\n'.join(
+            f"ЗАЯВКА id={item['id']}"
+            + self._build_user_message(item['employee_position'], item['device_type'], item['purpose'])
+            for item in items
+        )
+        full_prompt = f"{self.batch_prompt}\n\n{user_message}"
+
+        response = self._chat(full_prompt, kind='batch')
+        parsed = self._parse_json(response.content, kind='batch')
+        if isinstance(parsed, dict):
+            parsed = [parsed]
+
+        results = {}
+        for entry in parsed:
+            # Записи, не прошедшие проверку, будут проанализированы по одной
+            try:
+                entry = normalize_analysis(entry)
+            except ValueError:
+                metrics.inc('assetflow_ai_parse_errors_total', kind='batch')
+                continue
+            if 'id' in entry:
+                results[str(entry.pop('id'))] = entry
+        return response, results
+
+    def _split_batches(self, pending):
+        """Делит заявки на пачки по оценке числа токенов"""
+        budget = settings.GIGACHAT_BATCH_TOKEN_BUDGET
+        max_items = settings.GIGACHAT_BATCH_MAX_ITEMS
+
+        batch, batch_tokens = [], 0
+        for entry in pending:
+            item = entry[0]
+            tokens = self._estimate_tokens(
+                self._build_user_message(item['employee_position'], item['device_type'], item['purpose'])
+            )
+            if batch and (batch_tokens + tokens > budget or len(batch) >= max_items):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(entry)
+            batch_tokens += tokens
+
+        if batch:
+            yield batch
+
+    def _classify_locally(self, employee_position, device_type, purpose):
+        """Результат локального классификатора, если он достаточно уверен"""
+        if self.local_classifier is None:
+            return None
+        result, confidence = self.local_classifier.classify(employee_position, device_type, purpose)
+        if result is None or confidence < settings.AI_LOCAL_CLASSIFIER_THRESHOLD:
+            return None
+        return result
+
+    def _chat(self, prompt, kind='single'):
+        """
+        Отправляет промпт в GigaChat
+
+        При GIGACHAT_STREAMING ответ читается потоком и только до конца
+        первого JSON-значения ожидаемого типа (EXPECTED_JSON): остаток
+        генерации отменяется закрытием потока. Поток не сообщает расход токенов, поэтому он оценивается
+        по длине текста.
+
+        Перед каждой попыткой, в том числе повторной, резервируется запрос
+        и оценка токенов промпта в общем бюджете (RateLimiter), после
+        вызова учитывается фактический расход. Временные ошибки повторяются
+        в пределах GIGACHAT_DEADLINE; при разомкнутом выключателе вызов
+        сразу завершается CircuitOpenError.
+
+        Args:
+            kind: Тип вызова для метрик: single или batch
+
+        Returns:
+            ChatResponse
+
+        Raises:
+            RateLimitExceeded: Бюджет вызовов исчерпан
+            CircuitOpenError: Выключатель разомкнут
+        """
+        if settings.GIGACHAT_STREAMING:
+            request = partial(self._read_stream, expect=EXPECTED_JSON[kind])
+        else:
+            request = self._read_response
+        reserved_tokens = self._estimate_tokens(prompt)
+
+        def attempt(timeout):
+            self.rate_limiter.acquire(reserved_tokens, priority=self.priority)
+            return request(prompt, timeout)
+
+        started = time.monotonic()
+        try:
+            chat_response = call_with_retry(attempt, breaker=self.breaker)
+        except RateLimitExceeded:
+            metrics.inc('assetflow_ai_calls_total', kind=kind, outcome='rate_limited')
+            raise
+        except CircuitOpenError:
+            metrics.inc('assetflow_ai_calls_total', kind=kind, outcome='circuit_open')
+            raise
+        except Exception:
+            metrics.inc('assetflow_ai_calls_total', kind=kind, outcome='error')
+            metrics.observe('assetflow_ai_call_latency_seconds', time.monotonic() - started, kind=kind)
+            raise
+
+        elapsed = time.monotonic() - started
+        chat_response.latency_ms = elapsed * 1000
+        self.rate_limiter.record_tokens(
+            (chat_response.tokens_in or reserved_tokens) + (chat_response.tokens_out or 0) - reserved_tokens
+        )
+
+        metrics.inc('assetflow_ai_calls_total', kind=kind, outcome='success')
+        metrics.observe('assetflow_ai_call_latency_seconds', elapsed, kind=kind)
+        metrics.inc('assetflow_ai_tokens_total', chat_response.tokens_in or 0, direction='in')
+        metrics.inc('assetflow_ai_tokens_total', chat_response.tokens_out or 0, direction='out')
+        return chat_response
+
+    def _read_response(self, prompt, timeout=None):
+        response = self.client.chat(prompt, timeout=timeout)
+        usage = getattr(response, 'usage', None)
+        return ChatResponse(
+            content=response.choices[0].message.content,
+            model_name=getattr(response, 'model', '') or '',
+            tokens_in=getattr(usage, 'prompt_tokens', None),
+            tokens_out=getattr(usage, 'completion_tokens', None),
+        )
+
+    def _read_stream(self, prompt, timeout=None, expect=None):
+        extractor = JsonExtractor(expect)
+        parts = []
+        model_name = ''
+
+        chunks = self.client.stream(prompt, timeout=timeout)
+        try:
+            for chunk in chunks:
+                model_name = getattr(chunk, 'model', '') or model_name
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content or ''
+                parts.append(text)
+                if extractor.feed(text):
+                    metrics.inc('assetflow_ai_streams_cancelled_total')
+                    break
+        finally:
+            chunks.close()
+
+        content = ''.join(parts)
+        return ChatResponse(
+            content=content,
+            model_name=model_name,
+            tokens_in=self._estimate_tokens(prompt),
+            tokens_out=self._estimate_tokens(content),
+        )
+
+    @staticmethod
+    def _build_user_message(employee_position, device_type, purpose):
+        return f"""
 СОТРУДНИК: {employee_position}
-ОБОРУДОВАНИЕ: {device_type} 
+ОБОРУДОВАНИЕ: {device_type}
 ЦЕЛЬ: {purpose}
 """
 
-                full_prompt = f"{self.system_prompt}\n\n{user_message}"
-
-                response = giga.chat(full_prompt)
-                ai_response = response.choices[0].message.content
+    @staticmethod
+    def _parse_json(ai_response, kind='single'):
+        """Первое JSON-значение ответа; пояснения вокруг него и типичные дефекты допускаются"""
+        try:
+            parsed, repaired = parse_json(ai_response, expect=EXPECTED_JSON[kind])
+        except ValueError:
+            metrics.inc('assetflow_ai_parse_errors_total', kind=kind)
+            raise
+        if repaired:
+            metrics.inc('assetflow_ai_parse_repairs_total', kind=kind)
+        return parsed
 
-                cleaned_response = re.sub(r'^```json|```$', '', ai_response).strip()
-                analysis_result = json.loads(cleaned_response)
+    @staticmethod
+    def _estimate_tokens(text):
+        # Для русского текста в среднем ~3 символа на токен
+        return len(text) // 3 + 1
 
-                return analysis_result
+    @classmethod
+    def fallback_outcome(cls, error):
+        """Результат-заглушка с текстом ошибки для истории анализов"""
+        return AnalysisOutcome(result=cls.fallback_result(), source=AnalysisOutcome.SOURCE_FALLBACK,
+                               raw_response=str(error))
 
-        except Exception as e:
-            return {
-                "priority_score": 5,
-                "tags": ["ошибка анализа"],
-                "summary": "Не удалось проанализировать заявку",
-                "needs_clarification": True,
-                "clarification_questions": ["Опишите подробнее вашу задачу"]
-            }
\ No newline at end of file
+    @staticmethod
+    def fallback_result():
+        """Результат, возвращаемый при ошибке анализа"""
+        return {
+            "priority_score": 5,
+            "tags": ["ошибка анализа"],
+            "summary": "Не удалось проанализировать заявку",
+            "needs_clarification": True,
+            "clarification_questions": ["Опишите подробнее вашу задачу"]
+        }
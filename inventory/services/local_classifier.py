@@ -0,0 +1,337 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+from .ai_cache import normalize_text
+from .prompts import ANALYSIS_TAGS
+
+# Правила по тегам из ANALYSIS_TAGS: тег -> шаблоны по основам слов
+TAG_RULES = {
+    'оборудование сломалось': [
+        r'\bсломал', r'\bне работа', r'\bне включа', r'\bне запуска', r'\bразбит',
+        r'\bполомк', r'\bнеисправ', r'\bсгорел', r'\bзависа', r'\bглючит',
+    ],
+    'блокирует работу': [
+        r'\bне могу работ', r'\bне могу продолж', r'\bблокир', r'\bостановл', r'\bупал',
+        r'\bпростаива',
+    ],
+    'срочно': [
+        r'\bсрочн', r'\bнемедленн', r'\bкак можно скорее', r'\bгорит\b', r'\bупал',
+    ],
+    'для проекта': [
+        r'\bпроект', r'\bразработ', r'\bтестирова', r'\bрелиз', r'\bзадач', r'\bдиагностик',
+    ],
+    'апгрейд': [
+        r'\bапгрейд', r'\bобнов', r'\bмощне', r'\bбыстрее', r'\bустарел',
+    ],
+    'личное предпочтение': [
+        r'\bудобств', r'\bудобн', r'\bхочу\b', r'\bнравит', r'\bпредпочита', r'\bкомфорт',
+    ],
+}
+
+# Приоритет для сочетаний тегов, проверяются по порядку
+PRIORITY_RULES = [
+    ({'оборудование сломалось', 'блокирует работу'}, 10),
+    ({'оборудование сломалось'}, 9),
+    ({'блокирует работу'}, 8),
+    ({'для проекта'}, 6),
+    ({'апгрейд'}, 4),
+    ({'личное предпочтение'}, 3),
+]
+
+# Границы корзин приоритета для обучаемой модели: низкий, средний, высокий
+PRIORITY_BUCKETS = [(1, 4), (5, 7), (8, 10)]
+
+MIN_WORDS = 3
+# Короткая цель без ключевых слов ещё не значит, что она неясна («Замена монитора»):
+# уверенность ниже порога AI_LOCAL_CLASSIFIER_THRESHOLD, такие заявки оценивает модель
+SHORT_PURPOSE_CONFIDENCE = 0.5
+
+
+def tokenize(text):
+    """Разбивает текст на грубые основы слов (первые 6 символов)"""
+    return [word[:6] for word in normalize_text(text).split() if len(word) > 1]
+
+
+def priority_bucket(score):
+    for index, (low, high) in enumerate(PRIORITY_BUCKETS):
+        if score <= high:
+            return index
+    return len(PRIORITY_BUCKETS) - 1
+
+
+class RuleClassifier:
+    """Детерминированный классификатор на регулярных выражениях"""
+
+    def __init__(self, rules=None):
+        self.rules = {
+            tag: [re.compile(pattern) for pattern in patterns]
+            for tag, patterns in (rules or TAG_RULES).items()
+            if tag in ANALYSIS_TAGS
+        }
+
+    def classify(self, purpose):
+        """
+        Returns:
+            tuple: (priority_score, tags, confidence); priority_score None,
+            если правила не сработали
+        """
+        text = normalize_text(purpose)
+        tags = [tag for tag, patterns in self.rules.items() if any(p.search(text) for p in patterns)]
+
+        if len(text.split()) < MIN_WORDS and not tags:
+            return 2, ['неясная цель', 'требует уточнения'], SHORT_PURPOSE_CONFIDENCE
+
+        for required, score in PRIORITY_RULES:
+            if required <= set(tags):
+                break
+        else:
+            return None, tags, 0.0
+
+        if 'срочно' in tags:
+            score = min(10, score + 1)
+
+        # Поломка и «личное предпочтение» вместе — противоречие, доверяем меньше
+        conflicting = bool({'оборудование сломалось', 'блокирует работу'} & set(tags)) and (
+            'личное предпочтение' in tags or 'апгрейд' in tags
+        )
+        if conflicting:
+            confidence = 0.5
+        elif score >= 8 or score <= 3:
+            confidence = 0.9
+        else:
+            confidence = 0.6
+        return score, tags, confidence
+
+
+class TfidfLogisticModel:
+    """
+    TF-IDF + логистическая регрессия (один-против-всех) на чистом Python
+
+    Обучается на прошлых заявках: по тексту цели предсказывает теги и
+    корзину приоритета. Внешние ML-библиотеки не требуются, модель
+    сериализуется в JSON.
+    """
+
+    def __init__(self, idf=None, tag_weights=None, bucket_weights=None, bucket_scores=None):
+        self.idf = idf or {}
+        self.tag_weights = tag_weights or {}
+        self.bucket_weights = bucket_weights or []
+        self.bucket_scores = bucket_scores or []
+
+    def vectorize(self, text):
+        counts = Counter(token for token in tokenize(text) if token in self.idf)
+        vector = {token: count * self.idf[token] for token, count in counts.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+        return {token: value / norm for token, value in vector.items()}
+
+    @classmethod
+    def train(cls, samples, epochs=30, learning_rate=0.5, l2=1e-4):
+        """
+        Args:
+            samples: Список (purpose, tags, priority_score)
+
+        Returns:
+            TfidfLogisticModel
+        """
+        documents = [set(tokenize(purpose)) for purpose, _, _ in samples]
+        document_frequency = Counter(token for document in documents for token in document)
+        total = len(samples)
+        model = cls(idf={
+            token: math.log((1 + total) / (1 + frequency)) + 1
+            for token, frequency in document_frequency.items()
+        })
+
+        vectors = [model.vectorize(purpose) for purpose, _, _ in samples]
+
+        model.tag_weights = {
+            tag: _train_binary(vectors, [tag in tags for _, tags, _ in samples], epochs, learning_rate, l2)
+            for tag in ANALYSIS_TAGS
+            if any(tag in tags for _, tags, _ in samples)
+        }
+
+        buckets = [priority_bucket(score) for _, _, score in samples]
+        model.bucket_weights = [
+            _train_binary(vectors, [bucket == index for bucket in buckets], epochs, learning_rate, l2)
+            for index in range(len(PRIORITY_BUCKETS))
+        ]
+        model.bucket_scores = []
+        for index, (low, high) in enumerate(PRIORITY_BUCKETS):
+            scores = [score for (_, _, score), bucket in zip(samples, buckets) if bucket == index]
+            model.bucket_scores.append(round(sum(scores) / len(scores)) if scores else (low + high) // 2)
+
+        return model
+
+    def predict(self, purpose):
+        """
+        Returns:
+            tuple: (priority_score, tags, confidence)
+        """
+        vector = self.vectorize(purpose)
+        if not vector or not self.bucket_weights:
+            return None, [], 0.0
+
+        probabilities = [_predict_binary(weights, vector) for weights in self.bucket_weights]
+        total = sum(probabilities) or 1.0
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+
+        tags = [
+            tag for tag, weights in self.tag_weights.items()
+            if _predict_binary(weights, vector) >= 0.5
+        ]
+        return self.bucket_scores[best], tags, probabilities[best] / total
+
+    def to_dict(self):
+        return {
+            'idf': self.idf,
+            'tag_weights': self.tag_weights,
+            'bucket_weights': self.bucket_weights,
+            'bucket_scores': self.bucket_scores,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def _train_binary(vectors, labels, epochs, learning_rate, l2):
+    """Стохастический градиентный спуск для логистической регрессии"""
+    weights = {'__bias__': 0.0}
+    for epoch in range(epochs):
+        rate = learning_rate / (1 + epoch * 0.1)
+        for vector, label in zip(vectors, labels):
+            error = (1.0 if label else 0.0) - _predict_binary(weights, vector)
+            weights['__bias__'] += rate * error
+            for token, value in vector.items():
+                weight = weights.get(token, 0.0)
+                weights[token] = weight + rate * (error * value - l2 * weight)
+    return weights
+
+
+def _predict_binary(weights, vector):
+    z = weights.get('__bias__', 0.0) + sum(weights.get(token, 0.0) * value for token, value in vector.items())
+    z = max(-30.0, min(30.0, z))
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+class LocalClassifier:
+    """
+    Локальный предклассификатор заявок перед вызовом GigaChat
+
+    Сочетает правила и обученную модель. Если уверенность не ниже
+    AI_LOCAL_CLASSIFIER_THRESHOLD, результат имеет ту же структуру, что и
+    ответ GigaChat, и удалённый вызов не нужен.
+    """
+
+    def __init__(self, model=None):
+        self.rules = RuleClassifier()
+        self.model = model
+
+    def classify(self, employee_position, device_type, purpose):
+        """
+        Returns:
+            tuple: (результат анализа или None, уверенность 0..1)
+        """
+        rule_score, rule_tags, rule_confidence = self.rules.classify(purpose)
+        model_score, model_tags, model_confidence = (
+            self.model.predict(purpose) if self.model else (None, [], 0.0)
+        )
+
+        if rule_score is None and model_score is None:
+            return None, 0.0
+
+        if rule_score is not None and model_score is not None:
+            if priority_bucket(rule_score) == priority_bucket(model_score):
+                confidence = 1 - (1 - rule_confidence) * (1 - model_confidence)
+                score, tags = rule_score, list(dict.fromkeys(rule_tags + model_tags))
+            elif rule_confidence >= model_confidence:
+                confidence = rule_confidence * (1 - model_confidence / 2)
+                score, tags = rule_score, rule_tags
+            else:
+                confidence = model_confidence * (1 - rule_confidence / 2)
+                score, tags = model_score, model_tags
+        elif rule_score is not None:
+            score, tags, confidence = rule_score, rule_tags, rule_confidence
+        else:
+            score, tags, confidence = model_score, model_tags, model_confidence
+
+        needs_clarification = 'требует уточнения' in tags or 'неясная цель' in tags
+        result = {
+            'priority_score': score,
+            'tags': tags,
+            'summary': f'{device_type}: {" ".join((purpose or "").split())[:200]}',
+            'needs_clarification': needs_clarification,
+            'clarification_questions': ['Опишите подробнее вашу задачу'] if needs_clarification else [],
+        }
+        return result, confidence
+
+
+def train_model(min_samples=20):
+    """
+    Обучает TfidfLogisticModel на заявках с результатами AI-анализа
+
+    Берутся только ответы GigaChat (одиночные и пакетные): результаты
+    самого классификатора, повторов и заглушек замкнули бы обучение на себя.
+
+    Returns:
+        TfidfLogisticModel или None, если данных меньше min_samples
+    """
+    from ..models import AIAnalysis, Request
+
+    samples = [
+        (purpose, tags or [], score)
+        for purpose, tags, score in Request.objects.filter(
+            ai_priority_score__isnull=False,
+            current_analysis__source__in=[AIAnalysis.SOURCE_LLM, AIAnalysis.SOURCE_BATCH],
+        )
+        .exclude(purpose='')
+        .values_list('purpose', 'ai_tags', 'ai_priority_score')
+        .iterator()
+    ]
+    if len(samples) < min_samples:
+        return None
+    return TfidfLogisticModel.train(samples)
+
+
+def save_model(model, path=None):
+    path = path or settings.AI_LOCAL_CLASSIFIER_PATH
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(model.to_dict(), f, ensure_ascii=False)
+
+
+def load_model(path=None):
+    path = path or settings.AI_LOCAL_CLASSIFIER_PATH
+    try:
+        with open(path, encoding='utf-8') as f:
+            return TfidfLogisticModel.from_dict(json.load(f))
+    except (OSError, ValueError):
+        return None
+
+
+_classifier = None
+_classifier_mtime = None
+_classifier_lock = threading.Lock()
+
+
+def get_local_classifier():
+    """
+    Возвращает общий для процесса LocalClassifier
+
+    Файл модели перечитывается, если он изменился после обучения.
+    """
+    global _classifier, _classifier_mtime
+    try:
+        mtime = os.path.getmtime(settings.AI_LOCAL_CLASSIFIER_PATH)
+    except OSError:
+        mtime = None
+
+    with _classifier_lock:
+        if _classifier is None or mtime != _classifier_mtime:
+            _classifier = LocalClassifier(model=load_model() if mtime else None)
+            _classifier_mtime = mtime
+        return _classifier
@@ -0,0 +1,237 @@
+import csv
+import json
+import re
+import zipfile
+from datetime import datetime, time, timedelta
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from ..models import EquipmentMovement
+
+# (поле выборки, заголовок) — порядок столбцов во всех форматах
+EXPORT_COLUMNS = [
+    ('id', 'ID'),
+    ('timestamp', 'Дата'),
+    ('movement_type', 'Операция'),
+    ('device__inventory_number', 'Инвентарный номер'),
+    ('device__model', 'Модель'),
+    ('device__device_type__name', 'Тип оборудования'),
+    ('employee__full_name', 'Сотрудник'),
+    ('notes', 'Примечание'),
+]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def filter_movements(filters):
+    """
+    Движения оборудования по фильтрам
+
+    Args:
+        filters: date_from, date_to (date), movement_type, device_type, employee (id)
+    """
+    movements = EquipmentMovement.objects.all()
+    if filters.get('date_from'):
+        movements = movements.filter(timestamp__gte=start_of_day(filters['date_from']))
+    if filters.get('date_to'):
+        movements = movements.filter(timestamp__lt=start_of_day(filters['date_to'] + timedelta(days=1)))
+    if filters.get('movement_type'):
+        movements = movements.filter(movement_type=filters['movement_type'])
+    if filters.get('device_type'):
+        movements = movements.filter(device__device_type_id=filters['device_type'])
+    if filters.get('employee'):
+        movements = movements.filter(employee_id=filters['employee'])
+    return movements
+
+
+def movement_queryset(filters):
+    """Журнал движений для выгрузки: только нужные столбцы, в порядке времени"""
+    return filter_movements(filters).order_by('timestamp', 'id').values_list(*[field for field, _ in EXPORT_COLUMNS])
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def iter_movements(filters, chunk_size=2000):
+    """
+    Строки журнала с курсором на стороне сервера
+
+    iterator() в PostgreSQL читает выборку именованным курсором порциями
+    по chunk_size строк, поэтому память не зависит от размера журнала.
+    """
+    movement_types = dict(EquipmentMovement.MOVEMENT_CHOICES)
+    for row in movement_queryset(filters).iterator(chunk_size=chunk_size):
+        row = list(row)
+        row[1] = timezone.localtime(row[1]).strftime('%Y-%m-%d %H:%M:%S')
+        row[2] = movement_types.get(row[2], row[2])
+        yield row
+
+
+class Echo:
+    """Файлоподобный объект, возвращающий записанное вместо хранения"""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(rows):
+    # BOM нужен Excel, чтобы открыть UTF-8 без мастера импорта
+    yield '\ufeff'
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for _, header in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_chunks(rows):
+    fields = [field for field, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n'
+
+
+class StreamBuffer:
+    """Приёмник ZipFile без перемотки: записанные байты забираются порциями"""
+
+    def __init__(self):
+        self.parts = []
+        self.offset = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+# Лист XLSX вмещает 1 048 576 строк, включая заголовок; дальше журнал продолжается на следующем
+XLSX_MAX_ROWS = 1048576
+XLSX_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+XLSX_RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+XLSX_DOC_RELS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+
+# Символы, недопустимые в XML 1.0
+XML_ILLEGAL_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def xlsx_cell(value):
+    if isinstance(value, int):
+        return f'<c t="n"><v>{value}</v></c>'
+    text = escape(XML_ILLEGAL_CHARS.sub('', str(value or '')))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_row(values):
+    return '<row>' + ''.join(xlsx_cell(value) for value in values) + '</row>'
+
+
+def xlsx_package_parts(sheet_count):
+    """Служебные части книги; пишутся в конце, когда известно число листов"""
+    sheet_ids = range(1, sheet_count + 1)
+    return {
+        '[Content_Types].xml': (
+            XML_DECLARATION
+            + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + ''.join(
+                f'<Override PartName="/xl/worksheets/sheet{number}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for number in sheet_ids
+            )
+            + '</Types>'
+        ),
+        '_rels/.rels': (
+            XML_DECLARATION
+            + f'<Relationships xmlns="{XLSX_RELS_NS}">'
+            f'<Relationship Id="rId1" Type="{XLSX_DOC_RELS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ),
+        'xl/workbook.xml': (
+            XML_DECLARATION
+            + f'<workbook xmlns="{XLSX_MAIN_NS}" xmlns:r="{XLSX_DOC_RELS}"><sheets>'
+            + ''.join(
+                f'<sheet name="Движения {number}" sheetId="{number}" r:id="rId{number}"/>' for number in sheet_ids
+            )
+            + '</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            XML_DECLARATION
+            + f'<Relationships xmlns="{XLSX_RELS_NS}">'
+            + ''.join(
+                f'<Relationship Id="rId{number}" Type="{XLSX_DOC_RELS}/worksheet" '
+                f'Target="worksheets/sheet{number}.xml"/>'
+                for number in sheet_ids
+            )
+            + '</Relationships>'
+        ),
+    }
+
+
+def xlsx_chunks(rows, rows_per_chunk=1000, max_rows=XLSX_MAX_ROWS):
+    """
+    XLSX, записываемый по мере чтения строк
+
+    Книга собирается вручную (zipfile + SpreadsheetML со строками inline),
+    без библиотек, держащих лист в памяти: ZipFile пишет в StreamBuffer,
+    а накопленные байты отдаются каждые rows_per_chunk строк. Порядок
+    частей в архиве не важен, поэтому листы идут первыми, а описание
+    книги — последним.
+    """
+    buffer = StreamBuffer()
+    header = xlsx_row(header for _, header in EXPORT_COLUMNS)
+    rows = iter(rows)
+    sheet_count = 0
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        exhausted = False
+        while not exhausted:
+            sheet_count += 1
+            with archive.open(f'xl/worksheets/sheet{sheet_count}.xml', 'w', force_zip64=True) as sheet:
+                sheet.write(f'{XML_DECLARATION}<worksheet xmlns="{XLSX_MAIN_NS}"><sheetData>{header}'.encode('utf-8'))
+                pending = []
+                written = 1
+                for row in rows:
+                    pending.append(xlsx_row(row))
+                    written += 1
+                    if len(pending) >= rows_per_chunk or written >= max_rows:
+                        sheet.write(''.join(pending).encode('utf-8'))
+                        pending = []
+                        yield buffer.pop()
+                    if written >= max_rows:
+                        break
+                else:
+                    exhausted = True
+                sheet.write((''.join(pending) + '</sheetData></worksheet>').encode('utf-8'))
+
+        for name, content in xlsx_package_parts(sheet_count).items():
+            archive.writestr(name, content)
+    yield buffer.pop()
+
+
+def export_chunks(export_format, rows):
+    """Части выгрузки в формате csv, jsonl или xlsx"""
+    if export_format == 'csv':
+        return csv_chunks(rows)
+    if export_format == 'jsonl':
+        return jsonl_chunks(rows)
+    if export_format == 'xlsx':
+        return xlsx_chunks(rows)
+    raise ValueError(f'Неизвестный формат выгрузки: {export_format}')
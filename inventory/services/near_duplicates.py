@@ -0,0 +1,120 @@
+import hashlib
+import random
+
+from django.conf import settings
+
+from .ai_cache import normalize_text
+from .prompts import PROMPT_VERSION
+
+SHINGLE_SIZE = 3
+BANDS = 20
+ROWS_PER_BAND = 3
+NUM_PERMUTATIONS = BANDS * ROWS_PER_BAND
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def shingles(text):
+    """Символьные n-граммы нормализованного текста"""
+    text = f' {normalize_text(text)} '
+    return {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+
+
+def jaccard(first, second):
+    """Точное сходство Жаккара двух текстов по n-граммам"""
+    a, b = shingles(first), shingles(second)
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+def minhash_signature(text):
+    """MinHash-подпись текста из NUM_PERMUTATIONS значений"""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for shingle in shingles(text)
+    ]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def make_scope(employee_position, device_type):
+    """Область поиска: совпадения ищутся только при том же типе оборудования и должности"""
+    return f'{normalize_text(device_type)}|{normalize_text(employee_position)}'
+
+
+def lsh_buckets(scope, purpose):
+    """Ключи LSH-корзин: по одному на полосу подписи"""
+    signature = minhash_signature(purpose)
+    buckets = []
+    for band in range(BANDS):
+        values = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        key = f'{scope}|{band}|{",".join(map(str, values))}'
+        buckets.append(hashlib.sha1(key.encode('utf-8')).hexdigest())
+    return buckets
+
+
+def find_duplicate(employee_position, device_type, purpose, exclude_id=None, threshold=None):
+    """
+    Ищет ранее проанализированную заявку с почти такой же целью
+
+    Кандидаты отбираются по LSH-корзинам, затем проверяется точное
+    сходство n-грамм.
+
+    Returns:
+        tuple: (Request, сходство) или (None, 0.0)
+    """
+    from ..models import AIAnalysis, PurposeLSHBucket, Request
+
+    threshold = threshold or settings.AI_NEAR_DUPLICATE_THRESHOLD
+    buckets = lsh_buckets(make_scope(employee_position, device_type), purpose)
+
+    candidate_ids = PurposeLSHBucket.objects.filter(bucket__in=buckets).values('request_id')
+    # Повторно используем только актуальные анализы, полученные от модели
+    candidates = (
+        Request.objects.filter(
+            id__in=candidate_ids,
+            current_analysis__prompt_version=PROMPT_VERSION,
+            current_analysis__source__in=[AIAnalysis.SOURCE_LLM, AIAnalysis.SOURCE_BATCH],
+        )
+        .exclude(id=exclude_id)
+        .select_related('current_analysis')
+        .only('id', 'purpose', 'current_analysis', 'current_analysis__result')
+    )
+
+    best, best_similarity = None, 0.0
+    for candidate in candidates:
+        similarity = jaccard(purpose, candidate.purpose)
+        if similarity > best_similarity:
+            best, best_similarity = candidate, similarity
+
+    if best_similarity < threshold:
+        return None, 0.0
+    return best, best_similarity
+
+
+def build_buckets(request_obj):
+    """Несохранённые записи PurposeLSHBucket для заявки"""
+    from ..models import PurposeLSHBucket
+
+    scope = make_scope(getattr(request_obj.employee, 'position', ''), request_obj.device.device_type.name)
+    return [
+        PurposeLSHBucket(request_id=request_obj.pk, bucket=bucket)
+        for bucket in set(lsh_buckets(scope, request_obj.purpose))
+    ]
+
+
+def index_requests(requests):
+    """Добавляет заявки в индекс (инкрементально, прежние корзины заменяются)"""
+    from ..models import PurposeLSHBucket
+
+    requests = [request_obj for request_obj in requests if request_obj.purpose]
+    if not requests:
+        return
+    PurposeLSHBucket.objects.filter(request_id__in=[request_obj.pk for request_obj in requests]).delete()
+    PurposeLSHBucket.objects.bulk_create(
+        [bucket for request_obj in requests for bucket in build_buckets(request_obj)],
+        batch_size=1000,
+    )
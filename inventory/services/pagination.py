@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'inventory.keyset-cursor'
+
+
+@dataclass
+class KeysetPage:
+    """Страница выборки и курсоры соседних страниц"""
+    items: list
+    next_cursor: str = None
+    previous_cursor: str = None
+
+
+def encode_cursor(ordering, values, direction):
+    """Непрозрачный подписанный токен позиции в выборке"""
+    return signing.dumps({'o': list(ordering), 'v': list(values), 'd': direction}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, ordering):
+    """
+    Разбирает токен курсора
+
+    Returns:
+        tuple: (значения ключа, направление) или (None, 'next'), если токен
+        пуст, подделан или выдан для другой сортировки
+    """
+    if not token:
+        return None, 'next'
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None, 'next'
+    if data.get('o') != list(ordering) or data.get('d') not in ('next', 'previous'):
+        return None, 'next'
+    return data['v'], data['d']
+
+
+def keyset_filter(ordering, values, forward=True):
+    """
+    Условие «строго после (до) values» для сортировки по ordering
+
+    (a, b, c) > (va, vb, vc) раскрывается в
+    a > va OR (a = va AND b > vb) OR (a = va AND b = vb AND c > vc),
+    что использует составной индекс по тем же столбцам.
+    """
+    condition = Q()
+    for position, field in enumerate(ordering):
+        lookup = 'gt' if forward else 'lt'
+        step = Q(**{f'{field}__{lookup}': values[position]})
+        for previous_field, previous_value in zip(ordering[:position], values[:position]):
+            step &= Q(**{previous_field: previous_value})
+        condition |= step
+    return condition
+
+
+def keyset_paginate(queryset, ordering, cursor=None, page_size=50):
+    """
+    Страница выборки по ключу (keyset), а не по смещению
+
+    Стоимость не зависит от номера страницы: запрос читает page_size + 1
+    строк начиная с позиции курсора. Последним полем ordering должен быть
+    уникальный ключ (id), иначе порядок не однозначен.
+
+    Args:
+        queryset: Отфильтрованная выборка
+        ordering: Поля сортировки по возрастанию, например ('status', 'device_type_id', 'id')
+        cursor: Токен из KeysetPage.next_cursor или previous_cursor
+        page_size: Размер страницы
+
+    Returns:
+        KeysetPage
+    """
+    values, direction = decode_cursor(cursor, ordering)
+    forward = direction == 'next'
+
+    if values is not None:
+        queryset = queryset.filter(keyset_filter(ordering, values, forward=forward))
+    order_by = list(ordering) if forward else [f'-{field}' for field in ordering]
+    items = list(queryset.order_by(*order_by)[:page_size + 1])
+
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    if not forward:
+        items.reverse()
+    if not items:
+        return KeysetPage(items=[])
+
+    def position(item):
+        return [getattr(item, field) for field in ordering]
+
+    # При движении вперёд предыдущая страница есть, если был курсор; назад — наоборот
+    has_next = has_more if forward else values is not None
+    has_previous = values is not None if forward else has_more
+    return KeysetPage(
+        items=items,
+        next_cursor=encode_cursor(ordering, position(items[-1]), 'next') if has_next else None,
+        previous_cursor=encode_cursor(ordering, position(items[0]), 'previous') if has_previous else None,
+    )
@@ -1,3 +1,24 @@
+import hashlib
+import re
+
+ANALYSIS_CRITERIA = """
+Критерии приоритета (1-10):
+10 - оборудование СЛОМАЛОСЬ, работа ОСТАНОВЛЕНА (есть конкретные детали поломки)
+8-9 - есть четкое описание проблемы, блокирует конкретные задачи
+5-7 - для рабочих задач, проектов с описанием
+3-4 - улучшение условий, апгрейд
+1-2 - нет четкой цели, абстрактные запросы
+
+ТЕГИ (разделяй запятыми): 
+"срочно", "блокирует работу", "для проекта", "апгрейд", "личное предпочтение", 
+"оборудование сломалось", "неясная цель", "требует уточнения"
+
+НУЖНЫ_УТОЧНЕНИЯ: true если описание расплывчатое или недостаточно информации
+"""
+
+# Допустимые теги — все строки в кавычках из блока ТЕГИ
+ANALYSIS_TAGS = re.findall(r'"([^"]+)"', ANALYSIS_CRITERIA)
+
 REQUEST_ANALYSIS_PROMPT = """
 ВЕРНИ ТОЛЬКО JSON БЕЗ ЛИШНИХ СИМВОЛОВ, КОММЕНТАРИЕВ И ОБЪЯСНЕНИЙ!
 
@@ -11,18 +32,45 @@ REQUEST_ANALYSIS_PROMPT = """
 
 Проанализируй заявку и заполни JSON выше.
 
-Критерии приоритета (1-10):
-10 - оборудование СЛОМАЛОСЬ, работа ОСТАНОВЛЕНА (есть конкретные детали поломки)
-8-9 - есть четкое описание проблемы, блокирует конкретные задачи
-5-7 - для рабочих задач, проектов с описанием
-3-4 - улучшение условий, апгрейд
-1-2 - нет четкой цели, абстрактные запросы
+""" + ANALYSIS_CRITERIA.strip('\n') + """
 
-ТЕГИ (разделяй запятыми): 
-"срочно", "блокирует работу", "для проекта", "апгрейд", "личное предпочтение", 
-"оборудование сломалось", "неясная цель", "требует уточнения"
+ВЕРНИ ТОЛЬКО JSON!
+"""
 
-НУЖНЫ_УТОЧНЕНИЯ: true если описание расплывчатое или недостаточно информации
+BATCH_ANALYSIS_PROMPT = """
+ВЕРНИ ТОЛЬКО JSON-МАССИВ БЕЗ ЛИШНИХ СИМВОЛОВ, КОММЕНТАРИЕВ И ОБЪЯСНЕНИЙ!
 
-ВЕРНИ ТОЛЬКО JSON!
-"""
\ No newline at end of file
+[
+    {
+        "id": 12,
+        "priority_score": 7,
+        "tags": ["срочно", "блокирует работу"],
+        "summary": "Краткое резюме на русском",
+        "needs_clarification": false,
+        "clarification_questions": []
+    }
+]
+
+Ниже несколько заявок, каждая начинается со строки «ЗАЯВКА id=...».
+Проанализируй КАЖДУЮ заявку отдельно и верни по одному объекту на заявку.
+Поле "id" должно совпадать с id заявки.
+
+""" + ANALYSIS_CRITERIA.strip('\n') + """
+
+ВЕРНИ ТОЛЬКО JSON-МАССИВ!
+"""
+
+
+def prompt_version(*templates):
+    """Короткий хэш текстов шаблонов промптов"""
+    digest = hashlib.sha256()
+    for template in templates:
+        digest.update(template.encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()[:12]
+
+
+# Версия промптов: меняется при любом изменении критериев, одиночного или пакетного шаблона,
+# так как от каждого из них зависят результаты в кэше и в истории анализов
+PROMPT_TEMPLATES = (ANALYSIS_CRITERIA, REQUEST_ANALYSIS_PROMPT, BATCH_ANALYSIS_PROMPT)
+PROMPT_VERSION = prompt_version(*PROMPT_TEMPLATES)
@@ -0,0 +1,131 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, FloatField, Q, Window
+from django.db.models.functions import Cast, Lag, Rank
+from django.utils import timezone
+
+from ..models import Device, Repair
+
+REPAIR_DURATION = ExpressionWrapper(F('completed_at') - F('created_at'), output_field=DurationField())
+
+
+def repair_period_filter(filters, prefix=''):
+    """
+    Условие на дату начала ремонта; prefix — путь от модели выборки до Repair
+
+    Даты переводятся в границы суток, чтобы сравнение шло по самому
+    столбцу created_at и использовало индекс.
+    """
+    condition = Q()
+    if filters.get('date_from'):
+        condition &= Q(**{f'{prefix}created_at__gte': start_of_day(filters['date_from'])})
+    if filters.get('date_to'):
+        condition &= Q(**{f'{prefix}created_at__lt': start_of_day(filters['date_to'] + timedelta(days=1))})
+    return condition
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def repairs_queryset(filters):
+    repairs = Repair.objects.filter(repair_period_filter(filters))
+    if filters.get('device_type'):
+        repairs = repairs.filter(device__device_type_id=filters['device_type'])
+    return repairs
+
+
+def repair_summary(filters):
+    """Число ремонтов и среднее время ремонта (MTTR) одним агрегирующим запросом"""
+    summary = repairs_queryset(filters).aggregate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(status=Repair.STATUS_COMPLETED)),
+        active=Count('id', filter=Q(status=Repair.STATUS_REPAIRING)),
+        mttr=Avg(REPAIR_DURATION, filter=Q(status=Repair.STATUS_COMPLETED, completed_at__isnull=False)),
+    )
+    summary['mttr_hours'] = duration_hours(summary['mttr'])
+    return summary
+
+
+def duration_hours(value):
+    """Длительность в часах для вывода; None, если ремонтов не было"""
+    return value.total_seconds() / 3600 if value is not None else None
+
+
+def failure_rates(filters, group_by):
+    """
+    Частота поломок по группам оборудования с учётом размера парка
+
+    Группировка идёт по таблице оборудования, поэтому в знаменатель
+    попадают и устройства без ремонтов. failure_rate — ремонтов на одно
+    устройство группы, failed_share — доля устройств, ломавшихся хотя бы раз.
+
+    Args:
+        filters: Период и тип оборудования (см. views.parse_repair_filters)
+        group_by: Поля группировки, например ['device_type__name'] или ['device_type__name', 'model']
+
+    Returns:
+        QuerySet словарей, отсортированный по убыванию failure_rate, с местом группы (rank)
+    """
+    devices = Device.objects.all()
+    if filters.get('device_type'):
+        devices = devices.filter(device_type_id=filters['device_type'])
+
+    period = Q(repair__isnull=False) & repair_period_filter(filters, prefix='repair__')
+    completed = period & Q(repair__status=Repair.STATUS_COMPLETED, repair__completed_at__isnull=False)
+    failure_rate = ExpressionWrapper(
+        Cast(Count('repair', filter=period), FloatField()) / Count('id', distinct=True),
+        output_field=FloatField(),
+    )
+    return (
+        devices.values(*group_by)
+        .annotate(
+            fleet=Count('id', distinct=True),
+            repairs=Count('repair', filter=period),
+            failed_devices=Count('id', filter=period, distinct=True),
+            mttr=Avg(
+                ExpressionWrapper(F('repair__completed_at') - F('repair__created_at'), output_field=DurationField()),
+                filter=completed,
+            ),
+            failure_rate=failure_rate,
+            failed_share=ExpressionWrapper(
+                Cast(Count('id', filter=period, distinct=True), FloatField()) / Count('id', distinct=True),
+                output_field=FloatField(),
+            ),
+            rank=Window(Rank(), order_by=failure_rate.desc()),
+        )
+        .order_by('-failure_rate', *group_by)
+    )
+
+
+def repeat_failures(filters, within_days=30):
+    """
+    Повторные поломки: ремонт, начатый не позже within_days дней после
+    завершения предыдущего ремонта того же устройства
+
+    Предыдущий ремонт находится оконной функцией LAG по устройству, без
+    самосоединения таблицы ремонтов. Окно считается по всей истории
+    устройства (предыдущий ремонт может быть до начала периода), поэтому
+    период применяется снаружи, к уже найденным повторам.
+    """
+    repairs = Repair.objects.all()
+    if filters.get('device_type'):
+        repairs = repairs.filter(device__device_type_id=filters['device_type'])
+    if filters.get('date_to'):
+        repairs = repairs.filter(created_at__lt=start_of_day(filters['date_to'] + timedelta(days=1)))
+
+    repeats = repairs.annotate(
+        previous_completed_at=Window(
+            Lag('completed_at'),
+            partition_by=F('device_id'),
+            order_by=[F('created_at').asc(), F('id').asc()],
+        )
+    ).filter(
+        previous_completed_at__isnull=False,
+        created_at__lte=F('previous_completed_at') + timedelta(days=within_days),
+    )
+    return (
+        Repair.objects.filter(repair_period_filter(filters), id__in=repeats.values('id'))
+        .select_related('device__device_type')
+        .order_by('-created_at', '-id')
+    )
@@ -0,0 +1,109 @@
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import Device, EquipmentMovement, Request
+from .device_counters import apply_counter_deltas
+from .table_versions import bump_version
+
+DECISION_STATUSES = [Request.STATUS_APPROVED, Request.STATUS_REJECTED]
+
+
+@dataclass
+class DecisionResult:
+    """Итог массового решения: обработанные заявки и причины отказа по остальным"""
+    processed: list = field(default_factory=list)
+    conflicts: dict = field(default_factory=dict)
+
+    def message(self, new_status):
+        """Сообщение об обработанных заявках с названием статуса из Request.STATUS_CHOICES"""
+        return f'Заявок со статусом «{dict(Request.STATUS_CHOICES)[new_status]}»: {len(self.processed)}'
+
+
+def decide_requests(request_ids, new_status, batch_size=500):
+    """
+    Одобряет или отклоняет набор заявок в одной транзакции
+
+    В отличие от Request.save() заявки и оборудование меняются
+    множественными UPDATE, движения создаются bulk_create, поэтому число
+    запросов не зависит от размера набора. Обрабатываются только
+    рассматриваемые заявки; одобрение требует свободного оборудования, а из
+    нескольких заявок на одно устройство одобряется первая в очереди
+    (порядок manage_requests). Остальные попадают в conflicts, не мешая
+    обработке набора.
+
+    Сигналы post_save при этом не отправляются: счётчики оборудования и
+    версии таблиц для API обновляются здесь же.
+
+    Args:
+        request_ids: id заявок
+        new_status: Request.STATUS_APPROVED или Request.STATUS_REJECTED
+
+    Returns:
+        DecisionResult
+    """
+    if new_status not in DECISION_STATUSES:
+        raise ValueError(f'Недопустимый статус для массового решения: {new_status}')
+    request_ids = set(request_ids)
+    result = DecisionResult()
+
+    with transaction.atomic():
+        # Блокируем заявки и их оборудование, чтобы параллельные решения не выдали устройство дважды
+        rows = list(
+            Request.objects.select_for_update()
+            .filter(id__in=request_ids)
+            .order_by(Coalesce('ai_priority_score', 0).desc(), 'created_at', 'id')
+            .values_list('id', 'status', 'employee_id', 'device_id',
+                         'device__status', 'device__device_type_id', 'device__is_written_off')
+        )
+        for missing_id in sorted(request_ids - {row[0] for row in rows}):
+            result.conflicts[missing_id] = 'Заявка не найдена'
+
+        taken_devices = set()
+        accepted = []
+        for request_id, status, employee_id, device_id, device_status, device_type_id, written_off in rows:
+            if status != Request.STATUS_PENDING:
+                result.conflicts[request_id] = 'Заявка уже рассмотрена'
+                continue
+            if new_status == Request.STATUS_APPROVED:
+                if written_off or device_status != Device.STATUS_AVAILABLE:
+                    result.conflicts[request_id] = 'Оборудование недоступно'
+                    continue
+                if device_id in taken_devices:
+                    result.conflicts[request_id] = 'Оборудование выдаётся по другой заявке из набора'
+                    continue
+                taken_devices.add(device_id)
+            accepted.append((request_id, employee_id, device_id, device_type_id, written_off))
+
+        if not accepted:
+            return result
+        result.processed = [row[0] for row in accepted]
+
+        Request.objects.filter(id__in=result.processed).update(status=new_status, updated_at=timezone.now())
+        bump_version('request')
+
+        if new_status == Request.STATUS_APPROVED:
+            Device.objects.filter(id__in=taken_devices).update(status=Device.STATUS_IN_USE)
+            moved = Counter((device_type_id, written_off) for _, _, _, device_type_id, written_off in accepted)
+            deltas = {}
+            for (device_type_id, written_off), total in moved.items():
+                deltas[device_type_id, Device.STATUS_AVAILABLE, written_off] = -total
+                deltas[device_type_id, Device.STATUS_IN_USE, written_off] = total
+            apply_counter_deltas(deltas)
+
+            EquipmentMovement.objects.bulk_create([
+                EquipmentMovement(
+                    device_id=device_id,
+                    employee_id=employee_id,
+                    movement_type=EquipmentMovement.MOVEMENT_ISSUE,
+                    notes=f'Выдача по заявке #{request_id}',
+                )
+                for request_id, employee_id, device_id, _, _ in accepted
+            ], batch_size=batch_size)
+            bump_version('device')
+            bump_version('movement')
+
+    return result
@@ -0,0 +1,351 @@
+import random
+import time
+from datetime import timedelta
+
+import httpx
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from gigachat.exceptions import AuthenticationError, ResponseError
+
+
+class CircuitOpenError(Exception):
+    """
+    Выключатель разомкнут: вызов не выполняется; retry_after — когда будет пробный вызов, сек
+
+    outcomes — результаты, полученные до остановки анализа (заполняет GigaChatService).
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.outcomes = {}
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель вызовов внешнего API
+
+    Состояние хранится в таблице AICircuitBreaker, поэтому общее для всех
+    процессов. Если доля ошибок в окне AI_BREAKER_WINDOW секунд достигает
+    AI_BREAKER_FAILURE_RATE (при не менее AI_BREAKER_MIN_CALLS вызовах),
+    выключатель размыкается и вызовы сразу завершаются CircuitOpenError.
+    Через AI_BREAKER_RECOVERY_TIMEOUT секунд один вызов пропускается пробным:
+    успех замыкает выключатель, ошибка снова размыкает.
+
+    Окно открывается первой ошибкой: пока ошибок нет, успешные вызовы не
+    пишут в таблицу, и общая строка не становится узким местом воркеров.
+    """
+
+    def __init__(self, name='gigachat', failure_rate=None, min_calls=None, window=None, recovery_timeout=None):
+        self.name = name
+        self.failure_rate = failure_rate or settings.AI_BREAKER_FAILURE_RATE
+        self.min_calls = min_calls or settings.AI_BREAKER_MIN_CALLS
+        self.window = window or settings.AI_BREAKER_WINDOW
+        self.recovery_timeout = recovery_timeout or settings.AI_BREAKER_RECOVERY_TIMEOUT
+
+    def allow(self):
+        """Можно ли выполнить вызов сейчас"""
+        from ..models import AICircuitBreaker
+
+        state = self._get_state()
+        if state.state == AICircuitBreaker.STATE_CLOSED:
+            return True
+
+        # Разомкнут (или пробный вызов завис): по истечении паузы пропускаем
+        # ровно один пробный вызов — его получает тот, чей UPDATE сработал
+        if state.opened_at and timezone.now() - state.opened_at >= timedelta(seconds=self.recovery_timeout):
+            return AICircuitBreaker.objects.filter(
+                pk=state.pk, state=state.state, opened_at=state.opened_at
+            ).update(state=AICircuitBreaker.STATE_HALF_OPEN, opened_at=timezone.now()) == 1
+        return False
+
+    def retry_after(self):
+        """Сколько секунд до пробного вызова (0, если выключатель замкнут)"""
+        from ..models import AICircuitBreaker
+
+        state = self._read_state()
+        if state.state == AICircuitBreaker.STATE_CLOSED or state.opened_at is None:
+            return 0.0
+        elapsed = (timezone.now() - state.opened_at).total_seconds()
+        return max(0.0, self.recovery_timeout - elapsed)
+
+    def record_success(self):
+        from ..models import AICircuitBreaker
+
+        # Замкнут и ошибок в окне нет — записывать нечего
+        state = self._read_state()
+        if state.state == AICircuitBreaker.STATE_CLOSED and not state.window_failures:
+            return
+
+        with transaction.atomic():
+            state = self._get_state(for_update=True)
+            if state.state != AICircuitBreaker.STATE_CLOSED:
+                state.state = AICircuitBreaker.STATE_CLOSED
+                state.opened_at = None
+                self._reset_window(state)
+            else:
+                self._roll_window(state)
+            state.window_calls += 1
+            state.save()
+
+    def record_failure(self):
+        from ..models import AICircuitBreaker
+
+        with transaction.atomic():
+            state = self._get_state(for_update=True)
+            if state.state == AICircuitBreaker.STATE_HALF_OPEN:
+                state.state = AICircuitBreaker.STATE_OPEN
+                state.opened_at = timezone.now()
+            elif state.state == AICircuitBreaker.STATE_CLOSED:
+                if state.window_failures:
+                    self._roll_window(state)
+                else:
+                    # Успехи до первой ошибки не учитывались: окно начинается с неё
+                    self._reset_window(state)
+                state.window_calls += 1
+                state.window_failures += 1
+                if (state.window_calls >= self.min_calls
+                        and state.window_failures / state.window_calls >= self.failure_rate):
+                    state.state = AICircuitBreaker.STATE_OPEN
+                    state.opened_at = timezone.now()
+            state.save()
+
+    def reset(self):
+        """Принудительно замыкает выключатель"""
+        from ..models import AICircuitBreaker
+
+        with transaction.atomic():
+            state = self._get_state(for_update=True)
+            state.state = AICircuitBreaker.STATE_CLOSED
+            state.opened_at = None
+            self._reset_window(state)
+            state.save()
+
+    def snapshot(self):
+        """Состояние выключателя для мониторинга (только чтение)"""
+        state = self._read_state()
+        return {
+            'name': state.name,
+            'state': state.state,
+            'window_calls': state.window_calls,
+            'window_failures': state.window_failures,
+            'error_rate': state.window_failures / state.window_calls if state.window_calls else 0.0,
+            'opened_at': state.opened_at,
+            'updated_at': state.updated_at,
+        }
+
+    def _get_state(self, for_update=False):
+        from ..models import AICircuitBreaker
+
+        queryset = AICircuitBreaker.objects.select_for_update() if for_update else AICircuitBreaker.objects
+        state, _ = queryset.get_or_create(name=self.name, defaults={'window_started_at': timezone.now()})
+        return state
+
+    def _read_state(self):
+        """Состояние без записи в БД; до первого вызова — замкнутый выключатель по умолчанию"""
+        from ..models import AICircuitBreaker
+
+        return AICircuitBreaker.objects.filter(name=self.name).first() or AICircuitBreaker(name=self.name)
+
+    def _roll_window(self, state):
+        if state.window_started_at is None or (
+                timezone.now() - state.window_started_at >= timedelta(seconds=self.window)):
+            self._reset_window(state)
+
+    @staticmethod
+    def _reset_window(state):
+        state.window_started_at = timezone.now()
+        state.window_calls = 0
+        state.window_failures = 0
+
+
+class RateLimitExceeded(Exception):
+    """
+    Бюджет вызовов исчерпан; retry_after — через сколько секунд стоит повторить
+
+    outcomes — результаты, полученные до остановки анализа (заполняет GigaChatService).
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.outcomes = {}
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты вызовов внешнего API, общий для всех процессов
+
+    Состояние хранится в таблице AIRateLimit. Запросы выдаются из корзины
+    ёмкостью AI_RATE_LIMIT_BURST, пополняемой со скоростью AI_RATE_LIMIT_RPS
+    в секунду; расход токенов за сутки ограничен AI_RATE_LIMIT_TOKENS_PER_DAY.
+
+    Вызов с высоким приоритетом ждёт освобождения корзины не дольше
+    AI_RATE_LIMIT_MAX_WAIT секунд. Низкоприоритетному вызову (фоновый
+    переанализ) не достаётся последняя доля AI_RATE_LIMIT_LOW_PRIORITY_RESERVE
+    дневного бюджета: он откладывается, оставляя её новым заявкам.
+    """
+
+    PRIORITY_HIGH = 'high'
+    PRIORITY_LOW = 'low'
+
+    def __init__(self, name='gigachat', requests_per_second=None, burst=None, tokens_per_day=None,
+                 max_wait=None, low_priority_reserve=None):
+        self.name = name
+        self.requests_per_second = requests_per_second or settings.AI_RATE_LIMIT_RPS
+        self.burst = burst or settings.AI_RATE_LIMIT_BURST
+        self.tokens_per_day = settings.AI_RATE_LIMIT_TOKENS_PER_DAY if tokens_per_day is None else tokens_per_day
+        self.max_wait = settings.AI_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        self.low_priority_reserve = (
+            settings.AI_RATE_LIMIT_LOW_PRIORITY_RESERVE if low_priority_reserve is None else low_priority_reserve
+        )
+
+    def acquire(self, tokens=0, priority=PRIORITY_HIGH):
+        """
+        Резервирует один запрос и оценку токенов, при необходимости ожидая
+
+        Raises:
+            RateLimitExceeded: дневной бюджет исчерпан или ожидание дольше допустимого
+        """
+        started = time.monotonic()
+        while True:
+            with transaction.atomic():
+                state = self._get_state(for_update=True)
+                self._refill(state)
+
+                limit = self._day_limit(priority)
+                if limit is not None and state.day_tokens + tokens > limit:
+                    raise RateLimitExceeded('Дневной бюджет токенов исчерпан', self._seconds_until_tomorrow())
+
+                if state.available_requests >= 1:
+                    state.available_requests -= 1
+                    state.day_tokens += tokens
+                    state.save()
+                    return
+
+                wait = (1 - state.available_requests) / self.requests_per_second
+
+            # Ждём вне транзакции, чтобы не держать блокировку строки
+            if time.monotonic() - started + wait > self.max_wait:
+                raise RateLimitExceeded('Превышена частота запросов', wait)
+            time.sleep(wait)
+
+    def record_tokens(self, tokens):
+        """Учитывает фактический расход токенов сверх зарезервированного (может быть отрицательным)"""
+        if not tokens:
+            return
+        with transaction.atomic():
+            state = self._get_state(for_update=True)
+            self._refill(state)
+            state.day_tokens = max(0, state.day_tokens + tokens)
+            state.save()
+
+    def snapshot(self):
+        """Остаток бюджета для мониторинга (только чтение: пополнение считается в памяти)"""
+        from ..models import AIRateLimit
+
+        state = AIRateLimit.objects.filter(name=self.name).first() or AIRateLimit(name=self.name)
+        self._refill(state)
+        return {
+            'name': state.name,
+            'available_requests': state.available_requests,
+            'burst': self.burst,
+            'requests_per_second': self.requests_per_second,
+            'day': state.day,
+            'day_tokens': state.day_tokens,
+            'tokens_per_day': self.tokens_per_day or None,
+            'tokens_left': max(0, self.tokens_per_day - state.day_tokens) if self.tokens_per_day else None,
+        }
+
+    def _day_limit(self, priority):
+        if not self.tokens_per_day:
+            return None
+        if priority == self.PRIORITY_LOW:
+            return self.tokens_per_day * (1 - self.low_priority_reserve)
+        return self.tokens_per_day
+
+    def _refill(self, state):
+        now = timezone.now()
+        if state.refilled_at is None:
+            state.available_requests = self.burst
+        else:
+            elapsed = (now - state.refilled_at).total_seconds()
+            state.available_requests = min(self.burst, state.available_requests + elapsed * self.requests_per_second)
+        state.refilled_at = now
+
+        today = timezone.localdate(now)
+        if state.day != today:
+            state.day = today
+            state.day_tokens = 0
+
+    def _get_state(self, for_update=False):
+        from ..models import AIRateLimit
+
+        queryset = AIRateLimit.objects.select_for_update() if for_update else AIRateLimit.objects
+        state, _ = queryset.get_or_create(name=self.name)
+        return state
+
+    @staticmethod
+    def _seconds_until_tomorrow():
+        now = timezone.localtime()
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (tomorrow - now).total_seconds()
+
+
+def is_retryable(error):
+    """Временная ли ошибка: сеть, таймаут, 429 или 5xx от API"""
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+        return True
+    if isinstance(error, ResponseError) and not isinstance(error, AuthenticationError):
+        status_code = error.args[1] if len(error.args) > 1 else None
+        return status_code == 429 or (isinstance(status_code, int) and status_code >= 500)
+    return False
+
+
+def call_with_retry(func, breaker=None, max_retries=None, backoff_base=None, backoff_max=None, deadline=None,
+                    timeout=None):
+    """
+    Выполняет func с повторами при временных ошибках
+
+    func получает таймаут попытки: timeout, но не больше остатка общего
+    бюджета времени deadline. Пауза перед повтором — случайная в пределах
+    экспоненциально растущего окна (full jitter). Повтор не начинается,
+    если пауза и полный таймаут попытки не укладываются в остаток deadline.
+
+    Raises:
+        CircuitOpenError: выключатель разомкнут
+        Exception: последняя ошибка func
+    """
+    max_retries = settings.GIGACHAT_MAX_RETRIES if max_retries is None else max_retries
+    backoff_base = backoff_base or settings.GIGACHAT_BACKOFF_BASE
+    backoff_max = backoff_max or settings.GIGACHAT_BACKOFF_MAX
+    deadline = deadline or settings.GIGACHAT_DEADLINE
+    timeout = timeout or settings.GIGACHAT_TIMEOUT
+
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(f'Выключатель {breaker.name} разомкнут', breaker.retry_after())
+
+        try:
+            result = func(min(timeout, deadline - (time.monotonic() - started)))
+        except Exception as e:
+            retryable = is_retryable(e)
+            if breaker is not None and retryable:
+                breaker.record_failure()
+
+            attempt += 1
+            if not retryable or attempt > max_retries:
+                raise
+
+            delay = random.uniform(0, min(backoff_max, backoff_base * 2 ** (attempt - 1)))
+            if time.monotonic() - started + delay + timeout > deadline:
+                raise
+            time.sleep(delay)
+            continue
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -0,0 +1,286 @@
+import json
+import re
+
+from .prompts import ANALYSIS_TAGS
+
+_CLOSERS = {'{': '}', '[': ']'}
+_LITERALS = {'true': 'true', 'false': 'false', 'null': 'null', 'True': 'true', 'False': 'false', 'None': 'null'}
+_TRUE_STRINGS = {'true', 'да', 'yes', '1'}
+_WORD = re.compile(r'[\w-]+')
+
+
+# Какое значение ищется в ответе: объект (анализ одной заявки)
+# или объект либо массив объектов (пакетный анализ)
+EXPECT_OBJECT = 'object'
+EXPECT_OBJECTS = 'objects'
+
+
+class JsonExtractor:
+    """
+    Инкрементальный поиск первого подходящего JSON-значения в потоке
+
+    Текст до первой «{» или «[» (пояснения модели, ```json) пропускается.
+    Если задан expect, закрывшееся значение, которое не разбирается или
+    имеет другой тип (например, «[1-10]» в «Оценка [1-10]: {...}»),
+    отбрасывается и поиск продолжается со следующего символа.
+    feed() возвращает True, только когда подходящее значение разобрано, —
+    дальше ответ можно не читать. Строками считаются только двойные
+    кавычки: апостроф в пояснении не должен «открывать» строку.
+    """
+
+    def __init__(self, expect=None):
+        self.expect = expect
+        self._openers = '{' if expect == EXPECT_OBJECT else '{['
+        self._parts = []
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self.complete = False
+        self.value = None
+        self.repaired = False
+
+    def feed(self, text):
+        if self.complete:
+            return True
+
+        while text:
+            if not self._stack:
+                starts = [position for position in map(text.find, self._openers) if position != -1]
+                if not starts:
+                    return False
+                text = text[min(starts):]
+
+            for index, char in enumerate(text):
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif char == '\\':
+                        self._escape = True
+                    elif char == '"':
+                        self._in_string = False
+                elif char == '"':
+                    self._in_string = True
+                elif char in _CLOSERS:
+                    self._stack.append(char)
+                elif char in '}]' and self._stack:
+                    self._stack.pop()
+                    if self._stack:
+                        continue
+                    candidate = ''.join(self._parts) + text[:index + 1]
+                    self._parts = []
+                    if self._accept(candidate):
+                        self._parts.append(candidate)
+                        self.complete = True
+                        return True
+                    text = candidate[1:] + text[index + 1:]
+                    break
+            else:
+                self._parts.append(text)
+                return False
+        return False
+
+    @property
+    def text(self):
+        """Текст найденного значения (при обрыве потока — последнего незакрытого)"""
+        return ''.join(self._parts)
+
+    def _accept(self, candidate):
+        try:
+            value, repaired = json.loads(candidate), False
+        except ValueError:
+            try:
+                value, repaired = json.loads(repair_json(candidate)), True
+            except ValueError:
+                return False
+        if not _is_expected(value, self.expect):
+            return False
+        self.value, self.repaired = value, repaired
+        return True
+
+
+def _is_expected(value, expect):
+    if expect == EXPECT_OBJECT:
+        return isinstance(value, dict)
+    if expect == EXPECT_OBJECTS:
+        return isinstance(value, dict) or (
+            isinstance(value, list) and all(isinstance(item, dict) for item in value)
+        )
+    return True
+
+
+def extract_json(text, expect=None):
+    """Первое подходящее JSON-значение в тексте ответа без разбора"""
+    extractor = JsonExtractor(expect)
+    extractor.feed(text)
+    return extractor.text
+
+
+def repair_json(text):
+    """
+    Исправляет типичные дефекты JSON в ответах модели
+
+    Одинарные кавычки и ключи без кавычек, неэкранированные кавычки и
+    переводы строк внутри строк, литералы Python, комментарии, висячие
+    запятые, незакрытые строки и скобки (оборванный ответ).
+    """
+    out = []
+    stack = []
+    index, length = 0, len(text)
+
+    while index < length:
+        char = text[index]
+
+        if char in '"\'':
+            string, index = _read_string(text, index)
+            out.append(string)
+            continue
+
+        if text.startswith('//', index):
+            newline = text.find('\n', index)
+            index = length if newline == -1 else newline
+            continue
+        if text.startswith('/*', index):
+            end = text.find('*/', index + 2)
+            index = length if end == -1 else end + 2
+            continue
+
+        if char in _CLOSERS:
+            stack.append(char)
+            out.append(char)
+        elif char in '}]':
+            if stack:
+                _drop_trailing_comma(out)
+                out.append(_CLOSERS[stack.pop()])
+        elif char.isalpha() or char == '_':
+            match = _WORD.match(text, index)
+            word = match.group()
+            index = match.end()
+            if word in _LITERALS:
+                out.append(_LITERALS[word])
+            else:
+                out.append(json.dumps(word, ensure_ascii=False))
+            continue
+        else:
+            out.append(char)
+        index += 1
+
+    _drop_trailing_comma(out)
+    if ''.join(out).rstrip().endswith(':'):
+        out.append('null')
+    while stack:
+        out.append(_CLOSERS[stack.pop()])
+    return ''.join(out)
+
+
+def _read_string(text, index):
+    """Читает строку в любых кавычках, возвращает её в виде JSON и позицию после неё"""
+    quote = text[index]
+    index += 1
+    chars = []
+    while index < len(text):
+        char = text[index]
+        if char == '\\' and index + 1 < len(text):
+            escaped = text[index + 1]
+            chars.append("'" if escaped == "'" else char + escaped)
+            index += 2
+            continue
+        # Кавычка закрывает строку, только если за ней идёт разделитель
+        if char == quote and re.match(r'\s*(?:[,:}\]]|$)', text[index + 1:]):
+            return '"' + ''.join(chars) + '"', index + 1
+        if char == '"':
+            chars.append('\\"')
+        elif char == '\n':
+            chars.append('\\n')
+        elif char == '\t':
+            chars.append('\\t')
+        else:
+            chars.append(char)
+        index += 1
+    return '"' + ''.join(chars) + '"', index
+
+
+def _drop_trailing_comma(out):
+    position = len(out) - 1
+    while position >= 0 and out[position].isspace():
+        position -= 1
+    if position >= 0 and out[position] == ',':
+        del out[position]
+
+
+def parse_json(text, expect=None):
+    """
+    Разбирает первое подходящее JSON-значение в ответе модели, при необходимости исправляя его
+
+    Args:
+        expect: EXPECT_OBJECT, EXPECT_OBJECTS или None (любое значение)
+
+    Returns:
+        tuple: (значение, было ли исправление)
+
+    Raises:
+        ValueError: Если JSON не найден или не поддаётся исправлению
+    """
+    extractor = JsonExtractor(expect)
+    extractor.feed(text)
+    if extractor.complete:
+        return extractor.value, extractor.repaired
+
+    # Оборванный ответ: дописываем незакрытые строки и скобки
+    candidate = extractor.text
+    if not candidate:
+        raise ValueError('В ответе нет JSON')
+    return json.loads(repair_json(candidate)), True
+
+
+def normalize_analysis(data):
+    """
+    Проверяет результат анализа по схеме и приводит его к ней
+
+    priority_score — целое 1–10 (строки и дроби приводятся, выход за
+    диапазон обрезается), tags — только известные теги, needs_clarification —
+    bool, clarification_questions — список строк. Поле id (пакетный ответ)
+    сохраняется.
+
+    Raises:
+        ValueError: Если это не объект или в нём нет оценки приоритета
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Ожидался JSON-объект')
+
+    score = data.get('priority_score')
+    if isinstance(score, str):
+        match = re.search(r'\d+(?:[.,]\d+)?', score)
+        score = float(match.group().replace(',', '.')) if match else None
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        raise ValueError('Нет оценки приоритета')
+
+    tags = data.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    known_tags = []
+    for tag in tags:
+        tag = str(tag).strip().strip('"\'').lower().replace('ё', 'е')
+        if tag in _KNOWN_TAGS and _KNOWN_TAGS[tag] not in known_tags:
+            known_tags.append(_KNOWN_TAGS[tag])
+
+    questions = data.get('clarification_questions') or []
+    if isinstance(questions, str):
+        questions = [questions]
+
+    needs_clarification = data.get('needs_clarification', False)
+    if isinstance(needs_clarification, str):
+        needs_clarification = needs_clarification.strip().lower() in _TRUE_STRINGS
+
+    result = {
+        'priority_score': min(10, max(1, int(round(score)))),
+        'tags': known_tags,
+        'summary': str(data.get('summary') or '').strip(),
+        'needs_clarification': bool(needs_clarification),
+        'clarification_questions': [str(question) for question in questions if question],
+    }
+    if 'id' in data:
+        result = {'id': data['id'], **result}
+    return result
+
+
+_KNOWN_TAGS = {tag.lower().replace('ё', 'е'): tag for tag in ANALYSIS_TAGS}
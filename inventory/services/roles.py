@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import UserProfile
+
+SESSION_KEY = '_inventory_role'
+
+
+def role_changed_key(user_id):
+    return f'inventory:role-changed:{user_id}'
+
+
+def get_user_role(request):
+    """
+    Роль текущего пользователя с кэшированием
+
+    Роль ищется последовательно: в атрибуте запроса (повторные проверки в
+    пределах одного запроса), в сессии и только затем в БД. Запись в
+    сессии устаревает, если после неё профиль менялся (метка в общем кэше
+    Django от сигнала UserProfile, см. проверку inventory.E001) или прошло
+    USER_ROLE_CACHE_TTL секунд.
+
+    Returns:
+        str: Роль из UserProfile.ROLE_CHOICES или None для анонимного пользователя
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
+
+    role = getattr(request, '_inventory_role', None)
+    if role is not None:
+        return role
+
+    cached = request.session.get(SESSION_KEY)
+    if cached and cached['user'] == user.pk and is_fresh(cached):
+        role = cached['role']
+    else:
+        role = resolve_role(user)
+        remember_role(request, role)
+
+    request._inventory_role = role
+    return role
+
+
+def is_fresh(cached):
+    resolved_at = cached['resolved_at']
+    if time.time() - resolved_at > settings.USER_ROLE_CACHE_TTL:
+        return False
+    changed_at = cache.get(role_changed_key(cached['user']))
+    return changed_at is None or changed_at < resolved_at
+
+
+def resolve_role(user):
+    """Роль из БД; пользователю без профиля создаётся профиль сотрудника"""
+    profile, _ = UserProfile.objects.get_or_create(user=user, defaults={'role': UserProfile.ROLE_EMPLOYEE})
+    return profile.role
+
+
+def remember_role(request, role):
+    request.session[SESSION_KEY] = {'user': request.user.pk, 'role': role, 'resolved_at': time.time()}
+    request._inventory_role = role
+
+
+def invalidate_role(user_id):
+    """Помечает закэшированные в сессиях роли пользователя устаревшими"""
+    cache.set(role_changed_key(user_id), time.time(), settings.USER_ROLE_CACHE_TTL)
@@ -0,0 +1,164 @@
+import re
+from dataclasses import dataclass
+
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+
+from ..models import Device, Employee, Request
+
+SEARCH_CONFIG = 'russian'
+# Порядок определяет код типа в rowid таблицы FTS5 (см. миграцию 0020_search_indexes)
+SEARCH_KINDS = ('device', 'employee', 'request')
+MIN_QUERY_LENGTH = 2
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    id: int
+    rank: float
+    title: str = ''
+    subtitle: str = ''
+
+
+def search(query, kinds=SEARCH_KINDS, page=1, page_size=20, include_private=False):
+    """
+    Глобальный поиск по оборудованию, сотрудникам и заявкам
+
+    В PostgreSQL — полнотекстовый поиск (tsvector, конфигурация russian)
+    и подстроки через индексы pg_trgm (часть инвентарного номера, слово
+    с опечаткой в окончании); в SQLite — таблица FTS5, которую
+    поддерживают триггеры. Индексы создают миграции 0020_search_indexes
+    и 0022_search_fallback_indexes.
+
+    Args:
+        include_private: Искать и показывать email сотрудников (только администратору)
+
+    Returns:
+        tuple: (список SearchHit по убыванию релевантности, есть ли следующая страница)
+    """
+    query = query.strip()
+    kinds = [kind for kind in SEARCH_KINDS if kind in kinds]
+    if len(query) < MIN_QUERY_LENGTH or not kinds:
+        return [], False
+
+    offset = (page - 1) * page_size
+    # Лишняя строка показывает, есть ли следующая страница, без COUNT по всем совпадениям
+    if connection.vendor == 'postgresql':
+        rows = postgres_matches(query, kinds, offset, page_size + 1, include_private)
+    else:
+        rows = sqlite_matches(query, kinds, offset, page_size + 1, include_private)
+
+    hits = [SearchHit(kind=kind, id=object_id, rank=rank) for kind, object_id, rank in rows[:page_size]]
+    describe_hits(hits, include_private)
+    return hits, len(rows) > page_size
+
+
+def postgres_matches(query, kinds, offset, limit, include_private=False):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    # Выражения совпадают с индексами миграции 0020_search_indexes, иначе индексы не применятся
+    sources = {
+        'device': (
+            Device.objects.all(),
+            SearchVector('inventory_number', 'model', config=SEARCH_CONFIG),
+            Q(inventory_number__icontains=query) | Q(model__icontains=query),
+            When(inventory_number__iexact=query, then=Value(1.0)),
+        ),
+        'employee': (
+            Employee.objects.all(),
+            SearchVector('full_name', 'email', config=SEARCH_CONFIG),
+            Q(full_name__icontains=query) | Q(email__icontains=query),
+            When(email__iexact=query, then=Value(1.0)),
+        ) if include_private else (
+            Employee.objects.all(),
+            SearchVector('full_name', config=SEARCH_CONFIG),
+            Q(full_name__icontains=query),
+            None,
+        ),
+        'request': (
+            Request.objects.all(),
+            SearchVector('purpose', 'ai_summary', config=SEARCH_CONFIG),
+            Q(purpose__icontains=query) | Q(ai_summary__icontains=query)
+            | Q(device__inventory_number__icontains=query),
+            When(device__inventory_number__iexact=query, then=Value(1.0)),
+        ),
+    }
+
+    querysets = []
+    for kind in kinds:
+        queryset, vector, substring, exact_match = sources[kind]
+        rank = SearchRank(vector, search_query)
+        if exact_match is not None:
+            # Точное совпадение идентификатора — выше любых текстовых совпадений
+            rank = rank + Case(exact_match, default=Value(0.0), output_field=FloatField())
+        matches = queryset.annotate(document=vector).filter(Q(document=search_query) | substring)
+        querysets.append(
+            matches.annotate(kind=Value(kind), rank=rank).values_list('kind', 'id', 'rank')
+        )
+
+    combined = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+    return list(combined.order_by('-rank', 'kind', 'id')[offset:offset + limit])
+
+
+def sqlite_matches(query, kinds, offset, limit, include_private=False):
+    tokens = re.findall(r'\w+', query)
+    if not tokens:
+        return []
+    # Каждое слово — префиксный поиск; кавычки внутри слова удваиваются по правилам FTS5.
+    # Без include_private ищем только в столбце content: email лежит в private
+    column = '' if include_private else 'content : '
+    match = ' '.join('{}"{}"*'.format(column, token.replace('"', '""')) for token in tokens)
+    kind_codes = [SEARCH_KINDS.index(kind) for kind in kinds]
+    placeholders = ', '.join(['%s'] * len(kind_codes))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid, bm25(inventory_search) AS score FROM inventory_search '
+            f'WHERE inventory_search MATCH %s AND rowid %% {len(SEARCH_KINDS)} IN ({placeholders}) '
+            'ORDER BY score, rowid LIMIT %s OFFSET %s',
+            [match, *kind_codes, limit, offset],
+        )
+        rows = cursor.fetchall()
+    # bm25 тем меньше, чем совпадение лучше
+    return [
+        (SEARCH_KINDS[rowid % len(SEARCH_KINDS)], rowid // len(SEARCH_KINDS), -score)
+        for rowid, score in rows
+    ]
+
+
+def describe_hits(hits, include_private=False):
+    """Заголовки результатов: один запрос на тип; email сотрудника — только с include_private"""
+    ids = {kind: [hit.id for hit in hits if hit.kind == kind] for kind in SEARCH_KINDS}
+    objects = {
+        'device': Device.objects.select_related('device_type').in_bulk(ids['device']) if ids['device'] else {},
+        'employee': Employee.objects.in_bulk(ids['employee']) if ids['employee'] else {},
+        'request': Request.objects.select_related('employee', 'device').in_bulk(ids['request']) if ids['request'] else {},
+    }
+    for hit in hits:
+        obj = objects[hit.kind].get(hit.id)
+        if obj is None:
+            continue
+        if hit.kind == 'device':
+            hit.title, hit.subtitle = f'{obj.model} ({obj.inventory_number})', obj.device_type.name
+        elif hit.kind == 'employee':
+            hit.title, hit.subtitle = obj.full_name, obj.email if include_private else obj.position
+        else:
+            hit.title = f'Заявка #{obj.id}: {obj.device.model}'
+            hit.subtitle = obj.ai_summary or obj.purpose[:200]
+
+
+def typeahead_devices(prefix, limit=10):
+    """
+    Подсказки по началу инвентарного номера
+
+    В PostgreSQL istartswith использует индекс UPPER(inventory_number) text_pattern_ops.
+    """
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    return list(
+        Device.objects.filter(inventory_number__istartswith=prefix)
+        .order_by('inventory_number')
+        .values('id', 'inventory_number', 'model')[:limit]
+    )
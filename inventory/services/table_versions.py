@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import Device, DeviceType, Employee, EquipmentMovement, Extension, Repair, Request, TableVersion
+
+# Таблицы, изменения которых видны в JSON API
+TRACKED_MODELS = {
+    'device': Device,
+    'devicetype': DeviceType,
+    'employee': Employee,
+    'request': Request,
+    'extension': Extension,
+    'repair': Repair,
+    'movement': EquipmentMovement,
+}
+
+
+def table_name(model):
+    for name, tracked in TRACKED_MODELS.items():
+        if tracked is model:
+            return name
+    return None
+
+
+def bump_version(name):
+    """
+    Увеличивает версию таблицы после фиксации транзакции
+
+    После отката версия не меняется; между фиксацией и увеличением клиент
+    может получить новые данные со старым ETag — это лишь лишний ответ 200
+    при следующем опросе, а не устаревший кэш.
+    """
+    transaction.on_commit(lambda: increment(name))
+
+
+def increment(name):
+    updated = TableVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now())
+    if not updated:
+        TableVersion.objects.get_or_create(name=name, defaults={'version': 1})
+
+
+def get_versions(names):
+    """
+    Версии таблиц одним запросом
+
+    Returns:
+        dict: имя → (версия, время изменения или None)
+    """
+    found = {
+        version.name: (version.version, version.updated_at)
+        for version in TableVersion.objects.filter(name__in=names)
+    }
+    return {name: found.get(name, (0, None)) for name in names}
@@ -0,0 +1,36 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Device, UserProfile
+from .services.device_counters import counter_key, shift_counters
+from .services.roles import invalidate_role
+from .services.table_versions import TRACKED_MODELS, bump_version, table_name
+
+
+@receiver(post_save, sender=User)
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    """Профиль сотрудника создаётся вместе с пользователем"""
+    if created and not raw:
+        UserProfile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def reset_cached_role(sender, instance, **kwargs):
+    invalidate_role(instance.user_id)
+
+
+@receiver(post_delete, sender=Device)
+def decrement_device_counter(sender, instance, **kwargs):
+    """Срабатывает и при удалении через QuerySet.delete(), в отличие от Device.delete()"""
+    shift_counters(counter_key(instance), None)
+
+
+def bump_table_version(sender, **kwargs):
+    bump_version(table_name(sender))
+
+
+for model in TRACKED_MODELS.values():
+    post_save.connect(bump_table_version, sender=model, dispatch_uid=f'table-version-save-{model.__name__}')
+    post_delete.connect(bump_table_version, sender=model, dispatch_uid=f'table-version-delete-{model.__name__}')
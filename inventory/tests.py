@@ -1,3 +1,1531 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import httpx
+from gigachat.exceptions import ResponseError
+
+from .checks import check_shared_cache
+from .management.commands.run_ai_workers import Command as RunAIWorkersCommand
+from .models import (
+    AIAnalysis, AIAnalysisCacheEntry, AIAnalysisJob, AICircuitBreaker, AIRateLimit, Device, DeviceType, Employee,
+    EquipmentMovement, Repair, Request, TableVersion, UserProfile,
+)
+from .services.ai_cache import AnalysisCache, make_cache_key
+from .services.ai_metrics import start_metrics_server
+from .services.ai_queue import StaleJobSweeper, claim_jobs, process_jobs, run_pending_jobs
+from .services.device_counters import device_stats, rebuild_counters
+from .services.device_import import DeviceImportError, import_devices
+from .services.movement_export import xlsx_chunks
+from .services.resilience import CircuitBreaker, CircuitOpenError, RateLimitExceeded, call_with_retry, is_retryable
+from .services.repair_analytics import failure_rates, repair_summary, repeat_failures
+from .services.request_decisions import decide_requests
+from .services.gigachat_client import GigaChatClientManager, check_sdk_version
+from .services.ai_analysis import analyze_requests, save_analysis_results, save_fallback_results, set_analysis_fields
+from .services.gigachat_service import AnalysisOutcome, GigaChatService
+from .services.local_classifier import LocalClassifier, RuleClassifier, train_model
+from .services.near_duplicates import find_duplicate, jaccard
+from .services.response_parser import EXPECT_OBJECT, EXPECT_OBJECTS, JsonExtractor, parse_json
+from .services.prompts import (
+    ANALYSIS_CRITERIA, BATCH_ANALYSIS_PROMPT, PROMPT_VERSION, REQUEST_ANALYSIS_PROMPT, prompt_version,
+)
+from .views import DEVICE_PAGE_SIZE, SEARCH_PAGE_SIZE
+
+
+class DeviceListQueryCountTests(TestCase):
+    """Страница инвентаря выполняет фиксированное число запросов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='employee', password='password')
+        UserProfile.objects.filter(user=cls.user).update(role=UserProfile.ROLE_EMPLOYEE)
+        cls.employee = Employee.objects.create(
+            full_name='Иванов Иван', position='Разработчик', email='employee@company.ru', user=cls.user
+        )
+        cls.device_type = DeviceType.objects.create(name='Ноутбук')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_devices(self, count):
+        for index in range(Device.objects.count(), Device.objects.count() + count):
+            device = Device.objects.create(
+                inventory_number=f'NB{index:04d}', model='Lenovo', device_type=self.device_type
+            )
+            if index % 2:
+                Request.objects.create(employee=self.employee, device=device, purpose='')
+
+    def test_query_count_does_not_grow_with_devices(self):
+        self.create_devices(3)
+        # Первый запрос сессии определяет роль и сохраняет её в сессии
+        self.client.get(reverse('device_list'))
+        with self.assertNumQueries(8):
+            self.client.get(reverse('device_list'))
+
+        self.create_devices(30)
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('device_list'))
+
+        self.assertEqual(response.context['stats'], {'total': 33, 'available': 33, 'in_use': 0})
+
+    def test_pending_request_disables_create_button(self):
+        self.create_devices(2)
+        response = self.client.get(reverse('device_list'))
+
+        self.assertContains(response, 'Есть активная заявка', count=1)
+        self.assertContains(response, reverse('create_request', args=[Device.objects.get(inventory_number='NB0000').id]))
+
+
+class DeviceListPaginationTests(TestCase):
+    """Постраничный вывод инвентаря по курсору"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='tech', password='password')
+        UserProfile.objects.filter(user=cls.user).update(role=UserProfile.ROLE_TECH)
+        cls.owner = Employee.objects.create(full_name='Петров Пётр', position='Бухгалтер', email='owner@company.ru')
+        laptops = DeviceType.objects.create(name='Ноутбук')
+        monitors = DeviceType.objects.create(name='Монитор')
+        statuses = [Device.STATUS_AVAILABLE, Device.STATUS_IN_USE, Device.STATUS_BROKEN]
+        Device.objects.bulk_create([
+            Device(
+                inventory_number=f'INV{index:04d}',
+                model='Model',
+                device_type=laptops if index % 2 else monitors,
+                status=statuses[index % 3],
+                responsible_person=cls.owner if index % 5 == 0 else None,
+                is_written_off=index % 7 == 0,
+            )
+            for index in range(DEVICE_PAGE_SIZE * 2 + 10)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def walk(self, params):
+        ids, pages = [], []
+        response = self.client.get(reverse('device_list'), params)
+        while True:
+            page_ids = [device.id for device in response.context['devices']]
+            ids += page_ids
+            pages.append(response)
+            if 'next' not in response.context['page_links']:
+                return ids, pages
+            response = self.client.get(reverse('device_list') + '?' + response.context['page_links']['next'])
+
+    def test_pages_cover_all_devices_in_order(self):
+        for sort, ordering in (('status', ('status', 'device_type_id', 'id')), ('number', ('inventory_number',))):
+            ids, pages = self.walk({'sort': sort})
+            self.assertEqual(ids, list(Device.objects.order_by(*ordering).values_list('id', flat=True)))
+            self.assertEqual(len(pages), 3)
+
+    def test_previous_page_returns_same_devices(self):
+        ids, pages = self.walk({'sort': 'type'})
+        response = self.client.get(reverse('device_list') + '?' + pages[2].context['page_links']['previous'])
+        self.assertEqual(
+            [device.id for device in response.context['devices']],
+            [device.id for device in pages[1].context['devices']],
+        )
+
+    def test_filters(self):
+        ids, _ = self.walk({'status': Device.STATUS_BROKEN, 'responsible': self.owner.id, 'written_off': '0'})
+        expected = Device.objects.filter(
+            status=Device.STATUS_BROKEN, responsible_person=self.owner, is_written_off=False
+        )
+        self.assertEqual(sorted(ids), sorted(expected.values_list('id', flat=True)))
+
+    def test_tampered_cursor_starts_from_first_page(self):
+        first = self.client.get(reverse('device_list'))
+        response = self.client.get(reverse('device_list'), {'cursor': 'garbage'})
+        self.assertEqual(list(response.context['devices']), list(first.context['devices']))
+
+
+class ManageRequestsQueryCountTests(TestCase):
+    """Очередь заявок администратора выполняет фиксированное число запросов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', password='password')
+        UserProfile.objects.filter(user=cls.user).update(role=UserProfile.ROLE_ADMIN)
+        cls.device_type = DeviceType.objects.create(name='Ноутбук')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_requests(self, count):
+        start = Request.objects.count()
+        for index in range(start, start + count):
+            employee = Employee.objects.create(
+                full_name=f'Сотрудник {index}', position='Инженер', email=f'user{index}@company.ru'
+            )
+            device = Device.objects.create(
+                inventory_number=f'NB{index:04d}', model='Lenovo', device_type=self.device_type
+            )
+            status = Request.STATUS_APPROVED if index % 2 else Request.STATUS_PENDING
+            Request.objects.create(
+                employee=employee, device=device, status=status, purpose='', ai_priority_score=index % 10 or None
+            )
+            if status == Request.STATUS_APPROVED and index % 4 == 1:
+                Repair.objects.create(device=device, reported_by=employee, description=f'Поломка {index}')
+
+    def test_query_count_does_not_grow_with_requests(self):
+        self.create_requests(4)
+        self.client.get(reverse('manage_requests'))
+        with self.assertNumQueries(5):
+            self.client.get(reverse('manage_requests'))
+
+        self.create_requests(40)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('manage_requests'))
+
+        self.assertContains(response, 'Оборудование в ремонте', count=11)
+
+    def test_pending_requests_ordered_by_priority(self):
+        self.create_requests(12)
+        response = self.client.get(reverse('manage_requests'))
+
+        scores = [req.ai_priority_score for req in response.context['pending_requests']]
+        self.assertEqual(scores, sorted(filter(None, scores), reverse=True) + [None] * scores.count(None))
+
+
+class RoleResolutionTests(TestCase):
+    """Определение роли пользователя с кэшированием в сессии"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='password')
+        self.profile = self.user.userprofile
+        self.profile.role = UserProfile.ROLE_ADMIN
+        self.profile.save()
+        self.client.force_login(self.user)
+
+    def test_profile_created_with_user(self):
+        user = User.objects.create_user(username='newcomer', password='password')
+        self.assertEqual(UserProfile.objects.get(user=user).role, UserProfile.ROLE_EMPLOYEE)
+
+    def test_role_cached_in_session(self):
+        self.client.get(reverse('manage_requests'))
+        UserProfile.objects.filter(user=self.user).update(role=UserProfile.ROLE_TECH)
+        # update() не отправляет сигналов — роль берётся из сессии
+        self.assertEqual(self.client.get(reverse('manage_requests')).status_code, 200)
+
+    def test_profile_change_resets_cached_role(self):
+        self.assertEqual(self.client.get(reverse('manage_requests')).status_code, 200)
+
+        self.profile.role = UserProfile.ROLE_TECH
+        self.profile.save()
+
+        self.assertEqual(self.client.get(reverse('manage_requests')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('repair_list')).status_code, 200)
+
+    def test_shared_cache_required_in_production(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['inventory.E001'])
+        redis_cache = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                   'LOCATION': 'redis://localhost:6379/0'}}
+        with override_settings(CACHES=redis_cache):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class DeviceStatusCounterTests(TestCase):
+    """Счётчики оборудования следуют за изменениями статусов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = Employee.objects.create(full_name='Иванов Иван', position='Разработчик', email='ivanov@company.ru')
+        cls.device_type = DeviceType.objects.create(name='Ноутбук')
+
+    def create_device(self, number, **fields):
+        return Device.objects.create(inventory_number=number, model='Lenovo', device_type=self.device_type, **fields)
+
+    def assertStatsMatchDevices(self):
+        self.assertEqual(device_stats(), {
+            'total': Device.objects.count(),
+            'available': Device.objects.filter(status=Device.STATUS_AVAILABLE).count(),
+            'in_use': Device.objects.filter(status=Device.STATUS_IN_USE).count(),
+        })
+
+    def test_request_lifecycle(self):
+        device = self.create_device('NB0001')
+        self.create_device('NB0002', is_written_off=True)
+        self.assertStatsMatchDevices()
+
+        request_obj = Request.objects.create(employee=self.employee, device=device, purpose='')
+        request_obj.status = Request.STATUS_APPROVED
+        request_obj.save()
+        self.assertEqual(device_stats(), {'total': 2, 'available': 1, 'in_use': 1})
+
+        Repair.objects.create(device=device, reported_by=self.employee, description='Не включается')
+        request_obj.status = Request.STATUS_COMPLETED
+        request_obj.save()
+        self.assertStatsMatchDevices()
+
+        request_obj.delete()
+        Device.objects.filter(inventory_number='NB0002').delete()
+        self.assertStatsMatchDevices()
+
+    def test_rebuild_fixes_drift(self):
+        self.create_device('NB0001')
+        Device.objects.bulk_create([
+            Device(inventory_number='NB0002', model='Lenovo', device_type=self.device_type),
+        ])
+        self.assertEqual(device_stats()['total'], 1)
+
+        self.assertEqual(rebuild_counters(), 1)
+        self.assertStatsMatchDevices()
+
+
+class BreakdownStatisticsTests(TestCase):
+    """Отчёт по поломкам считается в БД"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='analyst', password='password')
+        UserProfile.objects.filter(user=cls.user).update(role=UserProfile.ROLE_ANALYST)
+        cls.employee = Employee.objects.create(full_name='Иванов Иван', position='Разработчик', email='ivanov@company.ru')
+        cls.laptops = DeviceType.objects.create(name='Ноутбук')
+        cls.monitors = DeviceType.objects.create(name='Монитор')
+        cls.laptop = Device.objects.create(inventory_number='NB0001', model='Lenovo', device_type=cls.laptops)
+        Device.objects.create(inventory_number='NB0002', model='Lenovo', device_type=cls.laptops)
+        Device.objects.create(inventory_number='MN0001', model='Dell', device_type=cls.monitors)
+
+        start = timezone.make_aware(datetime(2026, 3, 1, 9, 0))
+        # Два ремонта ноутбука с разрывом в 10 дней и один незавершённый через 60 дней
+        cls.create_repair(cls.laptop, start, start + timedelta(hours=4))
+        cls.repeat = cls.create_repair(cls.laptop, start + timedelta(days=10), start + timedelta(days=10, hours=8))
+        cls.create_repair(cls.laptop, start + timedelta(days=70), None)
+
+    @classmethod
+    def create_repair(cls, device, created_at, completed_at):
+        repair = Repair.objects.create(
+            device=device,
+            reported_by=cls.employee,
+            description='Не включается',
+            status=Repair.STATUS_COMPLETED if completed_at else Repair.STATUS_REPAIRING,
+            completed_at=completed_at,
+        )
+        Repair.objects.filter(pk=repair.pk).update(created_at=created_at)
+        return repair
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_summary_and_failure_rates(self):
+        summary = repair_summary({})
+        self.assertEqual((summary['total'], summary['completed'], summary['active']), (3, 2, 1))
+        self.assertAlmostEqual(summary['mttr_hours'], 6)
+
+        rows = list(failure_rates({}, ['device_type__name']))
+        self.assertEqual(
+            [(row['device_type__name'], row['fleet'], row['repairs'], row['failed_devices'], row['rank']) for row in rows],
+            [('Ноутбук', 2, 3, 1, 1), ('Монитор', 1, 0, 0, 2)],
+        )
+        self.assertAlmostEqual(rows[0]['failure_rate'], 1.5)
+        self.assertAlmostEqual(rows[0]['failed_share'], 0.5)
+
+    def test_repeat_failures_see_history_before_period(self):
+        self.assertEqual(list(repeat_failures({}, within_days=30)), [self.repeat])
+        self.assertEqual(list(repeat_failures({'date_from': date(2026, 3, 5)}, within_days=30)), [self.repeat])
+        self.assertEqual(list(repeat_failures({'date_to': date(2026, 3, 5)}, within_days=30)), [])
+
+    def test_report_page(self):
+        self.client.get(reverse('breakdown_statistics'))
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('breakdown_statistics'), {'group': 'model', 'date_from': '2026-03-05'})
+
+        self.assertEqual(response.context['summary']['total'], 2)
+        self.assertContains(response, 'Lenovo')
+        self.assertContains(response, 'NB0001', count=1)
+
+
+class MovementExportTests(TestCase):
+    """Потоковая выгрузка журнала движений"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='analyst', password='password')
+        UserProfile.objects.filter(user=cls.user).update(role=UserProfile.ROLE_ANALYST)
+        cls.employee = Employee.objects.create(full_name='Иванов Иван', position='Разработчик', email='ivanov@company.ru')
+        device_type = DeviceType.objects.create(name='Ноутбук')
+        device = Device.objects.create(inventory_number='NB0001', model='Lenovo', device_type=device_type)
+        EquipmentMovement.objects.bulk_create([
+            EquipmentMovement(
+                device=device,
+                employee=cls.employee,
+                movement_type=EquipmentMovement.MOVEMENT_ISSUE if index % 2 else EquipmentMovement.MOVEMENT_RETURN,
+                notes=f'Запись {index} <&> "кавычки"\x01',
+            )
+            for index in range(25)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, export_format, **params):
+        response = self.client.get(reverse('export_movements', args=[export_format]), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.export('csv').decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:3], ['ID', 'Дата', 'Операция'])
+        self.assertEqual(len(rows), 26)
+        self.assertEqual(rows[1][7], 'Запись 0 <&> "кавычки"\x01')
+
+    def test_jsonl_filters(self):
+        lines = self.export('jsonl', movement_type=EquipmentMovement.MOVEMENT_ISSUE).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 12)
+        self.assertEqual({json.loads(line)['movement_type'] for line in lines}, {'Выдача'})
+        self.assertEqual(self.export('jsonl', date_to='2000-01-01'), b'')
+
+    def test_xlsx(self):
+        with zipfile.ZipFile(io.BytesIO(self.export('xlsx'))) as archive:
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        namespace = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        rows = sheet.findall(f'{namespace}sheetData/{namespace}row')
+        self.assertEqual(len(rows), 26)
+        self.assertEqual(rows[1].findall(f'.//{namespace}t')[-1].text, 'Запись 0 <&> "кавычки"')
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('export_movements', args=['pdf'])).status_code, 404)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'movements.jsonl')
+            call_command('export_movements', format='jsonl', output=path, employee=self.employee.id, stderr=io.StringIO())
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(len(f.readlines()), 25)
+
+    def test_xlsx_continues_on_next_sheet(self):
+        rows = [[index, 'x'] for index in range(5)]
+        with zipfile.ZipFile(io.BytesIO(b''.join(xlsx_chunks(rows, rows_per_chunk=2, max_rows=3)))) as archive:
+            sheets = sorted(name for name in archive.namelist() if name.startswith('xl/worksheets/'))
+            workbook = archive.read('xl/workbook.xml').decode('utf-8')
+        self.assertEqual(len(sheets), 3)
+        self.assertEqual(workbook.count('<sheet '), 3)
+
+
+class GlobalSearchTests(TestCase):
+    """Поиск по оборудованию, сотрудникам и заявкам (в SQLite — через FTS5)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', password='password')
+        UserProfile.objects.filter(user=cls.user).update(role=UserProfile.ROLE_ADMIN)
+        cls.employee = Employee.objects.create(
+            full_name='Смирнова Ольга', position='Дизайнер', email='o.smirnova@company.ru'
+        )
+        laptops = DeviceType.objects.create(name='Ноутбук')
+        cls.thinkpad = Device.objects.create(inventory_number='NB0001', model='Lenovo ThinkPad', device_type=laptops)
+        Device.objects.create(inventory_number='NB0002', model='Dell Latitude', device_type=laptops)
+        Device.objects.create(inventory_number='MN0001', model='Lenovo L24', device_type=laptops)
+        cls.request_obj = Request.objects.create(
+            employee=cls.employee, device=cls.thinkpad, purpose='Нужен мощный ноутбук для дизайна'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def results(self, **params):
+        return self.client.get(reverse('global_search'), params).json()
+
+    def test_search_across_kinds(self):
+        found = {(hit['kind'], hit['id']) for hit in self.results(q='lenovo')['results']}
+        self.assertEqual(found, {('device', self.thinkpad.id), ('device', Device.objects.get(model='Lenovo L24').id)})
+
+        self.assertEqual(self.results(q='Смирнова')['results'][0]['title'], 'Смирнова Ольга')
+        self.assertEqual([hit['kind'] for hit in self.results(q='ноутбук дизайн')['results']], ['request'])
+        self.assertEqual(self.results(q='lenovo', kind='employee')['results'], [])
+
+    def test_index_follows_changes(self):
+        self.thinkpad.model = 'HP EliteBook'
+        self.thinkpad.save()
+        self.assertEqual(len(self.results(q='lenovo')['results']), 1)
+        self.assertEqual(self.results(q='elitebook')['results'][0]['id'], self.thinkpad.id)
+
+        Employee.objects.filter(pk=self.employee.pk).update(full_name='Кузнецова Ольга')
+        self.assertEqual(self.results(q='Смирнова')['results'], [])
+
+    def test_pagination(self):
+        Device.objects.bulk_create([
+            Device(inventory_number=f'SR{index:04d}', model='Server', device_type=self.thinkpad.device_type)
+            for index in range(SEARCH_PAGE_SIZE + 5)
+        ])
+        first, second = self.results(q='server'), self.results(q='server', page=2)
+        self.assertTrue(first['has_next'])
+        self.assertFalse(second['has_next'])
+        ids = [hit['id'] for hit in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), SEARCH_PAGE_SIZE + 5)
+
+    def test_prefix_mode(self):
+        numbers = [device['inventory_number'] for device in self.results(q='nb', mode='prefix')['results']]
+        self.assertEqual(numbers, ['NB0001', 'NB0002'])
+
+    def test_email_visible_to_admin_only(self):
+        hits = self.results(q='smirnova')['results']
+        self.assertEqual([(hit['kind'], hit['subtitle']) for hit in hits], [('employee', 'o.smirnova@company.ru')])
+
+        tech = User.objects.create_user(username='tech', password='password')
+        UserProfile.objects.filter(user=tech).update(role=UserProfile.ROLE_TECH)
+        self.client.force_login(tech)
+        self.assertEqual(self.results(q='smirnova')['results'], [])
+        self.assertEqual(self.results(q='Смирнова')['results'][0]['subtitle'], 'Дизайнер')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Полнотекстовый поиск и pg_trgm — только в PostgreSQL')
+    def test_postgres_ranking_and_substring_fallback(self):
+        # Точный инвентарный номер — выше текстовых совпадений
+        top = self.results(q='NB0001')['results'][0]
+        self.assertEqual((top['kind'], top['id']), ('device', self.thinkpad.id))
+        # Часть номера и обрезанное слово находят заявку через подстроку (индексы pg_trgm)
+        for query in ('B000', 'ноутбу'):
+            found = [(hit['kind'], hit['id']) for hit in self.results(q=query, kind='request')['results']]
+            self.assertEqual(found, [('request', self.request_obj.id)], query)
+
+    def test_employees_cannot_search(self):
+        employee_user = User.objects.create_user(username='employee', password='password')
+        self.client.force_login(employee_user)
+        self.assertEqual(self.client.get(reverse('global_search'), {'q': 'lenovo'}).status_code, 403)
+
+
+class JsonApiTests(TestCase):
+    """JSON API: состав полей, курсорная пагинация и условные запросы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='analyst', password='password')
+        UserProfile.objects.filter(user=cls.user).update(role=UserProfile.ROLE_ANALYST)
+        cls.employee = Employee.objects.create(
+            full_name='Петров Пётр', position='Аналитик', email='petrov@company.ru', user=cls.user
+        )
+        cls.device_type = DeviceType.objects.create(name='Монитор')
+        cls.devices = [
+            Device.objects.create(inventory_number=f'MN{index:04d}', model='Dell P2422H',
+                                  device_type=cls.device_type, responsible_person=cls.employee)
+            for index in range(5)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, resource, **params):
+        return self.client.get(reverse('api_resource_list', args=[resource]), params)
+
+    def test_sparse_fields(self):
+        results = self.get('devices', fields='id,device_type').json()['results']
+        self.assertEqual(results[0], {
+            'id': self.devices[0].id,
+            'device_type': {'id': self.device_type.id, 'name': 'Монитор'},
+        })
+        self.assertEqual(self.get('devices', fields='id,secret').status_code, 400)
+        self.assertEqual(self.get('devices', status='lost').status_code, 400)
+        self.assertEqual(self.get('unknown').status_code, 404)
+
+    def test_related_fields_loaded_in_bulk(self):
+        self.get('devices')
+        # Версии таблиц, сессия и пользователь, страница с JOIN, заявки одним prefetch
+        with self.assertNumQueries(5):
+            response = self.get('devices', fields='id,device_type,responsible_person,active_request_ids')
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_keyset_pagination(self):
+        first = self.get('devices', fields='id', page_size=2).json()
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['id'] for row in second['results']], [device.id for device in self.devices[2:4]])
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def test_not_modified_until_table_changes(self):
+        response = self.get('devices')
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        self.get('devices')
+        # 304 без выборки оборудования: только версии таблиц, сессия и пользователь
+        with self.assertNumQueries(3):
+            cached = self.client.get(reverse('api_resource_list', args=['devices']), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertNotEqual(self.get('devices', fields='id')['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.devices[0].model = 'Dell U2723QE'
+            self.devices[0].save()
+        response = self.client.get(reverse('api_resource_list', args=['devices']), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_access(self):
+        self.client.logout()
+        self.assertEqual(self.get('devices').status_code, 401)
+        with self.settings(API_TOKEN='secret'):
+            response = self.client.get(reverse('api_resource_list', args=['repairs']),
+                                       HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        with self.settings(API_TOKEN='secret'):
+            response = self.client.get(reverse('api_resource_list', args=['repairs']),
+                                       HTTP_AUTHORIZATION='Bearer secre')
+        self.assertEqual(response.status_code, 401)
+        with self.settings(API_TOKEN=None):
+            response = self.client.get(reverse('api_resource_list', args=['repairs']),
+                                       HTTP_AUTHORIZATION='Bearer None')
+        self.assertEqual(response.status_code, 401)
+
+        employee_user = User.objects.create_user(username='employee', password='password')
+        self.client.force_login(employee_user)
+        self.assertEqual(self.get('requests').status_code, 403)
+
+
+class BulkRequestDecisionTests(TestCase):
+    """Массовое одобрение и отклонение заявок"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', password='password')
+        UserProfile.objects.filter(user=cls.user).update(role=UserProfile.ROLE_ADMIN)
+        cls.employee = Employee.objects.create(full_name='Орлов Олег', position='Инженер', email='orlov@company.ru')
+        cls.device_type = DeviceType.objects.create(name='Ноутбук')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_requests(self, count, **device_fields):
+        start = Device.objects.count()
+        return [
+            Request.objects.create(
+                employee=self.employee, purpose='',
+                device=Device.objects.create(inventory_number=f'NB{index:04d}', model='Lenovo',
+                                             device_type=self.device_type, **device_fields),
+            )
+            for index in range(start, start + count)
+        ]
+
+    def decide(self, requests, status):
+        return self.client.post(reverse('bulk_update_request_status'), {
+            'request_ids': [request_obj.id for request_obj in requests], 'status': status,
+        })
+
+    def test_approve_updates_devices_counters_and_movements(self):
+        requests = self.create_requests(3)
+        self.decide(requests, Request.STATUS_APPROVED)
+
+        self.assertEqual(Request.objects.filter(status=Request.STATUS_APPROVED).count(), 3)
+        self.assertEqual(Device.objects.filter(status=Device.STATUS_IN_USE).count(), 3)
+        self.assertEqual(EquipmentMovement.objects.filter(movement_type=EquipmentMovement.MOVEMENT_ISSUE).count(), 3)
+        self.assertEqual(device_stats(), {'total': 3, 'available': 0, 'in_use': 3})
+        self.assertEqual(rebuild_counters(), 0)
+
+    def test_conflicts_reported_per_row(self):
+        approved, pending = self.create_requests(2)
+        approved.status = Request.STATUS_APPROVED
+        approved.save()
+        rival = Request.objects.create(employee=self.employee, device=pending.device, purpose='',
+                                       ai_priority_score=9)
+        broken = self.create_requests(1, status=Device.STATUS_BROKEN)[0]
+
+        result = decide_requests([approved.id, pending.id, rival.id, broken.id, 999999], Request.STATUS_APPROVED)
+
+        self.assertEqual(result.processed, [rival.id])
+        self.assertEqual(set(result.conflicts), {approved.id, pending.id, broken.id, 999999})
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, Request.STATUS_PENDING)
+
+    def test_reject_keeps_devices_available(self):
+        requests = self.create_requests(2)
+        response = self.decide(requests, Request.STATUS_REJECTED)
+        self.assertRedirects(response, reverse('manage_requests'), fetch_redirect_response=False)
+        self.assertEqual([str(m) for m in get_messages(response.wsgi_request)], ['Заявок со статусом «Отклонена»: 2'])
+        self.assertEqual(Request.objects.filter(status=Request.STATUS_REJECTED).count(), 2)
+        self.assertEqual(Device.objects.filter(status=Device.STATUS_AVAILABLE).count(), 2)
+        self.assertFalse(EquipmentMovement.objects.exists())
+
+    def test_admin_action_reports_status_label(self):
+        requests = self.create_requests(2)
+        admin_user = User.objects.create_superuser(username='root', password='password')
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse('admin:inventory_request_changelist'), {
+            'action': 'approve_requests', '_selected_action': [request_obj.id for request_obj in requests],
+        })
+        self.assertEqual([str(m) for m in get_messages(response.wsgi_request)], ['Заявок со статусом «Одобрена»: 2'])
+
+    def test_query_count_does_not_grow_with_batch(self):
+        small, large = self.create_requests(2), self.create_requests(40)
+        # Блокирующая выборка, заявки, оборудование, два запроса к счётчикам, движения и SAVEPOINT/RELEASE
+        with self.assertNumQueries(8):
+            decide_requests([request_obj.id for request_obj in small], Request.STATUS_APPROVED)
+        with self.assertNumQueries(8):
+            decide_requests([request_obj.id for request_obj in large], Request.STATUS_APPROVED)
+
+
+class DeviceImportTests(TestCase):
+    """Загрузка оборудования из CSV (в SQLite — через bulk_create)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', password='password')
+        UserProfile.objects.filter(user=cls.user).update(role=UserProfile.ROLE_ADMIN)
+        cls.employee = Employee.objects.create(full_name='Волков Иван', position='Инженер', email='volkov@company.ru')
+        cls.laptops = DeviceType.objects.create(name='Ноутбук')
+        Device.objects.create(inventory_number='NB0001', model='Lenovo', device_type=cls.laptops)
+
+    def import_csv(self, content):
+        return import_devices(io.StringIO(content))
+
+    def test_valid_and_rejected_rows(self):
+        result = self.import_csv(
+            'inventory_number;model;device_type;purchase_date;responsible_email\n'
+            'NB0002;Dell Latitude;ноутбук;01.02.2024;Volkov@company.ru\n'
+            'NB0001;HP ProBook;Ноутбук;;\n'
+            'NB0002;Dell Latitude;Ноутбук;;\n'
+            'PR0001;HP LaserJet;Принтер;;\n'
+            'NB0003;Asus;Ноутбук;2024-13-01;\n'
+            'NB0004;Asus;Ноутбук;;nobody@company.ru\n'
+            ';Asus;Ноутбук;;\n'
+            'NB0005;Asus ZenBook;Ноутбук;2024-03-05;\n'
+        )
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([row.line for row in result.rejected], [3, 4, 5, 6, 7, 8])
+        device = Device.objects.get(inventory_number='NB0002')
+        self.assertEqual((device.purchase_date, device.responsible_person), (date(2024, 2, 1), self.employee))
+        self.assertEqual(device_stats()['available'], 3)
+        self.assertEqual(rebuild_counters(), 0)
+
+    def test_missing_columns(self):
+        with self.assertRaises(DeviceImportError):
+            self.import_csv('inventory_number,model\nNB0002,Dell\n')
+
+    def test_upload_view(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile(
+            'devices.csv', '\ufeffinventory_number,model,device_type\nNB0010,Dell,Ноутбук\nNB0001,Dell,Ноутбук\n'.encode()
+        )
+        response = self.client.post(reverse('import_devices'), {'file': upload})
+        self.assertEqual(response.context['result'].created, 1)
+        self.assertContains(response, 'Инвентарный номер уже есть в базе')
+
+    def test_command_writes_rejected_rows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source, rejected = os.path.join(directory, 'devices.csv'), os.path.join(directory, 'rejected.csv')
+            with open(source, 'w', encoding='utf-8') as f:
+                f.write('inventory_number,model,device_type\n')
+                f.writelines(f'IM{index:05d},Dell,Ноутбук\n' for index in range(1200))
+                f.write('IM00001,Dell,Ноутбук\n')
+            call_command('import_devices', source, rejected=rejected, chunk_size=500, stdout=io.StringIO())
+            with open(rejected, encoding='utf-8-sig') as f:
+                self.assertEqual(list(csv.reader(f))[1:], [['1202', 'IM00001', 'Инвентарный номер повторяется в файле']])
+        self.assertEqual(Device.objects.filter(inventory_number__startswith='IM').count(), 1200)
+
+
+ANALYSIS_REPLY = '{"priority_score": 8, "tags": ["разработка"], "summary": "Ноутбук для разработки", "needs_clarification": false}'
+
+
+class FakeGigaChat:
+    """Клиент GigaChat для тестов: отдаёт заготовленные ответы по очереди, последний повторяется"""
+
+    def __init__(self, *replies, chunk_size=8):
+        self.replies = list(replies) or [ANALYSIS_REPLY]
+        self.chunk_size = chunk_size
+        self.prompts = []
+        self.timeouts = []
+        self.chunks_sent = 0
+
+    def next_reply(self, prompt):
+        self.prompts.append(prompt)
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def chat(self, prompt, timeout=None):
+        self.timeouts.append(timeout)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.next_reply(prompt)))],
+            model='GigaChat',
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+        )
+
+    def stream(self, prompt, timeout=None):
+        self.timeouts.append(timeout)
+        content = self.next_reply(prompt)
+
+        def chunks():
+            for start in range(0, len(content), self.chunk_size):
+                self.chunks_sent += 1
+                yield SimpleNamespace(
+                    model='GigaChat',
+                    choices=[SimpleNamespace(delta=SimpleNamespace(content=content[start:start + self.chunk_size]))],
+                )
+
+        return chunks()
+
+
+# Вызовы AI без повторов, локального классификатора, поиска повторов и ограничения частоты
+AI_TEST_SETTINGS = dict(
+    GIGACHAT_STREAMING=False,
+    GIGACHAT_MAX_RETRIES=0,
+    AI_LOCAL_CLASSIFIER_ENABLED=False,
+    AI_NEAR_DUPLICATE_ENABLED=False,
+    AI_RATE_LIMIT_RPS=1000,
+    AI_RATE_LIMIT_BURST=1000,
+    AI_RATE_LIMIT_TOKENS_PER_DAY=0,
+)
+
+
+class AITestMixin:
+    """Сотрудник, оборудование и сервис с подменённым клиентом GigaChat"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = Employee.objects.create(full_name='Иванов Иван', position='Разработчик', email='ivanov@company.ru')
+        cls.device_type = DeviceType.objects.create(name='Ноутбук')
+
+    def make_service(self, *replies, **client_options):
+        service = GigaChatService(client=FakeGigaChat(*replies, **client_options))
+        # Кэш в памяти общий для процесса — у каждого теста свой
+        service.cache = AnalysisCache()
+        return service
+
+    def create_request(self, purpose='Разработка мобильного приложения на Kotlin', number=None):
+        number = number or f'NB{Device.objects.count():04d}'
+        device = Device.objects.create(inventory_number=number, model='Lenovo', device_type=self.device_type)
+        return Request.objects.create(employee=self.employee, device=device, purpose=purpose)
+
+    def save_analysis(self, request_obj, source, priority_score=8, tags=('для проекта',)):
+        result = {'priority_score': priority_score, 'tags': list(tags), 'summary': 'Резюме', 'needs_clarification': False}
+        set_analysis_fields(request_obj, result)
+        save_analysis_results([request_obj], {request_obj.pk: AnalysisOutcome(result=result, source=source)})
+        return request_obj
+
+
+@override_settings(**AI_TEST_SETTINGS, AI_JOB_MAX_ATTEMPTS=2, AI_JOB_RETRY_DELAY=30)
+class AIQueueTests(AITestMixin, TestCase):
+    """Очередь AI-анализа: постановка, повторы с паузой и заглушка после последней попытки"""
+
+    def test_job_enqueued_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            request_obj = self.create_request()
+        self.assertFalse(AIAnalysisJob.objects.exists())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(AIAnalysisJob.objects.get().request, request_obj)
+
+    def enqueue(self, count=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            requests = [self.create_request(f'Разработка мобильного приложения, проект {index}') for index in range(count)]
+        return requests
+
+    def test_success_marks_done(self):
+        request_obj = self.enqueue()[0]
+        self.assertEqual(run_pending_jobs('worker', service=self.make_service()), 1)
+
+        self.assertEqual(AIAnalysisJob.objects.get().status, AIAnalysisJob.STATUS_DONE)
+        request_obj.refresh_from_db()
+        self.assertEqual(request_obj.ai_priority_score, 8)
+        self.assertEqual(request_obj.current_analysis.source, AIAnalysis.SOURCE_LLM)
+
+    def test_error_retried_before_fallback(self):
+        request_obj = self.enqueue()[0]
+        service = self.make_service(RuntimeError('502 Bad Gateway'))
+
+        self.assertEqual(process_jobs(claim_jobs('worker'), service=service), 0)
+        job = AIAnalysisJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (AIAnalysisJob.STATUS_PENDING, 1))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=25))
+        self.assertFalse(AIAnalysis.objects.exists())
+        # До истечения паузы задание не выдаётся
+        self.assertEqual(claim_jobs('worker'), [])
+
+        AIAnalysisJob.objects.update(run_after=None)
+        process_jobs(claim_jobs('worker'), service=service)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AIAnalysisJob.STATUS_FAILED, 2))
+        self.assertIn('502', job.last_error)
+        request_obj.refresh_from_db()
+        self.assertEqual(request_obj.current_analysis.source, AIAnalysis.SOURCE_FALLBACK)
+
+    def test_partial_failure_keeps_successful_results(self):
+        first, second = self.enqueue(2)
+        # Пакетный ответ разобран только для первой заявки, вторая уходит отдельным запросом с ошибкой
+        service = self.make_service(
+            json.dumps([dict(json.loads(ANALYSIS_REPLY), id=first.id)]), RuntimeError('timeout')
+        )
+
+        self.assertEqual(process_jobs(claim_jobs('worker', limit=2), service=service), 1)
+        statuses = dict(AIAnalysisJob.objects.values_list('request_id', 'status'))
+        self.assertEqual(statuses, {first.id: AIAnalysisJob.STATUS_DONE, second.id: AIAnalysisJob.STATUS_PENDING})
+        second.refresh_from_db()
+        self.assertIsNone(second.current_analysis)
+
+    def test_rate_limit_mid_batch_saves_received_results(self):
+        first, second = self.enqueue(2)
+        service = self.make_service(
+            json.dumps([dict(json.loads(ANALYSIS_REPLY), id=first.id)]),
+            RateLimitExceeded('Превышена частота запросов', 120),
+        )
+
+        self.assertEqual(process_jobs(claim_jobs('worker', limit=2), service=service), 1)
+        jobs = {job.request_id: job for job in AIAnalysisJob.objects.all()}
+        self.assertEqual(jobs[first.id].status, AIAnalysisJob.STATUS_DONE)
+        self.assertEqual((jobs[second.id].status, jobs[second.id].attempts), (AIAnalysisJob.STATUS_PENDING, 0))
+        self.assertGreater(jobs[second.id].run_after, timezone.now() + timedelta(seconds=100))
+        first.refresh_from_db()
+        self.assertEqual(first.current_analysis.source, AIAnalysis.SOURCE_BATCH)
+
+    def test_stale_jobs_requeued_periodically(self):
+        self.enqueue()
+        claim_jobs('crashed')
+        AIAnalysisJob.objects.update(started_at=timezone.now() - timedelta(hours=1))
+
+        sweeper = StaleJobSweeper(interval=3600)
+        self.assertEqual(sweeper.maybe_run(), 1)
+        self.assertEqual(AIAnalysisJob.objects.get().status, AIAnalysisJob.STATUS_PENDING)
+
+        claim_jobs('crashed')
+        AIAnalysisJob.objects.update(started_at=timezone.now() - timedelta(hours=1))
+        # Следующая проверка — не раньше чем через interval
+        self.assertEqual(sweeper.maybe_run(), 0)
+
+
+class AIWorkerLoopTests(SimpleTestCase):
+    """Цикл воркера переживает ошибки итерации"""
+
+    def test_loop_survives_claim_error(self):
+        command = RunAIWorkersCommand(stdout=io.StringIO())
+        options = {'batch_size': 1, 'once': True, 'poll_interval': 0.001, 'verbosity': 1}
+        counters = {'processed': 0}
+        sweeper = mock.Mock(**{'maybe_run.return_value': 0})
+        module = 'inventory.management.commands.run_ai_workers'
+        with mock.patch(f'{module}.GigaChatService'), \
+                mock.patch(f'{module}.claim_jobs', side_effect=[OperationalError('server closed the connection'),
+                                                                [mock.Mock()], []]) as claim, \
+                mock.patch(f'{module}.process_jobs', return_value=1), \
+                mock.patch(f'{module}.close_old_connections') as close_old, \
+                self.assertLogs(f'{module}', 'ERROR'):
+            command.worker_loop('worker', threading.Event(), counters, threading.Lock(), sweeper, options)
+
+        self.assertEqual(claim.call_count, 3)
+        self.assertEqual(close_old.call_count, 3)
+        self.assertEqual(counters['processed'], 1)
+
+
+class AnalysisCacheTests(AITestMixin, TestCase):
+    """Кэш результатов: нормализация ключа, два уровня, вытеснение порциями"""
+
+    def test_key_ignores_case_and_punctuation(self):
+        self.assertEqual(
+            make_cache_key('Разработчик', 'Ноутбук', 'Мышь сломалась!'),
+            make_cache_key('разработчик', 'ноутбук', 'мышь  сломалась'),
+        )
+        self.assertNotEqual(
+            make_cache_key('Разработчик', 'Ноутбук', 'Мышь сломалась'),
+            make_cache_key('Разработчик', 'Ноутбук', 'Мышь сломалась', prompt_version='old'),
+        )
+
+    def test_memory_then_database(self):
+        cache = AnalysisCache()
+        cache.set('key', {'priority_score': 3})
+        self.assertEqual(cache.get('key'), {'priority_score': 3})
+
+        # Другой процесс видит запись через БД
+        other = AnalysisCache()
+        self.assertEqual(other.get('key'), {'priority_score': 3})
+        self.assertIsNone(other.get('missing'))
+        self.assertEqual((other.stats()['db_hits'], other.stats()['misses']), (1, 1))
+        self.assertEqual(AIAnalysisCacheEntry.objects.get().hits, 1)
+
+    def test_expired_entries_ignored(self):
+        AnalysisCache().set('key', {'priority_score': 3})
+        AIAnalysisCacheEntry.objects.update(created_at=timezone.now() - timedelta(days=30))
+        self.assertIsNone(AnalysisCache(ttl=3600).get('key'))
+
+    def test_eviction_runs_every_n_writes(self):
+        cache = AnalysisCache(max_entries=2, evict_every=3)
+        with mock.patch.object(cache, 'evict', wraps=cache.evict) as evict:
+            for key in 'abcd':
+                cache.set(key, {})
+            self.assertEqual(evict.call_count, 1)
+            self.assertEqual(AIAnalysisCacheEntry.objects.count(), 3)
+
+            cache.set('e', {})
+            cache.set('f', {})
+            self.assertEqual(evict.call_count, 2)
+        self.assertEqual(AIAnalysisCacheEntry.objects.count(), 2)
+
+
+class PromptVersionTests(TestCase):
+    """Версия промптов учитывает все шаблоны"""
+
+    def test_every_template_changes_version(self):
+        templates = [ANALYSIS_CRITERIA, REQUEST_ANALYSIS_PROMPT, BATCH_ANALYSIS_PROMPT]
+        self.assertEqual(prompt_version(*templates), PROMPT_VERSION)
+        for index in range(len(templates)):
+            changed = list(templates)
+            changed[index] += ' '
+            self.assertNotEqual(prompt_version(*changed), PROMPT_VERSION)
+        self.assertNotEqual(prompt_version('ab', 'c'), prompt_version('a', 'bc'))
+
+
+@override_settings(**AI_TEST_SETTINGS)
+class ResponseParserTests(AITestMixin, TestCase):
+    """Поиск JSON в ответе модели: пояснения со скобками, поток по частям, оборванный ответ"""
+
+    def test_preamble_brackets_skipped(self):
+        self.assertEqual(
+            parse_json('Оценка [1-10]: {"priority_score": 3}', expect=EXPECT_OBJECT),
+            ({'priority_score': 3}, False),
+        )
+        self.assertEqual(
+            parse_json('Формат {оценка}: {"priority_score": 3}', expect=EXPECT_OBJECT),
+            ({'priority_score': 3}, False),
+        )
+        self.assertEqual(
+            parse_json("It's [1-10]: [{\"id\": 1, \"priority_score\": 3}]", expect=EXPECT_OBJECTS),
+            ([{'id': 1, 'priority_score': 3}], False),
+        )
+
+    def test_split_across_chunks(self):
+        reply = 'Шкала [1-10], ответ: {"priority_score": 3, "summary": "a}b"} и пояснение'
+        extractor = JsonExtractor(EXPECT_OBJECT)
+        chunks = [reply[start:start + 3] for start in range(0, len(reply), 3)]
+        fed = 0
+        for chunk in chunks:
+            fed += 1
+            if extractor.feed(chunk):
+                break
+        self.assertTrue(extractor.complete)
+        self.assertEqual(extractor.value, {'priority_score': 3, 'summary': 'a}b'})
+        self.assertLess(fed, len(chunks))
+
+    def test_truncated_reply_repaired(self):
+        extractor = JsonExtractor(EXPECT_OBJECT)
+        self.assertFalse(extractor.feed('Ответ: {"priority_score": 3, "tags": ["сро'))
+        self.assertEqual(
+            parse_json('Ответ: {"priority_score": 3, "tags": ["сро', expect=EXPECT_OBJECT),
+            ({'priority_score': 3, 'tags': ['сро']}, True),
+        )
+
+    @override_settings(GIGACHAT_STREAMING=True)
+    def test_stream_cancelled_only_after_object(self):
+        reply = 'Оценка [1-10]: ' + ANALYSIS_REPLY + ' Пояснение к оценке, которое можно не читать'
+        service = self.make_service(reply, chunk_size=5)
+
+        outcome = service.analyze_request_detailed('Разработчик', 'Ноутбук', 'Разработка сервиса')
+
+        self.assertEqual(outcome.source, AnalysisOutcome.SOURCE_LLM)
+        self.assertEqual(outcome.result['priority_score'], 8)
+        self.assertLess(service.client.chunks_sent, -(-len(reply) // 5))
+
+
+class FakeGigaChatAPI(BaseHTTPRequestHandler):
+    """Локальный сервер с OAuth и /chat/completions; поведение задаётся атрибутами server"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        if self.path == '/oauth':
+            server.tokens_issued += 1
+            expires_in = server.token_lifetimes.pop(0) if server.token_lifetimes else 3600
+            return self.reply(200, {
+                'access_token': f'token-{server.tokens_issued}',
+                'expires_at': int((time.time() + expires_in) * 1000),
+            })
+
+        server.authorizations.append(self.headers.get('Authorization'))
+        if server.delay:
+            time.sleep(server.delay)
+        if server.status != 200:
+            return self.reply(server.status, {'message': 'unavailable'})
+        self.reply(200, {
+            'choices': [{'message': {'role': 'assistant', 'content': ANALYSIS_REPLY}, 'index': 0}],
+            'created': int(time.time()),
+            'model': 'GigaChat',
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15},
+            'object': 'chat.completion',
+        })
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            # Клиент уже отключился по таймауту
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class GigaChatClientTests(SimpleTestCase):
+    """Клиент GigaChat против локального HTTP-сервера"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGigaChatAPI)
+        self.server.daemon_threads = True
+        self.server.tokens_issued = 0
+        self.server.token_lifetimes = []
+        self.server.authorizations = []
+        self.server.delay = 0
+        self.server.status = 200
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def make_manager(self, **options):
+        host, port = self.server.server_address
+        manager = GigaChatClientManager(
+            credentials='secret', base_url=f'http://{host}:{port}', auth_url=f'http://{host}:{port}/oauth',
+            verify_ssl_certs=False, refresh_margin=60, **options
+        )
+        self.addCleanup(manager.close)
+        return manager
+
+    def test_token_refreshed_before_expiry(self):
+        # Первый токен истекает раньше запаса refresh_margin, второй — через час
+        self.server.token_lifetimes = [30, 3600]
+        manager = self.make_manager()
+
+        self.assertEqual(manager.chat('Привет').choices[0].message.content, ANALYSIS_REPLY)
+        manager.chat('Привет')
+        manager.chat('Привет')
+
+        self.assertEqual(self.server.tokens_issued, 2)
+        self.assertEqual(self.server.authorizations, ['Bearer token-1', 'Bearer token-2', 'Bearer token-2'])
+
+    def test_timeout_is_retryable(self):
+        self.server.delay = 0.5
+        manager = self.make_manager(timeout=0.1)
+        with self.assertRaises(httpx.TimeoutException) as raised:
+            manager.chat('Привет')
+        self.assertTrue(is_retryable(raised.exception))
+
+    def test_server_error_is_retryable(self):
+        self.server.status = 503
+        with self.assertRaises(ResponseError) as raised:
+            self.make_manager().chat('Привет')
+        self.assertEqual(raised.exception.args[1], 503)
+        self.assertTrue(is_retryable(raised.exception))
+
+    def test_attempt_timeout_applied_to_request(self):
+        self.server.delay = 0.5
+        manager = self.make_manager(timeout=5)
+        started = time.monotonic()
+        with self.assertRaises(httpx.TimeoutException):
+            manager.chat('Привет', timeout=0.1)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+        self.server.delay = 0
+        self.assertEqual(manager.chat('Привет').choices[0].message.content, ANALYSIS_REPLY)
+
+    def test_sdk_version_checked(self):
+        self.assertTrue(check_sdk_version().startswith('0.1.'))
+        with mock.patch('inventory.services.gigachat_client.version', return_value='0.2.0'):
+            with self.assertRaises(ImproperlyConfigured):
+                self.make_manager().chat('Привет')
+
+
+@override_settings(**AI_TEST_SETTINGS)
+class LocalClassifierTests(AITestMixin, TestCase):
+    """Локальный предклассификатор: правила, порог уверенности, обучение на ответах модели"""
+
+    def test_rules(self):
+        score, tags, confidence = RuleClassifier().classify('Ноутбук сломался, не могу работать')
+        self.assertEqual((score, set(tags)), (10, {'оборудование сломалось', 'блокирует работу'}))
+        self.assertGreaterEqual(confidence, 0.85)
+
+        score, tags, confidence = RuleClassifier().classify('Хочу удобный, но сломался')
+        self.assertLess(confidence, 0.85)
+
+    def test_short_purpose_goes_to_model(self):
+        result, confidence = LocalClassifier().classify('Бухгалтер', 'Монитор', 'Замена монитора')
+        self.assertTrue(result['needs_clarification'])
+        self.assertLess(confidence, 0.85)
+
+        with self.settings(AI_LOCAL_CLASSIFIER_ENABLED=True, AI_LOCAL_CLASSIFIER_PATH='/nonexistent/model.json'):
+            service = self.make_service()
+        outcome = service.analyze_request_detailed('Бухгалтер', 'Монитор', 'Замена монитора')
+        self.assertEqual(outcome.source, AnalysisOutcome.SOURCE_LLM)
+        self.assertEqual(len(service.client.prompts), 1)
+
+    def test_trained_only_on_model_answers(self):
+        for index in range(20):
+            self.save_analysis(self.create_request(f'Разработка сервиса номер {index}'), AIAnalysis.SOURCE_LLM)
+            self.save_analysis(self.create_request(f'Замена клавиатуры {index}'), AIAnalysis.SOURCE_LOCAL)
+        self.save_analysis(self.create_request('Печать отчётов'), AIAnalysis.SOURCE_FALLBACK, 5, ['ошибка анализа'])
+
+        self.assertIsNone(train_model(min_samples=21))
+        model = train_model(min_samples=20)
+        self.assertIn('разраб', model.idf)
+        self.assertNotIn('клавиа', model.idf)
+        self.assertNotIn('печать', model.idf)
+
+
+@override_settings(**AI_TEST_SETTINGS, GIGACHAT_BACKOFF_BASE=0.001, GIGACHAT_BACKOFF_MAX=0.001)
+class ResilienceTests(AITestMixin, TestCase):
+    """Повторы с таймаутом попытки, выключатель и ограничитель на каждую попытку"""
+
+    def failing(self, timeouts, error=None):
+        def func(timeout):
+            timeouts.append(timeout)
+            raise error or httpx.ConnectError('connection refused')
+        return func
+
+    def test_attempt_timeout_bounded_by_deadline(self):
+        timeouts = []
+        with self.assertRaises(httpx.ConnectError):
+            call_with_retry(self.failing(timeouts), max_retries=3, deadline=5, timeout=0.5)
+        self.assertEqual(len(timeouts), 4)
+
+        timeouts = []
+        with self.assertRaises(httpx.ConnectError):
+            call_with_retry(self.failing(timeouts), max_retries=3, deadline=1, timeout=2)
+        # Первая попытка укорочена до deadline, на повтор с полным таймаутом времени нет
+        self.assertEqual(len(timeouts), 1)
+        self.assertLessEqual(timeouts[0], 1)
+
+    def test_non_retryable_error_not_repeated(self):
+        timeouts = []
+        with self.assertRaises(ValueError):
+            call_with_retry(self.failing(timeouts, ValueError('bad json')), max_retries=3)
+        self.assertEqual(len(timeouts), 1)
+
+    def test_breaker_opens_and_reports_retry_after(self):
+        breaker = CircuitBreaker(name='test', min_calls=2, failure_rate=0.5, recovery_timeout=30)
+        for _ in range(2):
+            with self.assertRaises(httpx.ConnectError):
+                call_with_retry(self.failing([]), breaker=breaker, max_retries=0)
+
+        with self.assertRaises(CircuitOpenError) as raised:
+            call_with_retry(self.failing([]), breaker=breaker)
+        self.assertAlmostEqual(raised.exception.retry_after, 30, delta=1)
+
+    def test_success_writes_only_after_failure(self):
+        breaker = CircuitBreaker(name='test', min_calls=3, failure_rate=0.5)
+        with self.assertNumQueries(1):
+            breaker.record_success()
+        self.assertFalse(AICircuitBreaker.objects.exists())
+
+        breaker.record_failure()
+        breaker.record_success()
+        state = AICircuitBreaker.objects.get(name='test')
+        self.assertEqual((state.state, state.window_calls, state.window_failures),
+                         (AICircuitBreaker.STATE_CLOSED, 2, 1))
+
+    def test_open_breaker_defers_job(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_request()
+        service = self.make_service()
+        service.breaker = CircuitBreaker(name='test', min_calls=1, recovery_timeout=120)
+        service.breaker.record_failure()
+
+        self.assertEqual(process_jobs(claim_jobs('worker'), service=service), 0)
+        job = AIAnalysisJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (AIAnalysisJob.STATUS_PENDING, 0))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=100))
+        self.assertFalse(AIAnalysis.objects.exists())
+        self.assertEqual(service.client.prompts, [])
+
+    @override_settings(GIGACHAT_MAX_RETRIES=2)
+    def test_rate_limiter_token_taken_per_attempt(self):
+        service = self.make_service(httpx.ConnectError('reset'), ANALYSIS_REPLY)
+        with mock.patch.object(service.rate_limiter, 'acquire', wraps=service.rate_limiter.acquire) as acquire:
+            outcome = service.analyze_request_detailed('Разработчик', 'Ноутбук', 'Разработка сервиса')
+        self.assertEqual(outcome.source, AnalysisOutcome.SOURCE_LLM)
+        self.assertEqual(acquire.call_count, 2)
+        self.assertEqual(len(service.client.timeouts), 2)
+
+    @override_settings(GIGACHAT_MAX_RETRIES=2, GIGACHAT_STREAMING=True)
+    def test_rate_limiter_token_taken_per_stream_attempt(self):
+        service = self.make_service(httpx.ConnectError('reset'), ANALYSIS_REPLY)
+        with mock.patch.object(service.rate_limiter, 'acquire', wraps=service.rate_limiter.acquire) as acquire:
+            outcome = service.analyze_request_detailed('Разработчик', 'Ноутбук', 'Разработка сервиса')
+        self.assertEqual(outcome.source, AnalysisOutcome.SOURCE_LLM)
+        self.assertEqual(acquire.call_count, 2)
+        self.assertEqual(len(service.client.timeouts), 2)
+
+    @override_settings(GIGACHAT_MAX_RETRIES=2, AI_RATE_LIMIT_BURST=1, AI_RATE_LIMIT_RPS=0.001)
+    def test_retry_stops_when_budget_spent(self):
+        service = self.make_service(httpx.ConnectError('reset'), ANALYSIS_REPLY)
+        with self.assertRaises(RateLimitExceeded):
+            service.analyze_request_detailed('Разработчик', 'Ноутбук', 'Разработка сервиса', fallback=False)
+        # Первая попытка израсходовала единственный запрос, на повтор бюджета нет
+        self.assertEqual(len(service.client.timeouts), 1)
+
+
+@override_settings(**AI_TEST_SETTINGS)
+class AnalysisHistoryTests(AITestMixin, TestCase):
+    """История анализов: неудачный повторный анализ не затирает хороший результат"""
+
+    def test_fallback_kept_in_history_only(self):
+        request_obj = self.save_analysis(self.create_request(), AIAnalysis.SOURCE_LLM, priority_score=9)
+        good_analysis = request_obj.current_analysis
+
+        save_fallback_results([request_obj], {request_obj.pk: RuntimeError('timeout')})
+
+        self.assertEqual(request_obj.ai_priority_score, 9)
+        request_obj.refresh_from_db()
+        self.assertEqual((request_obj.current_analysis, request_obj.ai_priority_score), (good_analysis, 9))
+        self.assertEqual(
+            list(request_obj.ai_analyses.order_by('id').values_list('source', flat=True)),
+            [AIAnalysis.SOURCE_LLM, AIAnalysis.SOURCE_FALLBACK],
+        )
+
+    def test_fallback_replaces_weak_or_missing_analysis(self):
+        first = self.create_request()
+        second = self.save_analysis(self.create_request('Замена клавиатуры'), AIAnalysis.SOURCE_LOCAL)
+
+        save_fallback_results([first, second], {first.pk: RuntimeError('timeout'), second.pk: RuntimeError('timeout')})
+
+        for request_obj in (first, second):
+            request_obj.refresh_from_db()
+            self.assertEqual(request_obj.current_analysis.source, AIAnalysis.SOURCE_FALLBACK)
+            self.assertEqual(request_obj.ai_tags, ['ошибка анализа'])
+
+    def test_new_model_answer_replaces_previous(self):
+        request_obj = self.save_analysis(self.create_request(), AIAnalysis.SOURCE_LLM, priority_score=9)
+        self.save_analysis(request_obj, AIAnalysis.SOURCE_BATCH, priority_score=4)
+        request_obj.refresh_from_db()
+        self.assertEqual((request_obj.current_analysis.source, request_obj.ai_priority_score), (AIAnalysis.SOURCE_BATCH, 4))
+
+
+@override_settings(**AI_TEST_SETTINGS)
+class ReanalyzeCommandTests(AITestMixin, TransactionTestCase):
+    """Повторный анализ не заменяет хороший анализ заглушкой и сообщает о неудачах"""
+
+    def setUp(self):
+        # Команда анализирует в пуле потоков со своими соединениями — данные должны быть зафиксированы
+        self.setUpTestData()
+
+    def test_failed_reanalysis_keeps_good_results(self):
+        good = [self.save_analysis(self.create_request(f'Разработка сервиса {index}'), AIAnalysis.SOURCE_LLM, 9)
+                for index in range(2)]
+        unanalyzed = self.create_request('Замена клавиатуры')
+        service = self.make_service(RuntimeError('502 Bad Gateway'))
+
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('inventory.management.commands.reanalyze_requests.GigaChatService', return_value=service):
+            call_command('reanalyze_requests', workers=1, checkpoint=os.path.join(directory, 'checkpoint.json'),
+                         stdout=output)
+
+        self.assertIn('Не удалось проанализировать: 3, из них прежний анализ сохранён у 2', output.getvalue())
+        for request_obj in good:
+            request_obj.refresh_from_db()
+            self.assertEqual((request_obj.current_analysis.source, request_obj.ai_priority_score),
+                             (AIAnalysis.SOURCE_LLM, 9))
+        unanalyzed.refresh_from_db()
+        self.assertEqual(unanalyzed.current_analysis.source, AIAnalysis.SOURCE_FALLBACK)
+
+
+@override_settings(**AI_TEST_SETTINGS)
+class NearDuplicateTests(AITestMixin, TestCase):
+    """Повторное использование анализа почти одинаковых заявок"""
+
+    PURPOSE = 'Нужен ноутбук для разработки мобильного приложения на Kotlin'
+
+    def test_similarity(self):
+        self.assertGreater(jaccard(self.PURPOSE, self.PURPOSE + ' и Swift'), 0.8)
+        self.assertLess(jaccard(self.PURPOSE, 'Сломался монитор, не могу работать'), 0.2)
+
+    def test_found_within_scope_only(self):
+        original = self.save_analysis(self.create_request(self.PURPOSE), AIAnalysis.SOURCE_LLM)
+
+        duplicate, similarity = find_duplicate('Разработчик', 'Ноутбук', self.PURPOSE + '!')
+        self.assertEqual(duplicate, original)
+        self.assertGreaterEqual(similarity, 0.6)
+
+        self.assertEqual(find_duplicate('Бухгалтер', 'Ноутбук', self.PURPOSE), (None, 0.0))
+        self.assertEqual(find_duplicate('Разработчик', 'Монитор', self.PURPOSE), (None, 0.0))
+        self.assertEqual(find_duplicate('Разработчик', 'Ноутбук', self.PURPOSE, exclude_id=original.id), (None, 0.0))
+
+    def test_only_model_answers_reused(self):
+        self.save_analysis(self.create_request(self.PURPOSE), AIAnalysis.SOURCE_LOCAL)
+        self.assertEqual(find_duplicate('Разработчик', 'Ноутбук', self.PURPOSE), (None, 0.0))
+
+    @override_settings(AI_NEAR_DUPLICATE_ENABLED=True)
+    def test_analysis_reused_without_api_call(self):
+        self.save_analysis(self.create_request(self.PURPOSE), AIAnalysis.SOURCE_LLM, priority_score=7)
+        request_obj = self.create_request(self.PURPOSE + ' и Swift')
+        service = self.make_service()
+
+        outcomes = analyze_requests([request_obj], service=service)
+
+        self.assertEqual(outcomes[request_obj.pk].source, AnalysisOutcome.SOURCE_DUPLICATE)
+        self.assertEqual(service.client.prompts, [])
+        request_obj.refresh_from_db()
+        self.assertEqual(request_obj.ai_priority_score, 7)
+
+
+class MetricsServerTests(SimpleTestCase):
+    """Сервер метрик воркера: только путь /metrics и только с токеном"""
+
+    def setUp(self):
+        self.server = start_metrics_server(0, host='127.0.0.1')
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    @override_settings(AI_METRICS_TOKEN='secret')
+    def test_paths_and_token(self):
+        headers = {'Authorization': 'Bearer secret'}
+        with mock.patch('inventory.services.ai_metrics.render_metrics', return_value='# metrics\n'):
+            self.assertEqual(httpx.get(f'{self.url}/metrics', headers=headers).text, '# metrics\n')
+            self.assertEqual(httpx.get(f'{self.url}/metrics?debug=1', headers=headers).status_code, 200)
+            self.assertEqual(httpx.get(f'{self.url}/', headers=headers).status_code, 404)
+            self.assertEqual(httpx.get(f'{self.url}/metricsx', headers=headers).status_code, 404)
+            self.assertEqual(httpx.get(f'{self.url}/metrics').status_code, 401)
+
+
+class AIMetricsTests(TestCase):
+    """Метрики AI-конвейера: доступ только по токену, чтение без записи в БД"""
+
+    def get_metrics(self, **headers):
+        return self.client.get(reverse('ai_metrics'), headers=headers)
+
+    @override_settings(AI_METRICS_TOKEN=None)
+    def test_closed_without_configured_token(self):
+        self.assertEqual(self.get_metrics().status_code, 401)
+        self.assertEqual(self.get_metrics(Authorization='Bearer None').status_code, 401)
+
+    @override_settings(AI_METRICS_TOKEN='secret')
+    def test_requires_token(self):
+        self.assertEqual(self.get_metrics().status_code, 401)
+        self.assertEqual(self.get_metrics(Authorization='Bearer wrong').status_code, 401)
+
+        response = self.get_metrics(Authorization='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('text/plain', response['Content-Type'])
+
+    @override_settings(AI_METRICS_TOKEN='secret')
+    def test_render_does_not_create_state(self):
+        self.assertEqual(self.get_metrics(Authorization='Bearer secret').status_code, 200)
+        self.assertFalse(AICircuitBreaker.objects.exists())
+        self.assertFalse(AIRateLimit.objects.exists())
+        self.assertEqual(CircuitBreaker().retry_after(), 0.0)
+        self.assertFalse(AICircuitBreaker.objects.exists())
+
+
+@override_settings(**AI_TEST_SETTINGS)
+class BenchmarkCommandTests(AITestMixin, TestCase):
+    """Бенчмарк на кассете: отдельные бюджет и выключатель, общий кэш и данные не затрагиваются"""
+
+    CORPUS = [
+        {'employee_position': 'Разработчик', 'device_type': 'Ноутбук', 'purpose': 'Разработка мобильного приложения',
+         'priority_score': 8},
+        {'employee_position': 'Бухгалтер', 'device_type': 'Сканер', 'purpose': 'Сканирование первичных документов',
+         'priority_score': 8},
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.corpus = os.path.join(directory.name, 'corpus.jsonl')
+        self.cassette = os.path.join(directory.name, 'cassette.json')
+        with open(self.corpus, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(item, ensure_ascii=False) + '\n' for item in self.CORPUS)
+
+    def run_benchmark(self, **options):
+        stdout = io.StringIO()
+        call_command('benchmark_ai', self.corpus, cassette=self.cassette, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_record_then_replay(self):
+        fake = FakeGigaChat(ANALYSIS_REPLY)
+        with mock.patch('inventory.services.gigachat_client.GigaChatClientManager', return_value=fake):
+            self.run_benchmark(record=True)
+        self.assertEqual(len(fake.prompts), 2)
+        with open(self.cassette, encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+        with mock.patch('inventory.services.gigachat_client.GigaChatClientManager') as manager:
+            output = self.run_benchmark()
+        manager.assert_not_called()
+        self.assertIn('совпадение 100.0%', output)
+
+    def test_run_leaves_no_data_and_shared_state(self):
+        with mock.patch('inventory.services.gigachat_client.GigaChatClientManager', return_value=FakeGigaChat()):
+            self.run_benchmark(record=True)
+        self.run_benchmark()
+
+        self.assertFalse(Request.objects.exists())
+        self.assertFalse(AIAnalysis.objects.exists())
+        self.assertFalse(AIAnalysisJob.objects.exists())
+        self.assertEqual(Employee.objects.count(), 1)
+        self.assertEqual(list(DeviceType.objects.values_list('name', flat=True)), ['Ноутбук'])
+        self.assertFalse(AIRateLimit.objects.filter(name='gigachat').exists())
+        self.assertFalse(AICircuitBreaker.objects.filter(name='gigachat').exists())
+
+    def test_replay_writes_nothing(self):
+        with mock.patch('inventory.services.gigachat_client.GigaChatClientManager', return_value=FakeGigaChat()):
+            self.run_benchmark(record=True)
+        versions = list(TableVersion.objects.values_list('name', 'version'))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.run_benchmark(with_shortcuts=True)
+        self.assertEqual(callbacks, [])
+        self.assertFalse(Device.objects.exists())
+        self.assertEqual(list(TableVersion.objects.values_list('name', 'version')), versions)
+
+    def test_shared_cache_neither_read_nor_cleared(self):
+        with mock.patch('inventory.services.gigachat_client.GigaChatClientManager', return_value=FakeGigaChat()):
+            self.run_benchmark(record=True)
+        item = self.CORPUS[0]
+        key = make_cache_key(item['employee_position'], item['device_type'], item['purpose'])
+        AnalysisCache().set(key, {'priority_score': 2, 'tags': [], 'summary': '', 'needs_clarification': False})
+
+        output = self.run_benchmark()
+
+        self.assertIn('совпадение 100.0%', output)
+        self.assertEqual(list(AIAnalysisCacheEntry.objects.values_list('key', flat=True)), [key])
+
+
+class HotQueryIndexTests(TestCase):
+    """Индексы частых выборок и проверка планов командой explain_queries"""
+
+    INDEXES = {
+        'inventory_request': ['request_device_status_idx', 'request_employee_status_idx', 'request_pending_priority_idx'],
+        'inventory_repair': ['repair_active_device_idx'],
+        'inventory_equipmentmovement': ['movement_timestamp_idx'],
+    }
+
+    def test_indexes_created(self):
+        with connection.cursor() as cursor:
+            for table, names in self.INDEXES.items():
+                constraints = connection.introspection.get_constraints(cursor, table)
+                for name in names:
+                    self.assertTrue(constraints.get(name, {}).get('index'), f'{table}.{name}')
+
+    def test_hot_queries_use_indexes(self):
+        stdout = io.StringIO()
+        call_command('explain_queries', no_seqscan=True, fail=True, stdout=stdout)
+        self.assertNotIn('полный проход', stdout.getvalue())
+        self.assertIn('manage_requests: очередь: индекс', stdout.getvalue())
+
+    def test_full_scan_reported(self):
+        queries = {'поиск по цели': Request.objects.filter(purpose='Замена монитора')}
+        stdout = io.StringIO()
+        with mock.patch('inventory.management.commands.explain_queries.hot_queries', return_value=queries):
+            call_command('explain_queries', stdout=stdout)
+            with self.assertRaises(CommandError):
+                call_command('explain_queries', fail=True, stdout=io.StringIO())
+        self.assertIn('поиск по цели: полный проход по inventory_request', stdout.getvalue())
@@ -1,15 +1,74 @@
+import io
+from dataclasses import asdict
+from datetime import date
+
 from django.contrib import messages
+from django.conf import settings
 from django.contrib.auth import authenticate, login
+from django.db.models import Exists, OuterRef, Prefetch
+from django.db.models.functions import Coalesce
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
 
 from .decorators import role_required
 from .models import *
+from .services.ai_metrics import metrics_authorized, render_metrics
+from .services.device_counters import device_stats
+from .services.device_import import DeviceImportError, import_devices
+from .services.movement_export import EXPORT_FORMATS, export_chunks, filter_movements, iter_movements
+from .services.pagination import keyset_paginate
+from .services.repair_analytics import duration_hours, failure_rates, repair_summary, repeat_failures
+from .services.request_decisions import decide_requests
+from .services.roles import get_user_role
+from .services.search import SEARCH_KINDS, search, typeahead_devices
+
+
+# Порядки сортировки инвентаря; id в конце делает порядок однозначным для курсора
+DEVICE_SORT_ORDERS = {
+    'status': ('status', 'device_type_id', 'id'),
+    'type': ('device_type_id', 'status', 'id'),
+    'number': ('inventory_number', 'id'),
+}
+DEVICE_PAGE_SIZE = 50
+
+# Группировки отчёта по поломкам
+REPAIR_REPORT_GROUPS = {
+    'type': ['device_type__name'],
+    'model': ['device_type__name', 'model'],
+}
+REPORT_PAGE_SIZE = 50
+SEARCH_PAGE_SIZE = 20
+# Сколько отклонённых строк импорта показывать на странице
+IMPORT_REJECTED_SHOWN = 200
+
+
+def parse_device_filters(params):
+    """Фильтры инвентаря из GET-параметров; некорректные значения игнорируются"""
+    filters = {}
+    if params.get('type', '').isdigit():
+        filters['device_type_id'] = int(params['type'])
+    if params.get('status') in dict(Device.STATUS_CHOICES):
+        filters['status'] = params['status']
+    if params.get('responsible', '').isdigit():
+        filters['responsible_person_id'] = int(params['responsible'])
+    if params.get('written_off') in ('0', '1'):
+        filters['is_written_off'] = params['written_off'] == '1'
+    return filters
 
 
 @role_required(['admin', 'tech', 'employee'])
 def device_list(request):
-    devices = Device.objects.all().select_related('device_type')
+    sort = request.GET.get('sort') if request.GET.get('sort') in DEVICE_SORT_ORDERS else 'status'
+
+    # Наличие активной заявки считается в том же запросе, без обхода request_set по каждому устройству
+    devices = Device.objects.filter(**parse_device_filters(request.GET)).select_related('device_type').annotate(
+        has_pending_request=Exists(
+            Request.objects.filter(device=OuterRef('pk'), status=Request.STATUS_PENDING)
+        )
+    )
+    page = keyset_paginate(devices, DEVICE_SORT_ORDERS[sort], request.GET.get('cursor'), DEVICE_PAGE_SIZE)
 
     user_has_device = {}
     if request.user.is_authenticated and hasattr(request.user, 'employee'):
@@ -19,16 +78,29 @@ def device_list(request):
         ).values_list('device_id', flat=True)
         user_has_device = {device_id: True for device_id in employee_devices}
 
-    stats = {
-        'total': devices.count(),
-        'available': devices.filter(status='available').count(),
-        'in_use': devices.filter(status='in_use').count(),
-    }
+    stats = device_stats()
+
+    # Ссылки на соседние страницы сохраняют фильтры и сортировку
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    page_links = {}
+    for name, cursor in (('next', page.next_cursor), ('previous', page.previous_cursor)):
+        if cursor:
+            query['cursor'] = cursor
+            page_links[name] = query.urlencode()
 
     return render(request, 'inventory/device_list.html', {
-        'devices': devices,
+        'devices': page.items,
+        'page_links': page_links,
         'stats': stats,
         'user_has_device': user_has_device,
+        'device_types': DeviceType.objects.order_by('name'),
+        'responsible_people': Employee.objects.filter(
+            id__in=Device.objects.filter(responsible_person__isnull=False).values('responsible_person_id')
+        ).order_by('full_name').only('id', 'full_name'),
+        'status_choices': Device.STATUS_CHOICES,
+        'filters': request.GET,
+        'sort': sort,
         'title': 'Весь инвентарь компании'
     })
 
@@ -91,28 +163,29 @@ def manage_requests(request):
         messages.error(request, 'Требуются права администратора')
         return redirect('device_list')
 
-    pending_requests = Request.objects.filter(status=Request.STATUS_PENDING)
-    active_requests = Request.objects.filter(status=Request.STATUS_APPROVED)
-
-    repairs = {}
-    for req in active_requests:
-        active_repair = Repair.objects.filter(device=req.device, status=Repair.STATUS_REPAIRING).first()
-        if active_repair:
-            repairs[req.id] = active_repair
+    # Сначала самые приоритетные по оценке AI, заявки без оценки — в конце.
+    # Выражение совпадает с индексом request_pending_priority_idx
+    priority_order = [Coalesce('ai_priority_score', 0).desc(), 'created_at', 'id']
+    requests = Request.objects.select_related('employee', 'device').order_by(*priority_order)
+
+    pending_requests = requests.filter(status=Request.STATUS_PENDING)
+    # Активные ремонты подгружаются одним запросом и раскладываются по устройствам
+    active_requests = requests.filter(status=Request.STATUS_APPROVED).prefetch_related(
+        Prefetch(
+            'device__repair_set',
+            queryset=Repair.objects.filter(status=Repair.STATUS_REPAIRING).select_related('reported_by').order_by('id'),
+            to_attr='active_repairs',
+        )
+    )
 
     return render(request, 'inventory/manage_requests.html', {
         'pending_requests': pending_requests,
         'active_requests': active_requests,
-        'repairs': repairs
     })
 
 
 @role_required(['admin'])
 def update_request_status(request, request_id, new_status):
-    if not request.user.is_authenticated or request.user.userprofile.role != 'admin':
-        messages.error(request, 'Требуются права администратора')
-        return redirect('device_list')
-
     req = get_object_or_404(Request, id=request_id)
 
     if new_status in [Request.STATUS_APPROVED, Request.STATUS_REJECTED]:
@@ -133,6 +206,43 @@ def update_request_status(request, request_id, new_status):
     return redirect('manage_requests')
 
 
+@role_required(['admin'])
+def bulk_update_request_status(request):
+    """Одобрение или отклонение отмеченных заявок одним действием"""
+    if request.method != 'POST':
+        return redirect('manage_requests')
+
+    new_status = request.POST.get('status')
+    request_ids = [int(value) for value in request.POST.getlist('request_ids') if value.isdigit()]
+    if new_status not in [Request.STATUS_APPROVED, Request.STATUS_REJECTED] or not request_ids:
+        messages.error(request, 'Отметьте заявки и выберите действие')
+        return redirect('manage_requests')
+
+    result = decide_requests(request_ids, new_status)
+    if result.processed:
+        messages.success(request, result.message(new_status))
+    for request_id, reason in result.conflicts.items():
+        messages.warning(request, f'Заявка #{request_id}: {reason}')
+    return redirect('manage_requests')
+
+
+@role_required(['admin'])
+def import_devices_view(request):
+    """Загрузка оборудования из CSV; файл читается потоком, без чтения целиком в память"""
+    result = None
+    if request.method == 'POST' and request.FILES.get('file'):
+        stream = io.TextIOWrapper(request.FILES['file'].file, encoding='utf-8-sig', newline='')
+        try:
+            result = import_devices(stream)
+        except (DeviceImportError, UnicodeDecodeError) as error:
+            messages.error(request, f'Файл не загружен: {error}')
+
+    return render(request, 'inventory/import_devices.html', {
+        'result': result,
+        'rejected': result.rejected[:IMPORT_REJECTED_SHOWN] if result else [],
+    })
+
+
 @role_required(['admin'])
 def return_device(request, request_id):
     req = get_object_or_404(Request, id=request_id)
@@ -269,27 +379,140 @@ def complete_repair(request, repair_id):
 def equipment_report(request):
     if not request.user.is_authenticated:
         return redirect('login')
-    movements = EquipmentMovement.objects.all().select_related('device', 'employee')[:10]
+    filters = parse_movement_filters(request.GET)
+    # На странице — последние движения; полный журнал отдаёт export_movements
+    movements = Paginator(
+        filter_movements(filters).select_related('device', 'employee').order_by('-timestamp', '-id'),
+        REPORT_PAGE_SIZE,
+    ).get_page(request.GET.get('page'))
+    export_query = request.GET.copy()
+    export_query.pop('page', None)
     return render(request, 'inventory/equipment_report.html', {
-        'movements': movements
+        'movements': movements,
+        'page_links': report_page_links(request.GET, movements, 'page'),
+        'export_query': export_query.urlencode(),
+        'export_formats': EXPORT_FORMATS,
+        'movement_choices': EquipmentMovement.MOVEMENT_CHOICES,
+        'device_types': DeviceType.objects.order_by('name'),
+        'filters': request.GET,
     })
 
 
+@role_required(['analyst'])
+def export_movements(request, export_format):
+    if export_format not in EXPORT_FORMATS:
+        raise Http404('Неизвестный формат выгрузки')
+    content_type, extension = EXPORT_FORMATS[export_format]
+    rows = iter_movements(parse_movement_filters(request.GET), chunk_size=settings.EXPORT_CHUNK_SIZE)
+    response = StreamingHttpResponse(export_chunks(export_format, rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="movements-{timezone.localdate():%Y%m%d}.{extension}"'
+    return response
+
+
+def parse_movement_filters(params):
+    """Фильтры журнала движений из GET-параметров; некорректные значения игнорируются"""
+    filters = {}
+    for name in ('date_from', 'date_to'):
+        try:
+            filters[name] = date.fromisoformat(params.get(name, ''))
+        except ValueError:
+            pass
+    if params.get('movement_type') in dict(EquipmentMovement.MOVEMENT_CHOICES):
+        filters['movement_type'] = params['movement_type']
+    if params.get('type', '').isdigit():
+        filters['device_type'] = int(params['type'])
+    if params.get('employee', '').isdigit():
+        filters['employee'] = int(params['employee'])
+    return filters
+
+
 @role_required(['analyst'])
 def breakdown_statistics(request):
     if not request.user.is_authenticated:
         return redirect('login')
-    repairs = Repair.objects.all()
-    total_repairs = repairs.count()
-    completed_repairs = repairs.filter(status=Repair.STATUS_COMPLETED).count()
+    filters = parse_repair_filters(request.GET)
+    group = request.GET.get('group') if request.GET.get('group') in REPAIR_REPORT_GROUPS else 'type'
+
+    # Все показатели считаются агрегатами и оконными функциями в БД; на страницу попадает только её часть
+    groups = Paginator(failure_rates(filters, REPAIR_REPORT_GROUPS[group]), REPORT_PAGE_SIZE).get_page(
+        request.GET.get('page')
+    )
+    groups.object_list = [dict(row, mttr_hours=duration_hours(row['mttr'])) for row in groups.object_list]
+    repeats = Paginator(repeat_failures(filters, settings.REPAIR_REPEAT_WITHIN_DAYS), REPORT_PAGE_SIZE).get_page(
+        request.GET.get('repeat_page')
+    )
 
     return render(request, 'inventory/breakdown_statistics.html', {
-        'total_repairs': total_repairs,
-        'completed_repairs': completed_repairs,
-        'repairs': repairs
+        'summary': repair_summary(filters),
+        'groups': groups,
+        'group': group,
+        'repeats': repeats,
+        'repeat_within_days': settings.REPAIR_REPEAT_WITHIN_DAYS,
+        'page_links': report_page_links(request.GET, groups, 'page'),
+        'repeat_page_links': report_page_links(request.GET, repeats, 'repeat_page'),
+        'device_types': DeviceType.objects.order_by('name'),
+        'filters': request.GET,
     })
 
 
+def parse_repair_filters(params):
+    """Фильтры отчёта по поломкам из GET-параметров; некорректные значения игнорируются"""
+    filters = {}
+    for name in ('date_from', 'date_to'):
+        try:
+            filters[name] = date.fromisoformat(params.get(name, ''))
+        except ValueError:
+            pass
+    if params.get('type', '').isdigit():
+        filters['device_type'] = int(params['type'])
+    return filters
+
+
+def report_page_links(params, page, param):
+    """Ссылки на соседние страницы отчёта с сохранением остальных параметров"""
+    query = params.copy()
+    links = {}
+    if page.has_previous():
+        query[param] = page.previous_page_number()
+        links['previous'] = query.urlencode()
+    if page.has_next():
+        query[param] = page.next_page_number()
+        links['next'] = query.urlencode()
+    return links
+
+
+@role_required(['admin', 'tech', 'analyst'])
+def global_search(request):
+    """
+    Поиск по оборудованию, сотрудникам и заявкам (JSON)
+
+    ?q=...&kind=device&kind=employee&page=2 — ранжированный поиск;
+    ?q=NB0&mode=prefix — подсказки по началу инвентарного номера.
+    Email сотрудников ищется и показывается только администратору.
+    """
+    query = request.GET.get('q', '')
+    if request.GET.get('mode') == 'prefix':
+        return JsonResponse({'results': typeahead_devices(query)})
+
+    page = request.GET.get('page', '')
+    page = max(int(page), 1) if page.isdigit() else 1
+    hits, has_next = search(query, kinds=request.GET.getlist('kind') or SEARCH_KINDS, page=page,
+                            page_size=SEARCH_PAGE_SIZE,
+                            include_private=get_user_role(request) == UserProfile.ROLE_ADMIN)
+    return JsonResponse({
+        'results': [asdict(hit) for hit in hits],
+        'page': page,
+        'has_next': has_next,
+    })
+
+
+def ai_metrics(request):
+    """Метрики AI-конвейера в текстовом формате Prometheus"""
+    if not metrics_authorized(request.headers.get('Authorization')):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def custom_login(request):
     if request.method == 'POST':
         username = request.POST.get('username')
@@ -300,17 +523,14 @@ def custom_login(request):
         if user is not None:
             login(request, user)
 
-            try:
-                profile = UserProfile.objects.get(user=user)
-                if profile.role == UserProfile.ROLE_ADMIN:
-                    return redirect('manage_requests')
-                elif profile.role == UserProfile.ROLE_TECH:
-                    return redirect('repair_list')
-                elif profile.role == UserProfile.ROLE_ANALYST:
-                    return redirect('equipment_report')
-                else:
-                    return redirect('device_list')
-            except UserProfile.DoesNotExist:
+            role = get_user_role(request)
+            if role == UserProfile.ROLE_ADMIN:
+                return redirect('manage_requests')
+            elif role == UserProfile.ROLE_TECH:
+                return redirect('repair_list')
+            elif role == UserProfile.ROLE_ANALYST:
+                return redirect('equipment_report')
+            else:
                 return redirect('device_list')
         else:
             messages.error(request, 'Неверный логин или пароль')